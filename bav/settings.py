@@ -49,6 +49,7 @@ MIDDLEWARE = [
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'visitas.middleware.AuditoriaMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
@@ -133,4 +134,28 @@ MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'visitas', 'media')
 
 SESSION_EXPIRE_AT_BROWSER_CLOSE = True  # La sesión muere al cerrar el navegador
-SESSION_COOKIE_AGE = 3600               # 1 hora de inactividad (puedes bajarlo a 600 para 10 min)
\ No newline at end of file
+SESSION_COOKIE_AGE = 3600               # 1 hora de inactividad (puedes bajarlo a 600 para 10 min)
+
+# 4. Bitácora asíncrona (los eventos se escriben en lotes desde un hilo en segundo plano)
+BITACORA_ASINCRONA = True
+BITACORA_TAMANO_LOTE = 200          # Eventos por INSERT
+BITACORA_TAMANO_COLA = 10000        # Máximo de eventos en memoria antes de usar el archivo de respaldo
+BITACORA_INTERVALO = 2.0            # Segundos máximos que un evento espera en la cola
+BITACORA_ARCHIVO_RESPALDO = os.path.join(BASE_DIR, 'bitacora_pendiente.jsonl')
+BITACORA_ARCHIVO_CUARENTENA = os.path.join(BASE_DIR, 'bitacora_rechazada.jsonl')  # Eventos que la base rechaza (revisar a mano)
+BITACORA_AGRUPAR_ACCESOS = True    # Consultas de páginas como contadores por usuario/acción/hora (ContadorAcceso)
+BITACORA_INTERVALO_ACCESOS = 60     # Segundos entre volcados de los contadores
+
+# 5. Particiones mensuales de la Bitácora (PostgreSQL): python manage.py particiones_bitacora crear|archivar|reincorporar
+BITACORA_RETENCION_MESES = 24       # Meses que se conservan en la base de datos
+BITACORA_DIR_ARCHIVO = os.path.join(BASE_DIR, 'archivo_bitacora')
+
+# 6. Trabajos en segundo plano (respaldos, restauraciones, exportaciones): python manage.py runworker
+TRABAJOS_DIR = os.path.join(BASE_DIR, 'trabajos')   # Archivos subidos y resultados para descargar
+TRABAJOS_PROCESOS = 2               # Trabajos que se ejecutan a la vez
+TRABAJOS_RETENCION_DIAS = 7         # Días que se conservan los archivos generados
+RESPALDO_NATIVO_HILOS = 4           # Tablas que se copian a la vez en el respaldo nativo (COPY)
+
+# 7. Fotos de visitantes: se reducen y se guardan en JPEG sin metadatos al subirlas
+FOTO_LADO_MAXIMO = 1280             # Píxeles del lado mayor
+FOTO_CALIDAD = 85                   # Calidad JPEG (1-95)
@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import Visitante, Visita, IpPermitida, Bitacora
+from .models import Visitante, Visita, IpPermitida, Bitacora, ResumenVisitas, ContadorAcceso, Trabajo
 
 @admin.register(Visitante)
 class VisitanteAdmin(admin.ModelAdmin):
@@ -21,4 +21,22 @@ class IpPermitidaAdmin(admin.ModelAdmin):
 @admin.register(Bitacora)
 class BitacoraAdmin(admin.ModelAdmin):
     list_display = ('accion', 'usuario', 'ip_origen', 'fecha_hora')
-    list_filter = ('accion',)
\ No newline at end of file
+    list_filter = ('accion',)
+
+@admin.register(ContadorAcceso)
+class ContadorAccesoAdmin(admin.ModelAdmin):
+    list_display = ('accion', 'usuario', 'ip_origen', 'hora', 'total', 'ultimo_acceso')
+    list_filter = ('accion',)
+    date_hierarchy = 'hora'
+
+@admin.register(ResumenVisitas)
+class ResumenVisitasAdmin(admin.ModelAdmin):
+    list_display = ('fecha', 'hora', 'estatus', 'entradas', 'salidas', 'segundos_estadia')
+    list_filter = ('estatus',)
+    date_hierarchy = 'fecha'
+
+@admin.register(Trabajo)
+class TrabajoAdmin(admin.ModelAdmin):
+    list_display = ('tipo', 'estado', 'progreso', 'usuario', 'creado', 'terminado')
+    list_filter = ('tipo', 'estado')
+    date_hierarchy = 'creado'
@@ -0,0 +1,500 @@
+# ==========================================
+# IMPORTACIONES
+# ==========================================
+import atexit
+import contextvars
+import datetime
+import json
+import logging
+import os
+import queue
+import threading
+import time
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.core.validators import validate_ipv46_address
+from django.db import DatabaseError, DataError, IntegrityError, connection, connections, transaction
+from django.db.models import BooleanField, Q
+from django.db.models.expressions import RawSQL
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+
+logger = logging.getLogger(__name__)
+
+# ==========================================
+# CONFIGURACIÓN (se puede ajustar en settings.py)
+# ==========================================
+ASINCRONA = getattr(settings, 'BITACORA_ASINCRONA', True)
+TAMANO_LOTE = getattr(settings, 'BITACORA_TAMANO_LOTE', 200)
+TAMANO_COLA = getattr(settings, 'BITACORA_TAMANO_COLA', 10000)
+INTERVALO = getattr(settings, 'BITACORA_INTERVALO', 2.0)
+ARCHIVO_RESPALDO = getattr(
+    settings, 'BITACORA_ARCHIVO_RESPALDO',
+    os.path.join(settings.BASE_DIR, 'bitacora_pendiente.jsonl'),
+)
+ARCHIVO_CUARENTENA = getattr(
+    settings, 'BITACORA_ARCHIVO_CUARENTENA',
+    os.path.join(settings.BASE_DIR, 'bitacora_rechazada.jsonl'),
+)
+AGRUPAR_ACCESOS = getattr(settings, 'BITACORA_AGRUPAR_ACCESOS', True)
+INTERVALO_ACCESOS = getattr(settings, 'BITACORA_INTERVALO_ACCESOS', 60)
+REINTENTO_RESPALDO = 60  # segundos entre reintentos del archivo de respaldo
+
+# ==========================================
+# ESTADO DEL ESCRITOR (uno por proceso)
+# ==========================================
+_cola = queue.Queue(maxsize=TAMANO_COLA)
+_candado = threading.Lock()
+_candado_archivo = threading.Lock()
+_escribiendo = threading.Lock()
+_candado_lote = threading.Lock()
+_en_mano = []  # Lote sacado de la cola que aún no se ha escrito (lo vacía también vaciar_bitacora)
+_hilo = None
+_pid = None
+_ultimo_reintento = 0.0
+
+# Contadores de accesos pendientes: (usuario_id, accion, ip, hora) -> [total, primero, último]
+_accesos = {}
+_candado_accesos = threading.Lock()
+_ultimo_volcado_accesos = 0.0
+
+# Petición en curso (la fija AuditoriaMiddleware) y si estamos dentro de un evento()
+_peticion = contextvars.ContextVar('bitacora_peticion', default=(None, None))
+_en_evento = contextvars.ContextVar('bitacora_en_evento', default=False)
+
+# ==========================================
+# API PÚBLICA
+# ==========================================
+
+def registrar_bitacora(usuario=None, accion='', detalles='', ip_origen=None):
+    """
+    Registra un evento en la Bitácora sin bloquear la petición.
+
+    El evento se encola en memoria y un hilo en segundo plano lo inserta
+    junto con otros usando bulk_create. Si la cola está llena o la base de
+    datos no responde, el evento se guarda en un archivo JSONL y se
+    reinserta más tarde.
+
+    Dentro de una transacción el evento se registra solo cuando ésta se
+    confirma; si se revierte, se descarta.
+    """
+    from .models import Bitacora
+
+    evento = Bitacora(
+        usuario_id=getattr(usuario, 'pk', None),
+        accion=accion,
+        detalles=detalles,
+        ip_origen=ip_origen or '0.0.0.0',
+        fecha_hora=timezone.now(),
+    )
+    if ASINCRONA:
+        transaction.on_commit(lambda: _encolar(evento))
+    else:
+        transaction.on_commit(evento.save)
+
+
+def registrar_acceso(usuario=None, accion='', detalles='', ip_origen=None):
+    """
+    Registra que una página fue consultada (evento de solo lectura).
+
+    Con BITACORA_AGRUPAR_ACCESOS activo no se crea una fila de Bitacora por
+    visita: se suma un contador por usuario, acción, IP y hora que se vuelca
+    periódicamente en ContadorAcceso. Las acciones que modifican datos deben
+    seguir usando registrar_bitacora() o evento().
+    """
+    if not AGRUPAR_ACCESOS:
+        registrar_bitacora(usuario, accion, detalles, ip_origen)
+        return
+
+    ahora = timezone.now()
+    clave = (getattr(usuario, 'pk', None), accion, ip_origen or '0.0.0.0',
+             ahora.replace(minute=0, second=0, microsecond=0))
+    with _candado_accesos:
+        contador = _accesos.get(clave)
+        if contador is None:
+            _accesos[clave] = [1, ahora, ahora]
+        else:
+            contador[0] += 1
+            contador[2] = ahora
+
+    if ASINCRONA:
+        _asegurar_hilo()
+    else:
+        _volcar_accesos()
+
+
+@contextmanager
+def evento(usuario, accion, detalles, ip_origen):
+    """
+    Agrupa una operación de negocio en UN solo registro de Bitácora.
+
+    Los cambios de modelos hechos dentro del bloque no generan filas propias
+    desde las señales; al terminar sin errores se escribe únicamente el
+    evento indicado por la vista. Si el bloque corre dentro de una
+    transacción mayor, la escritura espera a que ésta se confirme
+    (transaction.on_commit, ver registrar_bitacora).
+    """
+    token = _en_evento.set(True)
+    try:
+        yield
+    finally:
+        _en_evento.reset(token)
+    registrar_bitacora(usuario, accion, detalles, ip_origen)
+
+
+def registrar_cambio(accion, detalles, ip_origen=None):
+    """
+    Registro usado por las señales de los modelos.
+
+    Toma el usuario y la IP de la petición en curso. Si el cambio ocurre
+    dentro de un evento() no se escribe nada, porque la vista ya lo registra.
+    'detalles' puede ser una función: solo se llama si el registro se
+    escribe, para no cargar objetos relacionados que no se van a usar.
+    """
+    if _en_evento.get():
+        return
+    if callable(detalles):
+        detalles = detalles()
+    request, ip_peticion = _peticion.get()
+    registrar_bitacora(getattr(request, 'user', None), accion, detalles, ip_origen or ip_peticion)
+
+
+def fijar_peticion(request, ip_origen):
+    """Asocia la petición actual al hilo; devuelve un token para liberarla."""
+    return _peticion.set((request, ip_origen))
+
+
+def liberar_peticion(token):
+    _peticion.reset(token)
+
+
+def vaciar_bitacora():
+    """
+    Escribe de inmediato todos los eventos pendientes (usado al apagar el proceso).
+
+    Incluye el lote que el hilo escritor ya sacó de la cola y aún no escribió.
+    """
+    with _escribiendo:
+        while True:
+            _tomar_lote(bloquear=False)
+            if not _escribir_en_mano():
+                break
+    _volcar_accesos()
+
+# ==========================================
+# CONSULTAS DE LA BITÁCORA
+# ==========================================
+
+def filtrar_bitacora(parametros):
+    """
+    Aplica los filtros del visor de bitácora (usuario, acción, IP y rango de
+    fechas) tomados de un QueryDict. Cada filtro coincide con uno de los
+    índices (campo, -fecha_hora, -id) de Bitacora. Con 'q' se añade la
+    búsqueda de texto (ver buscar_bitacora).
+
+    Devuelve el queryset y el diccionario de filtros válidos que se aplicaron.
+    """
+    from .models import Bitacora
+    from .estadisticas import inicio_del_dia
+
+    queryset = Bitacora.objects.select_related('usuario')
+    filtros = {}
+
+    usuario = parametros.get('usuario', '').strip()
+    if usuario == 'sistema':
+        queryset = queryset.filter(usuario__isnull=True)
+        filtros['usuario'] = usuario
+    elif usuario.isdigit():
+        queryset = queryset.filter(usuario_id=int(usuario))
+        filtros['usuario'] = usuario
+
+    accion = parametros.get('accion', '').strip()
+    if accion:
+        queryset = queryset.filter(accion=accion)
+        filtros['accion'] = accion
+
+    ip = parametros.get('ip', '').strip()
+    if ip:
+        try:
+            validate_ipv46_address(ip)
+        except ValidationError:
+            pass
+        else:
+            queryset = queryset.filter(ip_origen=ip)
+            filtros['ip'] = ip
+
+    desde = leer_fecha(parametros.get('desde'))
+    if desde:
+        queryset = queryset.filter(fecha_hora__gte=inicio_del_dia(desde))
+        filtros['desde'] = desde.isoformat()
+
+    hasta = leer_fecha(parametros.get('hasta'))
+    if hasta:
+        queryset = queryset.filter(fecha_hora__lt=inicio_del_dia(hasta + datetime.timedelta(days=1)))
+        filtros['hasta'] = hasta.isoformat()
+
+    texto = parametros.get('q', '').strip()
+    if texto:
+        queryset = buscar_bitacora(queryset, texto)
+        filtros['q'] = texto
+
+    return queryset, filtros
+
+
+def buscar_bitacora(queryset, texto):
+    """
+    Filtra por texto libre en acción, detalles e IP.
+
+    En PostgreSQL usa la columna 'busqueda' (tsvector en español y sin
+    acentos, migración 0015) para palabras completas, y los índices de
+    trigramas para fragmentos como parte de una cédula o de una IP.
+    En otros motores se recurre a icontains. Solo filtra: el visor sigue
+    paginando por (fecha_hora, id), sin ordenar por relevancia.
+    """
+    if connections[queryset.db].vendor != 'postgresql':
+        return queryset.filter(
+            Q(accion__icontains=texto) | Q(detalles__icontains=texto) | Q(ip_origen__contains=texto)
+        )
+
+    consulta = "websearch_to_tsquery('spanish_unaccent', %s)"
+    fragmento = '%' + texto.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_') + '%'
+    coincide = RawSQL(
+        f"(visitas_bitacora.busqueda @@ {consulta} "
+        "OR visitas_bitacora.detalles ILIKE %s "
+        "OR visitas_bitacora.accion ILIKE %s "
+        "OR host(visitas_bitacora.ip_origen) LIKE %s)",
+        [texto, fragmento, fragmento, fragmento],
+        output_field=BooleanField(),
+    )
+    return queryset.filter(coincide)
+
+
+def leer_fecha(valor):
+    """Fecha 'AAAA-MM-DD' o None si viene vacía o mal formada."""
+    try:
+        return parse_date(valor or '')
+    except ValueError:
+        return None
+
+# ==========================================
+# HILO ESCRITOR
+# ==========================================
+
+def _asegurar_hilo():
+    global _hilo, _pid, _cola
+    if _hilo is not None and _hilo.is_alive() and _pid == os.getpid():
+        return
+    with _candado:
+        if _pid != os.getpid():
+            # Proceso hijo (fork): la cola heredada pertenece al padre
+            _cola = queue.Queue(maxsize=TAMANO_COLA)
+            _en_mano.clear()
+            _pid = os.getpid()
+        if _hilo is None or not _hilo.is_alive():
+            _hilo = threading.Thread(target=_trabajar, name='bitacora-escritor', daemon=True)
+            _hilo.start()
+
+
+def _encolar(evento):
+    _asegurar_hilo()
+    try:
+        _cola.put_nowait(evento)
+    except queue.Full:
+        logger.warning("Cola de bitácora llena, el evento se guarda en el archivo de respaldo")
+        _guardar_en_archivo(ARCHIVO_RESPALDO, [evento])
+
+
+def _trabajar():
+    while True:
+        try:
+            if _tomar_lote(bloquear=True):
+                with _escribiendo:
+                    _escribir_en_mano()
+            if time.monotonic() - _ultimo_volcado_accesos >= INTERVALO_ACCESOS:
+                _volcar_accesos()
+            _reintentar_respaldo()
+        except Exception:
+            # El hilo nunca debe morir: registramos el error y seguimos
+            logger.exception("Error inesperado en el escritor de bitácora")
+
+
+def _tomar_lote(bloquear):
+    """
+    Pasa eventos de la cola a _en_mano (hasta TAMANO_LOTE); devuelve cuántos hay.
+
+    Cada evento sale de la cola y entra en _en_mano bajo _candado_lote, así
+    vaciar_bitacora() nunca pierde de vista uno que el hilo esté tomando.
+    """
+    with _candado_lote:
+        try:
+            if bloquear and not _en_mano:
+                _en_mano.append(_cola.get(timeout=INTERVALO))
+            while len(_en_mano) < TAMANO_LOTE:
+                _en_mano.append(_cola.get_nowait())
+        except queue.Empty:
+            pass
+        return len(_en_mano)
+
+
+def _escribir_en_mano():
+    """Escribe el lote de _en_mano (con _escribiendo tomado); devuelve cuántos eventos eran."""
+    with _candado_lote:
+        lote = _en_mano[:]
+        _en_mano.clear()
+    if lote:
+        _escribir(lote)
+    return len(lote)
+
+
+def _escribir(lote):
+    pendientes = _insertar(lote)
+    if pendientes:
+        logger.error("No se pudo escribir la bitácora, %s eventos van al archivo de respaldo", len(pendientes))
+        _guardar_en_archivo(ARCHIVO_RESPALDO, pendientes)
+
+
+def _insertar(eventos):
+    """
+    Inserta los eventos y devuelve los que no se pudieron escribir por falta de base de datos.
+
+    Si el bulk_create falla se reintenta fila por fila: las filas que la base
+    rechaza por su contenido van al archivo de cuarentena y el resto se
+    inserta, en lugar de mandar todo el lote al respaldo una y otra vez.
+    """
+    from .models import Bitacora
+
+    try:
+        Bitacora.objects.bulk_create(eventos, batch_size=TAMANO_LOTE)
+        return []
+    except (DatabaseError, ValueError, ValidationError):
+        logger.warning("Falló la inserción del lote de bitácora, se reintenta fila por fila", exc_info=True)
+
+    rechazados = []
+    pendientes = []
+    for i, evento in enumerate(eventos):
+        try:
+            evento.save(force_insert=True)
+        except (DataError, IntegrityError, ValueError, ValidationError):
+            logger.exception("Evento de bitácora rechazado, va al archivo de cuarentena: %s", evento.accion)
+            rechazados.append(evento)
+        except DatabaseError:
+            # Sin base de datos: cerramos la conexión para que el próximo intento abra una nueva
+            connection.close()
+            pendientes = eventos[i:]
+            break
+    if rechazados:
+        _guardar_en_archivo(ARCHIVO_CUARENTENA, rechazados)
+    return pendientes
+
+def _volcar_accesos():
+    """Suma los contadores acumulados en memoria a la tabla ContadorAcceso."""
+    global _accesos, _ultimo_volcado_accesos
+    from .models import ContadorAcceso
+
+    _ultimo_volcado_accesos = time.monotonic()
+    with _candado_accesos:
+        pendientes, _accesos = _accesos, {}
+
+    for i, ((usuario_id, accion, ip, hora), (total, primero, ultimo)) in enumerate(pendientes.items()):
+        try:
+            ContadorAcceso.sumar(usuario_id, accion, ip, hora, total, primero, ultimo)
+        except DatabaseError:
+            logger.exception("No se pudieron guardar los contadores de acceso, se reintentará")
+            connection.close()
+            # Devolvemos lo que falta para el próximo volcado
+            with _candado_accesos:
+                for clave, (t, p, u) in list(pendientes.items())[i:]:
+                    actual = _accesos.setdefault(clave, [0, p, u])
+                    actual[0] += t
+                    actual[1] = min(actual[1], p)
+                    actual[2] = max(actual[2], u)
+            return
+
+# ==========================================
+# RESPALDO DURABLE EN ARCHIVO
+# ==========================================
+
+def _guardar_en_archivo(ruta, eventos):
+    lineas = ''.join(
+        json.dumps({
+            'usuario_id': e.usuario_id,
+            'accion': e.accion,
+            'detalles': e.detalles,
+            'ip_origen': e.ip_origen,
+            'fecha_hora': e.fecha_hora.isoformat(),
+        }, ensure_ascii=False) + '\n'
+        for e in eventos
+    )
+    with _candado_archivo:
+        with open(ruta, 'a', encoding='utf-8') as f:
+            f.write(lineas)
+            f.flush()
+            os.fsync(f.fileno())
+
+
+def _reintentar_respaldo():
+    """
+    Reinserta en la base de datos los eventos que quedaron en el archivo.
+
+    Pase lo que pase, el archivo .procesando no queda huérfano: se borra si
+    se procesó y, ante un error inesperado, vuelve al respaldo.
+    """
+    global _ultimo_reintento
+    from .models import Bitacora
+
+    if time.monotonic() - _ultimo_reintento < REINTENTO_RESPALDO or not os.path.exists(ARCHIVO_RESPALDO):
+        return
+    _ultimo_reintento = time.monotonic()
+
+    en_proceso = f"{ARCHIVO_RESPALDO}.{os.getpid()}.procesando"
+    with _candado_archivo:
+        try:
+            os.replace(ARCHIVO_RESPALDO, en_proceso)
+        except FileNotFoundError:
+            return
+
+    procesado = False
+    try:
+        eventos = []
+        invalidas = []
+        with open(en_proceso, encoding='utf-8') as f:
+            for linea in f:
+                if not linea.strip():
+                    continue
+                try:
+                    datos = json.loads(linea)
+                    datos['fecha_hora'] = parse_datetime(datos['fecha_hora'])
+                    eventos.append(Bitacora(**datos))
+                except (ValueError, KeyError, TypeError):
+                    logger.error("Línea inválida en el respaldo de bitácora: %r", linea)
+                    invalidas.append(linea)
+        if invalidas:
+            with _candado_archivo, open(ARCHIVO_CUARENTENA, 'a', encoding='utf-8') as f:
+                f.writelines(invalidas)
+
+        pendientes = _insertar(eventos)
+        if pendientes:
+            # Seguimos sin base de datos: devolvemos los eventos al archivo
+            logger.warning("Base de datos no disponible, %s eventos siguen en respaldo", len(pendientes))
+            _guardar_en_archivo(ARCHIVO_RESPALDO, pendientes)
+        procesado = True
+    finally:
+        if procesado:
+            os.remove(en_proceso)
+        else:
+            _devolver_al_respaldo(en_proceso)
+
+
+def _devolver_al_respaldo(en_proceso):
+    """Añade el archivo .procesando al respaldo tal cual, para el próximo reintento."""
+    with _candado_archivo:
+        with open(en_proceso, encoding='utf-8') as origen, open(ARCHIVO_RESPALDO, 'a', encoding='utf-8') as destino:
+            destino.write(origen.read())
+            destino.flush()
+            os.fsync(destino.fileno())
+        os.remove(en_proceso)
+
+
+atexit.register(vaciar_bitacora)
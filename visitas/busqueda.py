@@ -0,0 +1,149 @@
+# ==========================================
+# IMPORTACIONES
+# ==========================================
+import time
+from functools import lru_cache
+
+from django.db import connections, transaction
+from django.db.models import BooleanField, FloatField, Q, Value
+from django.db.models.expressions import RawSQL
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from django.urls import reverse
+from django.utils import timezone
+
+from .models import Visita, Visitante, normalizar_nombre
+from .templatetags.miniaturas import miniatura
+
+# ==========================================
+# BÚSQUEDA DE VISITANTES POR CÉDULA
+# ==========================================
+# El formulario de registro consulta /visitors/lookup/?cedula=... mientras el
+# vigilante escribe, para rellenar los datos de un visitante que ya vino antes.
+# cedula__startswith (LIKE 'V-12%') usa el índice varchar_pattern_ops que
+# Django ya crea en PostgreSQL para 'cedula' por ser unique
+# (visitas_visitante_cedula_..._like). Los perfiles recientes se guardan en
+# un LRU por proceso; el ingreso abierto de cada uno se consulta siempre, porque
+# cambia con cada entrada y salida y el formulario lo usa para avisar del duplicado.
+
+LIMITE_SUGERENCIAS = 8
+MINIMO_CARACTERES = 2
+LRU_CONSULTAS = 256
+# Los cambios hechos en este proceso vacían el LRU al momento (señales de abajo);
+# los de otros procesos (ej. la foto que procesa el runworker) tardan como mucho esto
+LRU_SEGUNDOS = 60
+
+
+def normalizar_cedula(texto):
+    return ''.join((texto or '').split()).upper()
+
+
+def buscar_por_cedula(texto):
+    """Visitantes cuya cédula empieza por 'texto' (lista de dicts listos para JSON)."""
+    prefijo = normalizar_cedula(texto)
+    if len(prefijo) < MINIMO_CARACTERES:
+        return []
+    perfiles = _buscar(prefijo, int(time.monotonic() // LRU_SEGUNDOS))
+    if not perfiles:
+        return []
+    abiertas = {
+        visita.visitante_id: visita
+        for visita in Visita.objects.filter(
+            visitante_id__in=[perfil['id'] for perfil in perfiles], salida__isnull=True,
+        ).order_by('entrada')
+    }
+    # Copias: los dicts del LRU no se modifican
+    return [{**perfil, 'visita_abierta': _visita_abierta(abiertas.get(perfil['id']))} for perfil in perfiles]
+
+
+@lru_cache(maxsize=LRU_CONSULTAS)
+def _buscar(prefijo, ventana):
+    # 'ventana' solo forma parte de la clave: cambia cada LRU_SEGUNDOS
+    visitantes = Visitante.objects.filter(cedula__startswith=prefijo).order_by('cedula')[:LIMITE_SUGERENCIAS]
+    return tuple(_perfil(visitante) for visitante in visitantes)
+
+
+def _perfil(visitante):
+    return {
+        'id': visitante.pk,
+        'cedula': visitante.cedula,
+        'nombre_completo': visitante.nombre_completo,
+        'estatus': visitante.estatus,
+        'estatus_display': visitante.get_estatus_display(),
+        'correo': visitante.correo,
+        'telefono': visitante.telefono,
+        'foto': miniatura(visitante.foto_visible, 48) or None,
+        'editar': reverse('visitor_edit', args=[visitante.pk]),
+    }
+
+
+def _visita_abierta(visita):
+    if visita is None:
+        return None
+    return {
+        'id': visita.pk,
+        'entrada': timezone.localtime(visita.entrada).strftime('%d/%m/%Y %H:%M'),
+        'motivo': visita.motivo,
+    }
+
+
+# ==========================================
+# BÚSQUEDA DE VISITAS POR NOMBRE O CÉDULA
+# ==========================================
+
+def buscar_visitas(queryset, texto):
+    """
+    Filtra visitas por nombre o cédula del visitante y anota 'rango' (similitud).
+
+    El queryset debe incluir select_related('visitante'). En PostgreSQL usa los
+    índices de trigramas de la migración 0019 sobre 'nombre_normalizado' (sin
+    acentos: "Jose" encuentra a "José") y 'cedula', y admite errores de
+    tipeo; en otros motores se recurre a icontains con rango 0.
+    """
+    nombre = normalizar_nombre(texto)
+    cedula = normalizar_cedula(texto)
+    if connections[queryset.db].vendor != 'postgresql':
+        return queryset.filter(
+            Q(visitante__nombre_normalizado__contains=nombre) | Q(visitante__cedula__icontains=cedula)
+        ).annotate(rango=Value(0.0, output_field=FloatField()))
+
+    coincide = RawSQL(
+        "(visitas_visitante.nombre_normalizado LIKE %s "
+        "OR %s <%% visitas_visitante.nombre_normalizado "
+        "OR visitas_visitante.cedula ILIKE %s)",
+        [_fragmento(nombre), nombre, _fragmento(cedula)],
+        output_field=BooleanField(),
+    )
+    rango = RawSQL(
+        "greatest(word_similarity(%s, visitas_visitante.nombre_normalizado), "
+        "similarity(%s, visitas_visitante.cedula))",
+        [nombre, cedula],
+        output_field=FloatField(),
+    )
+    return queryset.filter(coincide).annotate(rango=rango)
+
+
+def filtrar_visitantes(queryset, texto):
+    """
+    Visitantes cuyo nombre (sin acentos) o cédula contienen 'texto'.
+    En PostgreSQL ambos LIKE '%texto%' usan los índices de trigramas.
+    """
+    return queryset.filter(
+        Q(nombre_normalizado__contains=normalizar_nombre(texto)) | Q(cedula__contains=normalizar_cedula(texto))
+    )
+
+
+def _fragmento(texto):
+    """Patrón LIKE '%texto%' con los comodines del texto escapados."""
+    return '%' + texto.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_') + '%'
+
+
+@receiver(post_save, sender=Visitante)
+@receiver(post_delete, sender=Visitante)
+def vaciar_busqueda(sender, **kwargs):
+    """
+    Vacía el LRU de perfiles cuando la transacción se confirma (antes, otra
+    petición podría volver a guardar los datos viejos). Las vistas que
+    escriben visitantes sin señales (upsert con bulk_create) la llaman al terminar.
+    """
+    transaction.on_commit(_buscar.cache_clear)
@@ -0,0 +1,144 @@
+# ==========================================
+# IMPORTACIONES
+# ==========================================
+import datetime
+
+from django.db import transaction
+from django.db.models import Count, DurationField, ExpressionWrapper, F, Q, Sum
+from django.db.models.functions import ExtractHour, TruncDate
+from django.utils import timezone
+
+from .models import ResumenVisitas, Visita
+
+# ==========================================
+# UTILIDADES DE FECHAS
+# ==========================================
+
+def inicio_del_dia(fecha):
+    """Devuelve el datetime (con zona horaria local) de las 00:00 de una fecha."""
+    return timezone.make_aware(datetime.datetime.combine(fecha, datetime.time.min))
+
+
+def rango_del_dia(fecha):
+    """Rango [inicio, fin) de un día local, apto para usar el índice de 'entrada'."""
+    return inicio_del_dia(fecha), inicio_del_dia(fecha + datetime.timedelta(days=1))
+
+# ==========================================
+# ESTADÍSTICAS DEL DASHBOARD
+# ==========================================
+
+def estadisticas_dashboard(dias=7, ahora=None):
+    """
+    Calcula todas las tarjetas del dashboard y la serie de los últimos días.
+
+    Los totales por día salen de la tabla ResumenVisitas (una fila por día,
+    hora y estatus), así que el costo no crece con los años de historial.
+    Solo 'visitantes activos' se cuenta sobre Visita, usando el índice de 'salida'.
+    """
+    ahora = timezone.localtime(ahora or timezone.now())
+    hoy = ahora.date()
+
+    # Límites de los meses (actual y anterior)
+    primer_dia_actual = hoy.replace(day=1)
+    primer_dia_anterior = (primer_dia_actual - datetime.timedelta(days=1)).replace(day=1)
+
+    # Días del gráfico (del más antiguo al más reciente)
+    dias_grafico = [hoy - datetime.timedelta(days=i) for i in range(dias - 1, -1, -1)]
+
+    agregados = {
+        'visitantes_hoy': Sum('entradas', filter=Q(fecha=hoy), default=0),
+        'visitas_mes_actual': Sum('entradas', filter=Q(fecha__gte=primer_dia_actual), default=0),
+        'visitas_mes_anterior': Sum('entradas', filter=Q(fecha__gte=primer_dia_anterior, fecha__lt=primer_dia_actual), default=0),
+    }
+    for i, dia in enumerate(dias_grafico):
+        agregados[f'dia_{i}'] = Sum('entradas', filter=Q(fecha=dia), default=0)
+
+    resultado = ResumenVisitas.objects.filter(
+        fecha__gte=min(primer_dia_anterior, dias_grafico[0])
+    ).aggregate(**agregados)
+
+    visitas_mes_actual = resultado['visitas_mes_actual']
+    visitas_mes_anterior = resultado['visitas_mes_anterior']
+    if visitas_mes_anterior > 2:
+        crecimiento_pct = round((visitas_mes_actual - visitas_mes_anterior) / visitas_mes_anterior * 100, 1)
+    else:
+        crecimiento_pct = 100.0 if visitas_mes_actual > 0 else 0.0
+
+    return {
+        'visitantes_hoy': resultado['visitantes_hoy'],
+        'visitantes_activos': Visita.objects.filter(salida__isnull=True).count(),
+        'visitas_mes_actual': visitas_mes_actual,
+        'visitas_mes_anterior': visitas_mes_anterior,
+        'crecimiento_pct': crecimiento_pct,
+        'chart_labels': [dia.strftime('%a') for dia in dias_grafico],
+        'chart_data': [resultado[f'dia_{i}'] for i in range(len(dias_grafico))],
+    }
+
+
+def resumen_por_dia(desde, hasta):
+    """Totales diarios (entradas, salidas, estadía) entre dos fechas, inclusive."""
+    return (
+        ResumenVisitas.objects.filter(fecha__gte=desde, fecha__lte=hasta)
+        .values('fecha')
+        .annotate(entradas=Sum('entradas'), salidas=Sum('salidas'), segundos_estadia=Sum('segundos_estadia'))
+        .order_by('fecha')
+    )
+
+# ==========================================
+# RECONSTRUCCIÓN DEL RESUMEN
+# ==========================================
+
+def reconstruir_resumen(desde=None, hasta=None):
+    """
+    Recalcula ResumenVisitas desde las visitas crudas para el rango de
+    fechas dado (ambos inclusive). Sin fechas, reconstruye todo el historial.
+    Devuelve la cantidad de filas de resumen generadas.
+    """
+    filtro_resumen = Q()
+    filtro_entrada = Q()
+    filtro_salida = Q(salida__isnull=False)
+    if desde:
+        filtro_resumen &= Q(fecha__gte=desde)
+        filtro_entrada &= Q(entrada__gte=inicio_del_dia(desde))
+        filtro_salida &= Q(salida__gte=inicio_del_dia(desde))
+    if hasta:
+        fin = inicio_del_dia(hasta + datetime.timedelta(days=1))
+        filtro_resumen &= Q(fecha__lte=hasta)
+        filtro_entrada &= Q(entrada__lt=fin)
+        filtro_salida &= Q(salida__lt=fin)
+
+    cubos = {}
+
+    def cubo(fecha, hora, estatus):
+        clave = (fecha, hora, estatus)
+        if clave not in cubos:
+            cubos[clave] = ResumenVisitas(fecha=fecha, hora=hora, estatus=estatus)
+        return cubos[clave]
+
+    entradas = (
+        Visita.objects.filter(filtro_entrada)
+        .annotate(dia=TruncDate('entrada'), h=ExtractHour('entrada'))
+        .values('dia', 'h', 'estatus')
+        .annotate(total=Count('id'))
+        .order_by()
+    )
+    for fila in entradas:
+        cubo(fila['dia'], fila['h'], fila['estatus']).entradas = fila['total']
+
+    estadia = ExpressionWrapper(F('salida') - F('entrada'), output_field=DurationField())
+    salidas = (
+        Visita.objects.filter(filtro_salida)
+        .annotate(dia=TruncDate('salida'), h=ExtractHour('salida'))
+        .values('dia', 'h', 'estatus')
+        .annotate(total=Count('id'), duracion=Sum(estadia))
+        .order_by()
+    )
+    for fila in salidas:
+        registro = cubo(fila['dia'], fila['h'], fila['estatus'])
+        registro.salidas = fila['total']
+        registro.segundos_estadia = int(fila['duracion'].total_seconds()) if fila['duracion'] else 0
+
+    with transaction.atomic():
+        ResumenVisitas.objects.filter(filtro_resumen).delete()
+        ResumenVisitas.objects.bulk_create(cubos.values(), batch_size=1000)
+    return len(cubos)
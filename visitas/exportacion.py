@@ -0,0 +1,242 @@
+# ==========================================
+# IMPORTACIONES
+# ==========================================
+import csv
+import io
+import itertools
+import json
+import math
+import zipfile
+import zlib
+
+from reportlab.lib import colors
+from reportlab.lib.pagesizes import A4, landscape
+from reportlab.lib.styles import getSampleStyleSheet
+from reportlab.pdfgen import canvas
+from reportlab.platypus import Paragraph, Table, TableStyle
+
+# ==========================================
+# EXPORTACIÓN DE LA BITÁCORA POR PARTES
+# ==========================================
+# Las filas se leen con un cursor del servidor (iterator) y se envían al
+# cliente en bloques de ~64 KB: la memoria usada no depende del tamaño de
+# la bitácora y el primer byte sale antes de terminar la consulta.
+
+TAMANO_BLOQUE = 64 * 1024
+FILAS_POR_LECTURA = 2000
+
+FORMATOS = {
+    'txt': ('text/plain; charset=utf-8', 'txt'),
+    'csv': ('text/csv; charset=utf-8', 'csv'),
+    'ndjson': ('application/x-ndjson; charset=utf-8', 'ndjson'),
+}
+
+
+def _usuario(log):
+    return log.usuario.username if log.usuario else 'Sistema'
+
+
+def _lineas_txt(registros):
+    separador = "-" * 50 + "\n"
+    yield "BITÁCORA COMPLETA - SISTEMA BAV\n" + "=" * 50 + "\n\n"
+    for log in registros:
+        yield (
+            f"Fecha/Hora: {log.fecha_hora.strftime('%d/%m/%Y %H:%M:%S')}\n"
+            f"Usuario: {_usuario(log)}\n"
+            f"Acción: {log.accion}\n"
+            f"Detalles: {log.detalles}\n"
+            f"IP Origen: {log.ip_origen}\n"
+            + separador
+        )
+
+
+def _lineas_csv(registros):
+    buffer = io.StringIO()
+    escritor = csv.writer(buffer)
+
+    def fila(valores):
+        escritor.writerow(valores)
+        texto = buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+        return texto
+
+    # BOM para que Excel reconozca UTF-8
+    yield '\ufeff' + fila(['id', 'fecha_hora', 'usuario', 'accion', 'detalles', 'ip_origen'])
+    for log in registros:
+        yield fila([log.id, log.fecha_hora.isoformat(), _usuario(log), log.accion, log.detalles, log.ip_origen])
+
+
+def _lineas_ndjson(registros):
+    for log in registros:
+        yield json.dumps({
+            'id': log.id,
+            'fecha_hora': log.fecha_hora.isoformat(),
+            'usuario': log.usuario.username if log.usuario else None,
+            'accion': log.accion,
+            'detalles': log.detalles,
+            'ip_origen': log.ip_origen,
+        }, ensure_ascii=False) + '\n'
+
+
+_GENERADORES = {
+    'txt': _lineas_txt,
+    'csv': _lineas_csv,
+    'ndjson': _lineas_ndjson,
+}
+
+
+def exportar_bitacora(queryset, formato, comprimir=False):
+    """
+    Generador de bytes con la bitácora en el formato pedido ('txt', 'csv'
+    o 'ndjson'), opcionalmente comprimido en gzip. Pensado para
+    StreamingHttpResponse.
+    """
+    registros = (
+        queryset.select_related('usuario')
+        .order_by('-fecha_hora', '-id')
+        .iterator(chunk_size=FILAS_POR_LECTURA)
+    )
+    compresor = zlib.compressobj(6, zlib.DEFLATED, 31) if comprimir else None  # wbits=31: formato gzip
+
+    pendiente = []
+    tamano = 0
+    for linea in _GENERADORES[formato](registros):
+        pendiente.append(linea)
+        tamano += len(linea)
+        if tamano >= TAMANO_BLOQUE:
+            datos = ''.join(pendiente).encode('utf-8')
+            pendiente, tamano = [], 0
+            if compresor:
+                datos = compresor.compress(datos)
+            if datos:
+                yield datos
+
+    datos = ''.join(pendiente).encode('utf-8')
+    if compresor:
+        datos = compresor.compress(datos) + compresor.flush()
+    if datos:
+        yield datos
+
+# ==========================================
+# EXPORTACIÓN DE LA BITÁCORA EN PDF
+# ==========================================
+# En lugar de una sola Table con todas las filas (que ReportLab debe medir
+# completa en memoria), se dibuja una tabla pequeña por página directamente
+# sobre el canvas. Estilos y anchos se construyen una sola vez.
+
+TAMANO_PAGINA = landscape(A4)
+MARGEN = 36
+FILAS_POR_PAGINA = 35
+FILAS_PRIMERA_PAGINA = 32  # La primera página lleva además el título
+FILAS_POR_TOMO = 100_000   # ~110 MB de memoria por tomo
+ANCHOS_COLUMNAS = [80, 60, 80, 200, 80]
+ENCABEZADO_PDF = ['Fecha/Hora', 'Usuario', 'Acción', 'Detalles', 'IP Origen']
+
+ESTILO_TABLA = TableStyle([
+    ('BACKGROUND', (0, 0), (-1, 0), colors.green),
+    ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
+    ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
+    ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+    ('FONTSIZE', (0, 0), (-1, 0), 10),
+    ('BACKGROUND', (0, 1), (-1, -1), colors.beige),
+    ('GRID', (0, 0), (-1, -1), 0.5, colors.black),
+    ('FONTSIZE', (0, 1), (-1, -1), 8),
+    ('LEADING', (0, 1), (-1, -1), 10),
+    ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),
+    ('LEFTPADDING', (0, 0), (-1, -1), 3),
+    ('RIGHTPADDING', (0, 0), (-1, -1), 3),
+    ('TOPPADDING', (0, 0), (-1, -1), 2),
+    ('BOTTOMPADDING', (0, 0), (-1, -1), 2),
+])
+
+
+def _fila_pdf(log):
+    # Truncar textos largos para que quepan en una línea
+    accion = log.accion[:50] + '...' if len(log.accion) > 50 else log.accion
+    detalles = log.detalles[:100] + '...' if len(log.detalles) > 100 else log.detalles
+    return [log.fecha_hora.strftime('%d/%m/%Y %H:%M:%S'), _usuario(log), accion, detalles, log.ip_origen]
+
+
+def exportar_bitacora_pdf(queryset, destino, titulo="Bitácora Completa - Sistema BAV", progreso=None):
+    """
+    Escribe la bitácora en PDF sobre 'destino' (ruta o archivo binario abierto).
+
+    ReportLab guarda todas las páginas en memoria hasta cerrar el documento,
+    así que por encima de FILAS_POR_TOMO filas se generan varios PDF (tomos)
+    dentro de un ZIP y la memoria usada queda acotada.
+
+    'progreso', si se indica, se llama como progreso(filas_hechas, total)
+    al terminar cada página. Devuelve la cantidad de tomos: 1 si 'destino'
+    es un PDF, más de 1 si es un ZIP.
+    """
+    total = queryset.count()
+    registros = (
+        queryset.select_related('usuario')
+        .order_by('-fecha_hora', '-id')
+        .iterator(chunk_size=FILAS_POR_LECTURA)
+    )
+    hechas = 0
+
+    def avanzar(filas):
+        nonlocal hechas
+        hechas += filas
+        if progreso:
+            progreso(hechas, total)
+
+    tomos = max(1, math.ceil(total / FILAS_POR_TOMO))
+    if tomos == 1:
+        _escribir_tomo(destino, registros, titulo, avanzar)
+        return 1
+
+    with zipfile.ZipFile(destino, 'w', zipfile.ZIP_STORED, allowZip64=True) as archivo_zip:
+        for numero in range(1, tomos + 1):
+            # El último tomo toma lo que quede (por si llegaron filas después del conteo)
+            parte = registros if numero == tomos else itertools.islice(registros, FILAS_POR_TOMO)
+            with archivo_zip.open(f"bitacora_tomo_{numero:03d}.pdf", 'w', force_zip64=True) as tomo:
+                _escribir_tomo(tomo, parte, f"{titulo} (tomo {numero} de {tomos})", avanzar)
+    return tomos
+
+
+def _escribir_tomo(destino, registros, titulo, avanzar):
+    """Dibuja un PDF con una tabla pequeña por página."""
+    estilo_titulo = getSampleStyleSheet()['Heading1'].clone('TituloBitacora', alignment=1)
+    ancho, alto = TAMANO_PAGINA
+    pdf = canvas.Canvas(destino, pagesize=TAMANO_PAGINA, pageCompression=1)
+    pdf.setTitle(titulo)
+
+    pagina = 1
+    arriba = alto - MARGEN
+
+    # Título solo en la primera página
+    parrafo = Paragraph(titulo, estilo_titulo)
+    _, alto_titulo = parrafo.wrapOn(pdf, ancho - 2 * MARGEN, alto)
+    parrafo.drawOn(pdf, MARGEN, arriba - alto_titulo)
+    arriba -= alto_titulo + 12
+
+    def dibujar(filas):
+        tabla = Table([ENCABEZADO_PDF] + filas, colWidths=ANCHOS_COLUMNAS, style=ESTILO_TABLA)
+        ancho_tabla, alto_tabla = tabla.wrapOn(pdf, ancho - 2 * MARGEN, arriba - MARGEN)
+        tabla.drawOn(pdf, (ancho - ancho_tabla) / 2, arriba - alto_tabla)
+        pdf.setFont('Helvetica', 8)
+        pdf.drawRightString(ancho - MARGEN, MARGEN / 2, f"Página {pagina}")
+        pdf.showPage()
+        avanzar(len(filas))
+
+    filas = []
+    capacidad = FILAS_PRIMERA_PAGINA
+    dibujadas = 0
+    for log in registros:
+        filas.append(_fila_pdf(log))
+        if len(filas) == capacidad:
+            dibujar(filas)
+            dibujadas += len(filas)
+            filas = []
+            pagina += 1
+            capacidad = FILAS_POR_PAGINA
+            arriba = alto - MARGEN
+
+    if filas or dibujadas == 0:
+        dibujar(filas)
+
+    pdf.save()
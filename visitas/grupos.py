@@ -0,0 +1,171 @@
+# ==========================================
+# IMPORTACIONES
+# ==========================================
+import csv
+from collections import Counter
+
+from django.db import transaction
+from django.utils import timezone
+
+from .busqueda import normalizar_cedula, vaciar_busqueda
+from .estadisticas import rango_del_dia
+from .models import ResumenVisitas, Visita, Visitante, normalizar_nombre
+
+# ==========================================
+# REGISTRO DE GRUPOS Y DELEGACIONES
+# ==========================================
+# Una delegación de 20 a 200 personas se registra con un solo formulario: la
+# lista (pegada desde una hoja de cálculo o como archivo CSV) comparte motivo,
+# a quién visita y observaciones. Se valida fila por fila y, si no hay
+# errores, todo entra en una transacción con un número fijo de consultas:
+# upsert de los visitantes, bulk_create de las visitas y los resúmenes.
+
+MAXIMO_PERSONAS = 500
+COLUMNAS = ('cedula', 'nombre_completo', 'telefono')
+LARGO_MAXIMO = {campo: Visitante._meta.get_field(campo).max_length for campo in COLUMNAS}
+
+
+class GrupoInvalido(Exception):
+    """La lista tiene errores; 'errores' es una lista de (línea, mensaje)."""
+
+    def __init__(self, errores):
+        super().__init__(f"{len(errores)} errores en la lista")
+        self.errores = errores
+
+
+def leer_lista(texto):
+    """
+    Convierte la lista en filas {'linea', 'cedula', 'nombre_completo', 'telefono'}.
+
+    Una persona por línea: cédula, nombre completo y teléfono (opcional),
+    separados por coma, punto y coma o tabulador. Se ignoran las líneas
+    vacías y una primera línea de encabezados.
+    """
+    lineas = texto.splitlines()
+    try:
+        dialecto = csv.Sniffer().sniff('\n'.join(lineas[:20]), delimiters=',;\t')
+    except csv.Error:
+        dialecto = csv.excel
+    filas = []
+    for numero, celdas in enumerate(csv.reader(lineas, dialecto), start=1):
+        celdas = [celda.strip() for celda in celdas]
+        if not any(celdas):
+            continue
+        if not filas and normalizar_nombre(celdas[0]).replace('.', '') in ('cedula', 'ci'):
+            continue
+        celdas += [''] * (len(COLUMNAS) - len(celdas))
+        fila = dict(zip(COLUMNAS, celdas))
+        fila['linea'] = numero
+        fila['cedula'] = normalizar_cedula(fila['cedula'])
+        filas.append(fila)
+    return filas
+
+
+def leer_archivo(archivo):
+    """Lista subida como CSV (UTF-8 o, si no lo es, Latin-1 como la guarda Excel)."""
+    datos = archivo.read()
+    try:
+        return leer_lista(datos.decode('utf-8-sig'))
+    except UnicodeDecodeError:
+        return leer_lista(datos.decode('latin-1'))
+
+
+def registrar_grupo(filas, motivo, a_quien_visita, observaciones='', estatus='natural'):
+    """
+    Registra el ingreso de todas las 'filas' (ver leer_lista) en una transacción.
+
+    Los visitantes nuevos se crean con 'estatus'; a los que ya existen solo se
+    les actualiza el nombre y, si viene, el teléfono. Lanza GrupoInvalido sin
+    guardar nada si alguna fila no es válida. Devuelve las visitas creadas.
+    """
+    if not motivo or not a_quien_visita:
+        raise GrupoInvalido([(None, "Indique el motivo y a quién visita el grupo.")])
+    existentes = _validar(filas)
+
+    with transaction.atomic():
+        # Un upsert por combinación de campos a actualizar (con o sin teléfono)
+        visitantes = {}
+        for con_telefono in (True, False):
+            lote = [
+                Visitante(
+                    cedula=fila['cedula'],
+                    nombre_completo=fila['nombre_completo'],
+                    nombre_normalizado=normalizar_nombre(fila['nombre_completo']),
+                    telefono=fila['telefono'],
+                    estatus=estatus,
+                )
+                for fila in filas if bool(fila['telefono']) == con_telefono
+            ]
+            if lote:
+                campos = ['nombre_completo', 'nombre_normalizado', 'actualizado']
+                if con_telefono:
+                    campos.append('telefono')
+                Visitante.objects.bulk_create(lote, update_conflicts=True, unique_fields=['cedula'], update_fields=campos)
+                visitantes.update((visitante.cedula, visitante) for visitante in lote)
+
+        # Las visitas siguen el orden de la lista ('entrada' la pone auto_now_add).
+        # bulk_create no llama a save(): el estatus de cada visita se pone aquí
+        visitas = Visita.objects.bulk_create([
+            Visita(
+                visitante=visitantes[fila['cedula']],
+                motivo=motivo,
+                a_quien_visita=a_quien_visita,
+                observaciones=observaciones,
+                estatus=existentes.get(fila['cedula'], estatus),
+            )
+            for fila in filas
+        ])
+
+        # bulk_create no envía señales: los resúmenes se suman aquí, una vez por
+        # estatus, con la entrada del último (todas caen en el mismo instante)
+        entrada = visitas[-1].entrada
+        por_estatus = Counter(visita.estatus for visita in visitas)
+        for estatus_visitante, total in por_estatus.items():
+            ResumenVisitas.sumar(entrada, estatus_visitante, entradas=total)
+        Visitante.sumar_entradas([visitante.pk for visitante in visitantes.values()], entrada)
+
+    vaciar_busqueda(Visitante)
+    return visitas
+
+
+def _validar(filas):
+    """Comprueba las filas; devuelve {cédula: estatus} de los visitantes que ya existen."""
+    errores = []
+    if not filas:
+        errores.append((None, "La lista está vacía."))
+    elif len(filas) > MAXIMO_PERSONAS:
+        errores.append((None, f"La lista tiene {len(filas)} personas; el máximo por registro es {MAXIMO_PERSONAS}."))
+    if errores:
+        raise GrupoInvalido(errores)
+
+    repetidas = {cedula for cedula, veces in Counter(fila['cedula'] for fila in filas).items() if veces > 1}
+    for fila in filas:
+        if not fila['cedula']:
+            errores.append((fila['linea'], "Falta la cédula."))
+        elif fila['cedula'] in repetidas:
+            errores.append((fila['linea'], f"La cédula {fila['cedula']} aparece más de una vez en la lista."))
+        if not fila['nombre_completo']:
+            errores.append((fila['linea'], "Falta el nombre completo."))
+        for campo, largo in LARGO_MAXIMO.items():
+            if len(fila[campo]) > largo:
+                errores.append((fila['linea'], f"El campo {campo} supera los {largo} caracteres."))
+    if errores:
+        raise GrupoInvalido(errores)
+
+    # Dos consultas para toda la lista: visitantes conocidos y sus ingresos abiertos de hoy
+    cedulas = [fila['cedula'] for fila in filas]
+    existentes = dict(Visitante.objects.filter(cedula__in=cedulas).values_list('cedula', 'estatus'))
+    inicio, fin = rango_del_dia(timezone.localdate())
+    abiertas = set(
+        Visita.objects.filter(
+            visitante__cedula__in=cedulas, salida__isnull=True, entrada__gte=inicio, entrada__lt=fin,
+        ).values_list('visitante__cedula', flat=True)
+    )
+    for fila in filas:
+        if existentes.get(fila['cedula']) == 'denegado':
+            errores.append((fila['linea'], f"La cédula {fila['cedula']} tiene el acceso denegado."))
+        elif fila['cedula'] in abiertas:
+            errores.append((fila['linea'], f"La cédula {fila['cedula']} ya tiene un ingreso abierto hoy."))
+    if errores:
+        raise GrupoInvalido(errores)
+    return existentes
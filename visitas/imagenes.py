@@ -0,0 +1,195 @@
+# ==========================================
+# IMPORTACIONES
+# ==========================================
+import hashlib
+import io
+import logging
+import posixpath
+import time
+import uuid
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.template.defaultfilters import filesizeformat
+from PIL import Image, ImageOps, features
+
+logger = logging.getLogger(__name__)
+
+# ==========================================
+# MINIATURAS DE LAS FOTOS DE VISITANTES
+# ==========================================
+# Las páginas muestran las fotos a 40-200 px, pero la original suele ser un
+# PNG de varios MB tomado con el teléfono. Al guardar una foto se generan
+# versiones reducidas en MEDIA_ROOT/miniaturas/<tamaño>/, con la misma ruta
+# que la original; las plantillas las piden con {% miniatura foto 48 %}.
+
+TAMANOS_MINIATURA = (48, 100, 300)
+CARPETA_MINIATURAS = 'miniaturas'
+if features.check('webp'):
+    FORMATO_MINIATURA, EXTENSION_MINIATURA = 'WEBP', 'webp'
+else:
+    FORMATO_MINIATURA, EXTENSION_MINIATURA = 'JPEG', 'jpg'
+CALIDAD_MINIATURA = 80
+
+
+def ruta_miniatura(nombre, tamano):
+    """Ruta en el almacenamiento de la miniatura de 'nombre' (ej. visitantes/a.png -> miniaturas/48/visitantes/a.webp)."""
+    base, _ = posixpath.splitext(nombre)
+    return f"{CARPETA_MINIATURAS}/{tamano}/{base}.{EXTENSION_MINIATURA}"
+
+
+def tamano_adecuado(pixeles):
+    """El menor tamaño de miniatura que cubre 'pixeles' (o el mayor si ninguno alcanza)."""
+    for tamano in TAMANOS_MINIATURA:
+        if tamano >= pixeles:
+            return tamano
+    return TAMANOS_MINIATURA[-1]
+
+
+def tiene_miniaturas(nombre):
+    return all(default_storage.exists(ruta_miniatura(nombre, tamano)) for tamano in TAMANOS_MINIATURA)
+
+
+def generar_miniaturas(nombre, forzar=False):
+    """
+    Genera las miniaturas de la imagen 'nombre' del almacenamiento.
+    Devuelve False si la imagen no existe o no se puede leer.
+    """
+    if not forzar and tiene_miniaturas(nombre):
+        return True
+    try:
+        with default_storage.open(nombre, 'rb') as archivo:
+            imagen = Image.open(archivo)
+            # Las fotos del teléfono vienen giradas por EXIF
+            imagen = ImageOps.exif_transpose(imagen)
+            imagen.load()
+    except (OSError, Image.DecompressionBombError) as error:
+        logger.warning("No se pudieron generar las miniaturas de %s: %s", nombre, error)
+        return False
+
+    if FORMATO_MINIATURA == 'JPEG' or imagen.mode not in ('RGB', 'RGBA'):
+        imagen = imagen.convert('RGBA' if FORMATO_MINIATURA == 'WEBP' and 'A' in imagen.getbands() else 'RGB')
+
+    # De mayor a menor: cada reducción parte de la anterior, que ya es pequeña
+    for tamano in sorted(TAMANOS_MINIATURA, reverse=True):
+        if min(imagen.size) > tamano:
+            # Lado menor = tamaño: cubre un cuadro de tamaño x tamaño (object-fit: cover)
+            imagen = ImageOps.cover(imagen, (tamano, tamano), method=Image.Resampling.LANCZOS)
+        contenido = io.BytesIO()
+        imagen.save(contenido, FORMATO_MINIATURA, quality=CALIDAD_MINIATURA)
+
+        ruta = ruta_miniatura(nombre, tamano)
+        if default_storage.exists(ruta):
+            default_storage.delete(ruta)
+        default_storage.save(ruta, ContentFile(contenido.getvalue()))
+    return True
+
+# ==========================================
+# NORMALIZACIÓN DE FOTOS AL SUBIRLAS
+# ==========================================
+# La foto subida se valida, se endereza según EXIF, se reduce a
+# FOTO_LADO_MAXIMO y se vuelve a codificar en JPEG sin metadatos (ubicación
+# GPS, modelo del teléfono...). El nombre es el hash del resultado: volver a
+# subir la misma imagen reutiliza el archivo en lugar de duplicarlo.
+
+FOTO_LADO_MAXIMO = getattr(settings, 'FOTO_LADO_MAXIMO', 1280)
+FOTO_CALIDAD = getattr(settings, 'FOTO_CALIDAD', 85)
+CARPETA_FOTOS = 'visitantes'
+
+
+class FotoInvalida(Exception):
+    pass
+
+
+def guardar_foto(archivo):
+    """
+    Normaliza y guarda una foto subida (UploadedFile).
+
+    Devuelve (nombre, estadisticas): el nombre en el almacenamiento, listo
+    para asignar a un ImageField, y un dict con tamaños y tiempo empleado.
+    Lanza FotoInvalida si el archivo no es una imagen legible.
+    """
+    inicio = time.monotonic()
+    try:
+        imagen = Image.open(archivo)
+        imagen = ImageOps.exif_transpose(imagen)
+        imagen.load()
+    except (OSError, SyntaxError, ValueError, Image.DecompressionBombError) as error:
+        raise FotoInvalida("El archivo de la foto no es una imagen válida.") from error
+    dimensiones_originales = imagen.size
+
+    imagen.thumbnail((FOTO_LADO_MAXIMO, FOTO_LADO_MAXIMO), Image.Resampling.LANCZOS)
+    if 'A' in imagen.getbands() or imagen.mode == 'P':
+        # JPEG no tiene transparencia: se aplana sobre fondo blanco
+        rgba = imagen.convert('RGBA')
+        imagen = Image.new('RGB', rgba.size, 'white')
+        imagen.paste(rgba, mask=rgba.getchannel('A'))
+    elif imagen.mode != 'RGB':
+        imagen = imagen.convert('RGB')
+
+    contenido = io.BytesIO()
+    imagen.save(contenido, 'JPEG', quality=FOTO_CALIDAD, optimize=True, progressive=True)
+    datos = contenido.getvalue()
+    nombre = f"{CARPETA_FOTOS}/{hashlib.sha256(datos).hexdigest()}.jpg"
+    reutilizada = default_storage.exists(nombre)
+    if not reutilizada:
+        default_storage.save(nombre, ContentFile(datos))
+
+    estadisticas = {
+        'bytes_originales': archivo.size,
+        'bytes_guardados': len(datos),
+        'dimensiones_originales': dimensiones_originales,
+        'dimensiones': imagen.size,
+        'reutilizada': reutilizada,
+        'segundos': time.monotonic() - inicio,
+    }
+    logger.info("Foto %s: %s", nombre, describir_foto(estadisticas))
+    return nombre, estadisticas
+
+
+def _tamano(bytes_):
+    # filesizeformat separa con espacio de no separación
+    return filesizeformat(bytes_).replace('\xa0', ' ')
+
+
+def describir_foto(estadisticas):
+    """Resumen legible de las estadísticas de guardar_foto() (para la bitácora)."""
+    ancho, alto = estadisticas['dimensiones_originales']
+    ancho_final, alto_final = estadisticas['dimensiones']
+    texto = (
+        f"Foto {_tamano(estadisticas['bytes_originales'])} ({ancho}x{alto}) -> "
+        f"{_tamano(estadisticas['bytes_guardados'])} ({ancho_final}x{alto_final}) "
+        f"en {estadisticas['segundos']:.2f} s"
+    )
+    if estadisticas['reutilizada']:
+        texto += ", ya existía"
+    return texto
+
+# ==========================================
+# PROCESAMIENTO EN SEGUNDO PLANO
+# ==========================================
+# Decodificar y volver a codificar una foto grande tarda segundos. La vista
+# solo comprueba la cabecera y deja el archivo tal cual en CARPETA_PENDIENTES;
+# el trabajo 'procesar_foto' del runworker la normaliza con guardar_foto(),
+# genera las miniaturas y la asigna al visitante.
+
+CARPETA_PENDIENTES = f'{CARPETA_FOTOS}/pendientes'
+
+
+def recibir_foto(archivo):
+    """
+    Guarda sin procesar una foto subida (UploadedFile) para el runworker.
+
+    Solo lee la cabecera, así que tarda lo mismo sea cual sea el tamaño de la
+    foto. Devuelve el nombre en el almacenamiento; lanza FotoInvalida si el
+    archivo no es una imagen.
+    """
+    try:
+        with Image.open(archivo) as imagen:
+            extension = imagen.format.lower()
+    except (OSError, SyntaxError, ValueError, Image.DecompressionBombError) as error:
+        raise FotoInvalida("El archivo de la foto no es una imagen válida.") from error
+    archivo.seek(0)
+    # Las subidas grandes ya están en un temporal: el almacenamiento solo lo mueve
+    return default_storage.save(f"{CARPETA_PENDIENTES}/{uuid.uuid4().hex}.{extension}", archivo)
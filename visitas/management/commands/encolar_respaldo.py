@@ -0,0 +1,20 @@
+from django.core.management.base import BaseCommand
+
+from visitas.trabajos import encolar
+
+
+class Command(BaseCommand):
+    help = (
+        "Encola un respaldo de la base de datos para que lo genere 'runworker'. "
+        "Pensado para el Programador de tareas (ej. un incremental cada noche y un completo cada semana)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--incremental', action='store_true',
+            help="Solo los cambios desde el último respaldo (si no hay ninguno, se hace completo)",
+        )
+
+    def handle(self, *args, **options):
+        trabajo = encolar('respaldo', formato='json', incremental=options['incremental'])
+        self.stdout.write(self.style.SUCCESS(f"Respaldo encolado: trabajo #{trabajo.pk}"))
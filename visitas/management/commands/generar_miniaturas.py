@@ -0,0 +1,25 @@
+from django.core.management.base import BaseCommand
+
+from visitas.imagenes import generar_miniaturas
+from visitas.models import Visitante
+
+
+class Command(BaseCommand):
+    help = "Genera las miniaturas de las fotos de visitantes que aún no las tienen (fotos subidas antes de esta versión)."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--forzar', action='store_true', help="Vuelve a generar también las que ya existen")
+
+    def handle(self, *args, **options):
+        fotos = (
+            Visitante.objects.exclude(foto__isnull=True).exclude(foto='')
+            .order_by().values_list('foto', flat=True).distinct()
+        )
+        generadas = fallidas = 0
+        for nombre in fotos.iterator():
+            if generar_miniaturas(nombre, forzar=options['forzar']):
+                generadas += 1
+            else:
+                fallidas += 1
+                self.stderr.write(f"No se pudo leer {nombre}")
+        self.stdout.write(self.style.SUCCESS(f"Fotos procesadas: {generadas}. Sin miniaturas: {fallidas}."))
@@ -0,0 +1,109 @@
+import statistics
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+
+from visitas.busqueda import buscar_visitas
+from visitas.models import Visita
+
+TERMINOS = ['jose', 'Pérez', 'maria gonzales', 'PRUEBA-12345', '4567']
+
+NOMBRES = ['José', 'María', 'Luis', 'Ana', 'Carlos', 'Andrés', 'Sofía', 'Jesús', 'Ramón', 'Inés', 'Pedro', 'Carmen']
+APELLIDOS = [
+    'Pérez', 'González', 'Rodríguez', 'Hernández', 'Martínez', 'García', 'López', 'Díaz',
+    'Peña', 'Suárez', 'Ramírez', 'Torres', 'Rojas', 'Mendoza', 'Castillo', 'Álvarez',
+]
+PREFIJO = 'PRUEBA-'  # Cédulas de los datos de prueba (no coinciden con cédulas reales)
+
+
+class Command(BaseCommand):
+    help = (
+        "Mide la búsqueda del Historial de visitas (nombre o cédula) con los datos actuales. "
+        "--poblar genera visitantes y visitas de prueba (solo PostgreSQL; usar en una copia de la base)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('terminos', nargs='*', default=TERMINOS, help="Textos a buscar")
+        parser.add_argument('--repeticiones', type=int, default=20)
+        parser.add_argument(
+            '--poblar', nargs=2, type=int, metavar=('VISITANTES', 'VISITAS'),
+            help=f"Inserta datos de prueba (cédulas {PREFIJO}...) antes de medir, ej. --poblar 500000 5000000",
+        )
+        parser.add_argument('--limpiar', action='store_true', help="Borra los datos de prueba al terminar")
+
+    def handle(self, *args, **options):
+        if options['poblar']:
+            self._poblar(*options['poblar'])
+
+        for termino in options['terminos']:
+            self._medir(termino, options['repeticiones'])
+
+        if options['limpiar']:
+            self._limpiar()
+
+    def _medir(self, termino, repeticiones):
+        queryset = buscar_visitas(Visita.objects.select_related('visitante'), termino).order_by('-rango', '-entrada')
+        tiempos = []
+        for _ in range(repeticiones):
+            inicio = time.monotonic()
+            # Lo mismo que hace el Paginator de visitor_reports_view: contar y traer una página
+            total = queryset.count()
+            list(queryset[:10])
+            tiempos.append((time.monotonic() - inicio) * 1000)
+
+        usa_indice = ''
+        if connection.vendor == 'postgresql':
+            plan = queryset.explain()
+            usa_indice = ', índice trgm' if '_trgm_idx' in plan else ', SIN índice trgm'
+        self.stdout.write(
+            f"{termino!r:<18} {total:>8} visitas  mediana {statistics.median(tiempos):7.1f} ms  "
+            f"máximo {max(tiempos):7.1f} ms{usa_indice}"
+        )
+
+    def _poblar(self, visitantes, visitas):
+        if connection.vendor != 'postgresql':
+            raise CommandError("--poblar solo está disponible en PostgreSQL.")
+        inicio = time.monotonic()
+        with transaction.atomic(), connection.cursor() as cursor:
+            # Nombres combinados de las listas; 'unaccent' lo instala la migración 0015
+            cursor.execute(
+                """
+                INSERT INTO visitas_visitante
+                    (cedula, nombre_completo, nombre_normalizado, foto, foto_estado, correo, telefono, estatus,
+                     total_visitas, actualizado)
+                SELECT %s || g, n, lower(unaccent(n)), '', 'lista', '', '', 'natural', 0, now()
+                FROM generate_series(1, %s) AS g,
+                     LATERAL (SELECT (%s::text[])[1 + g %% %s] || ' ' || (%s::text[])[1 + (g / 7) %% %s]
+                                     || ' ' || (%s::text[])[1 + (g / 13) %% %s] AS n) AS nombres
+                """,
+                [PREFIJO, visitantes, NOMBRES, len(NOMBRES), APELLIDOS, len(APELLIDOS), APELLIDOS, len(APELLIDOS)],
+            )
+            cursor.execute("SELECT min(id), max(id) FROM visitas_visitante WHERE cedula LIKE %s", [PREFIJO + '%'])
+            primero, ultimo = cursor.fetchone()
+            cursor.execute(
+                """
+                INSERT INTO visitas_visita
+                    (visitante_id, motivo, a_quien_visita, entrada, salida, observaciones, estatus, actualizado)
+                SELECT v.id, 'Prueba de búsqueda', 'Sistemas', e, e + interval '2 hours', '', v.estatus, now()
+                FROM (SELECT %s + (random() * %s)::int AS id, now() - random() * interval '730 days' AS e
+                      FROM generate_series(1, %s)) AS datos
+                JOIN visitas_visitante v ON v.id = datos.id
+                """,
+                [primero, ultimo - primero, visitas],
+            )
+            cursor.execute("ANALYZE visitas_visitante")
+            cursor.execute("ANALYZE visitas_visita")
+        self.stdout.write(self.style.SUCCESS(
+            f"Datos de prueba: {visitantes} visitantes y {visitas} visitas en {time.monotonic() - inicio:.0f} s"
+        ))
+
+    def _limpiar(self):
+        with transaction.atomic(), connection.cursor() as cursor:
+            cursor.execute(
+                "DELETE FROM visitas_visita WHERE visitante_id IN "
+                "(SELECT id FROM visitas_visitante WHERE cedula LIKE %s)",
+                [PREFIJO + '%'],
+            )
+            cursor.execute("DELETE FROM visitas_visitante WHERE cedula LIKE %s", [PREFIJO + '%'])
+        self.stdout.write("Datos de prueba eliminados")
@@ -0,0 +1,151 @@
+import datetime
+import statistics
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+from visitas.estadisticas import estadisticas_dashboard, reconstruir_resumen
+from visitas.models import Visita
+
+PREFIJO = 'PRUEBA-EST-'  # Cédulas de los datos de prueba (no coinciden con cédulas reales)
+TARJETAS = ('visitantes_hoy', 'visitantes_activos', 'visitas_mes_actual', 'visitas_mes_anterior', 'chart_data')
+
+
+def estadisticas_anteriores():
+    """
+    Lo que calculaba dashboard_view antes de estadisticas.py: una COUNT por
+    tarjeta y otra por cada día del gráfico, con entrada__date (sin índice).
+    """
+    now = timezone.localtime(timezone.now())
+    today = now.date()
+    visitantes_hoy = Visita.objects.filter(entrada__date=today).count()
+    visitantes_activos = Visita.objects.filter(salida__isnull=True).count()
+
+    first_day_current = now.replace(day=1)
+    last_month_end = first_day_current - datetime.timedelta(days=1)
+    first_day_last = last_month_end.replace(day=1)
+    visitas_mes_actual = Visita.objects.filter(entrada__gte=first_day_current).count()
+    visitas_mes_anterior = Visita.objects.filter(entrada__gte=first_day_last, entrada__lt=first_day_current).count()
+
+    data = []
+    for i in range(6, -1, -1):
+        day = today - datetime.timedelta(days=i)
+        data.append(Visita.objects.filter(entrada__date=day).count())
+
+    return {
+        'visitantes_hoy': visitantes_hoy,
+        'visitantes_activos': visitantes_activos,
+        'visitas_mes_actual': visitas_mes_actual,
+        'visitas_mes_anterior': visitas_mes_anterior,
+        'chart_data': data,
+    }
+
+
+class Command(BaseCommand):
+    help = (
+        "Compara el cálculo del dashboard de antes (una COUNT por tarjeta y por día) con "
+        "estadisticas_dashboard() sobre los datos actuales. --poblar genera visitas de prueba "
+        "(solo PostgreSQL; usar en una copia de la base)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--repeticiones', type=int, default=20)
+        parser.add_argument(
+            '--poblar', nargs=2, type=int, metavar=('VISITANTES', 'VISITAS'),
+            help=f"Inserta datos de prueba (cédulas {PREFIJO}...) antes de medir, ej. --poblar 100000 1000000",
+        )
+        parser.add_argument('--limpiar', action='store_true', help="Borra los datos de prueba al terminar")
+
+    def handle(self, *args, **options):
+        if options['poblar']:
+            self._poblar(*options['poblar'])
+
+        total = Visita.objects.count()
+        self.stdout.write(f"{total} visitas en la tabla")
+        anterior = self._medir("Anterior (COUNT por día)", estadisticas_anteriores, options['repeticiones'])
+        actual = self._medir("estadisticas_dashboard()", estadisticas_dashboard, options['repeticiones'])
+
+        distintas = [tarjeta for tarjeta in TARJETAS if anterior[tarjeta] != actual[tarjeta]]
+        if distintas:
+            if set(distintas) <= {'visitas_mes_actual', 'visitas_mes_anterior'}:
+                motivo = "el cálculo anterior empezaba el mes a la hora actual del día 1, no a las 00:00"
+            else:
+                motivo = "ResumenVisitas no coincide con Visita; ejecute reconstruir_resumen"
+            self.stdout.write(self.style.WARNING(f"Resultados distintos en {', '.join(distintas)}: {motivo}"))
+        else:
+            self.stdout.write(self.style.SUCCESS("Ambos cálculos dan los mismos resultados"))
+
+        if options['limpiar']:
+            self._limpiar()
+
+    def _medir(self, nombre, calcular, repeticiones):
+        tiempos = []
+        for _ in range(repeticiones):
+            with CaptureQueriesContext(connection) as consultas:
+                inicio = time.monotonic()
+                resultado = calcular()
+                tiempos.append((time.monotonic() - inicio) * 1000)
+        self.stdout.write(
+            f"{nombre:<26} {len(consultas):>3} consultas  mediana {statistics.median(tiempos):8.1f} ms  "
+            f"máximo {max(tiempos):8.1f} ms"
+        )
+        return resultado
+
+    def _poblar(self, visitantes, visitas):
+        if connection.vendor != 'postgresql':
+            raise CommandError("--poblar solo está disponible en PostgreSQL.")
+        inicio = time.monotonic()
+        with transaction.atomic(), connection.cursor() as cursor:
+            cursor.execute(
+                """
+                INSERT INTO visitas_visitante
+                    (cedula, nombre_completo, nombre_normalizado, foto, foto_estado, correo, telefono, estatus,
+                     total_visitas, actualizado)
+                SELECT %s || g, 'Prueba ' || g, 'prueba ' || g, '', 'lista', '', '',
+                       (ARRAY['natural', 'empleado', 'externo'])[1 + g %% 3], 0, now()
+                FROM generate_series(1, %s) AS g
+                """,
+                [PREFIJO, visitantes],
+            )
+            cursor.execute("SELECT min(id), max(id) FROM visitas_visitante WHERE cedula LIKE %s", [PREFIJO + '%'])
+            primero, ultimo = cursor.fetchone()
+            # Dos años de historial; las visitas de las últimas 8 horas siguen abiertas
+            # (ON CONFLICT: se omite la segunda visita abierta del mismo visitante y día)
+            cursor.execute(
+                """
+                INSERT INTO visitas_visita
+                    (visitante_id, motivo, a_quien_visita, entrada, salida, observaciones, estatus, actualizado)
+                SELECT datos.id, 'Prueba de estadísticas', 'Sistemas', datos.e,
+                       CASE WHEN datos.e < now() - interval '8 hours' THEN datos.e + interval '2 hours' END, '',
+                       v.estatus, now()
+                FROM (SELECT %s + (random() * %s)::int AS id, now() - random() * interval '730 days' AS e
+                      FROM generate_series(1, %s)) AS datos
+                JOIN visitas_visitante v ON v.id = datos.id
+                ON CONFLICT DO NOTHING
+                """,
+                [primero, ultimo - primero, visitas],
+            )
+            cursor.execute("ANALYZE visitas_visitante")
+            cursor.execute("ANALYZE visitas_visita")
+        self.stdout.write(self.style.SUCCESS(
+            f"Datos de prueba: {visitantes} visitantes y {visitas} visitas en {time.monotonic() - inicio:.0f} s"
+        ))
+
+        # Las filas se insertaron sin señales: el resumen se rehace desde Visita
+        inicio = time.monotonic()
+        filas = reconstruir_resumen()
+        self.stdout.write(f"ResumenVisitas reconstruido: {filas} filas en {time.monotonic() - inicio:.0f} s")
+
+    def _limpiar(self):
+        with transaction.atomic(), connection.cursor() as cursor:
+            cursor.execute(
+                "DELETE FROM visitas_visita WHERE visitante_id IN "
+                "(SELECT id FROM visitas_visitante WHERE cedula LIKE %s)",
+                [PREFIJO + '%'],
+            )
+            cursor.execute("DELETE FROM visitas_visitante WHERE cedula LIKE %s", [PREFIJO + '%'])
+        reconstruir_resumen()
+        self.stdout.write("Datos de prueba eliminados y resumen reconstruido")
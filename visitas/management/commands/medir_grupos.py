@@ -0,0 +1,43 @@
+import statistics
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext
+
+from visitas.grupos import MAXIMO_PERSONAS, registrar_grupo
+
+PREFIJO = 'PRUEBA-GRUPO-'  # Cédulas de los datos de prueba (no coinciden con cédulas reales)
+
+
+class Command(BaseCommand):
+    help = (
+        "Mide el registro de un grupo (validación, upsert de visitantes, visitas y resúmenes) "
+        "con una lista de prueba. Cada repetición se revierte: la base queda como estaba."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--personas', type=int, default=200, help="Tamaño de la lista")
+        parser.add_argument('--repeticiones', type=int, default=10)
+
+    def handle(self, *args, **options):
+        personas = options['personas']
+        if not 1 <= personas <= MAXIMO_PERSONAS:
+            raise CommandError(f"--personas debe estar entre 1 y {MAXIMO_PERSONAS}.")
+        filas = [
+            {'linea': i, 'cedula': f"{PREFIJO}{i}", 'nombre_completo': f"Persona de prueba {i}", 'telefono': ''}
+            for i in range(1, personas + 1)
+        ]
+
+        tiempos = []
+        for _ in range(options['repeticiones']):
+            with transaction.atomic(), CaptureQueriesContext(connection) as consultas:
+                inicio = time.monotonic()
+                registrar_grupo(filas, 'Prueba de grupo', 'Sistemas')
+                tiempos.append((time.monotonic() - inicio) * 1000)
+                transaction.set_rollback(True)
+
+        self.stdout.write(
+            f"{personas} personas  {len(consultas)} consultas  "
+            f"mediana {statistics.median(tiempos):7.1f} ms  máximo {max(tiempos):7.1f} ms"
+        )
@@ -0,0 +1,173 @@
+import datetime
+import gzip
+import os
+import re
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.utils import timezone
+
+from visitas.estadisticas import inicio_del_dia
+
+TABLA = 'visitas_bitacora'
+PARTICION_DEFECTO = f'{TABLA}_default'
+PATRON_PARTICION = re.compile(rf'^{TABLA}_p(\d{{4}})_(\d{{2}})$')
+# Columnas reales; 'busqueda' (migración 0015) es calculada y no se copia
+COLUMNAS = 'id, usuario_id, accion, detalles, ip_origen, fecha_hora'
+CREAR_COMO_PADRE = f'(LIKE {TABLA} INCLUDING DEFAULTS INCLUDING GENERATED)'
+
+
+def _mes_siguiente(fecha):
+    return (fecha.replace(day=28) + datetime.timedelta(days=4)).replace(day=1)
+
+
+def _mes_anterior(fecha, meses):
+    for _ in range(meses):
+        fecha = (fecha.replace(day=1) - datetime.timedelta(days=1)).replace(day=1)
+    return fecha
+
+
+def _limite(fecha):
+    # Medianoche del día 1 en la zona del sistema (TIME_ZONE), igual que en la migración 0013:
+    # así cada partición guarda el mes que muestran el visor y las estadísticas
+    return inicio_del_dia(fecha.replace(day=1)).isoformat()
+
+
+def _nombre_particion(mes):
+    return f'{TABLA}_p{mes:%Y_%m}'
+
+
+class Command(BaseCommand):
+    help = (
+        "Mantenimiento de las particiones mensuales de la Bitácora (solo PostgreSQL): "
+        "crear meses futuros, archivar meses viejos en archivos comprimidos y reincorporarlos."
+    )
+
+    def add_arguments(self, parser):
+        sub = parser.add_subparsers(dest='accion', required=True)
+
+        sub.add_parser('listar', help="Muestra las particiones existentes y sus filas aproximadas")
+
+        crear = sub.add_parser('crear', help="Crea las particiones de los próximos meses")
+        crear.add_argument('--meses', type=int, default=3, help="Meses hacia adelante (por defecto 3)")
+
+        archivar = sub.add_parser('archivar', help="Separa y comprime las particiones más viejas que la retención")
+        archivar.add_argument(
+            '--retener-meses', type=int,
+            default=getattr(settings, 'BITACORA_RETENCION_MESES', 24),
+            help="Meses que se conservan en la base de datos",
+        )
+        archivar.add_argument('--directorio', default=getattr(settings, 'BITACORA_DIR_ARCHIVO', None))
+        archivar.add_argument('--simular', action='store_true', help="Solo muestra qué se archivaría")
+
+        reincorporar = sub.add_parser('reincorporar', help="Vuelve a adjuntar un mes desde su archivo .csv.gz")
+        reincorporar.add_argument('archivo')
+
+    def handle(self, *args, **options):
+        if connection.vendor != 'postgresql':
+            raise CommandError("El particionado de la bitácora solo está disponible en PostgreSQL.")
+        getattr(self, f"_{options['accion']}")(options)
+
+    # ------------------------------------------
+    # Consultas auxiliares
+    # ------------------------------------------
+    def _particiones(self):
+        """Lista de (mes, nombre) de las particiones mensuales adjuntas, en orden."""
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "SELECT c.relname FROM pg_inherits i "
+                "JOIN pg_class c ON c.oid = i.inhrelid "
+                "JOIN pg_class p ON p.oid = i.inhparent "
+                "WHERE p.relname = %s",
+                [TABLA],
+            )
+            nombres = [fila[0] for fila in cursor.fetchall()]
+        particiones = []
+        for nombre in nombres:
+            coincidencia = PATRON_PARTICION.match(nombre)
+            if coincidencia:
+                particiones.append((datetime.date(int(coincidencia[1]), int(coincidencia[2]), 1), nombre))
+        return sorted(particiones)
+
+    def _adjuntar_mes(self, cursor, mes, nombre):
+        """
+        Crea y adjunta la partición de un mes. Las filas de ese rango que hayan
+        caído en la partición por defecto se mueven a la nueva partición.
+        """
+        desde, hasta = _limite(mes), _limite(_mes_siguiente(mes))
+        cursor.execute(f"CREATE TABLE IF NOT EXISTS {nombre} {CREAR_COMO_PADRE}")
+        cursor.execute(
+            f"WITH movidas AS (DELETE FROM {PARTICION_DEFECTO} "
+            f"WHERE fecha_hora >= %s AND fecha_hora < %s RETURNING {COLUMNAS}) "
+            f"INSERT INTO {nombre} ({COLUMNAS}) SELECT {COLUMNAS} FROM movidas",
+            [desde, hasta],
+        )
+        cursor.execute(f"ALTER TABLE {TABLA} ATTACH PARTITION {nombre} FOR VALUES FROM ('{desde}') TO ('{hasta}')")
+
+    # ------------------------------------------
+    # Acciones
+    # ------------------------------------------
+    def _listar(self, options):
+        with connection.cursor() as cursor:
+            for mes, nombre in self._particiones() + [(None, PARTICION_DEFECTO)]:
+                cursor.execute("SELECT reltuples::bigint FROM pg_class WHERE relname = %s", [nombre])
+                filas = cursor.fetchone()
+                etiqueta = f"{mes:%Y-%m}" if mes else "defecto"
+                self.stdout.write(f"{etiqueta:>8}  {nombre}  ~{max(filas[0], 0) if filas else 0} filas")
+
+    def _crear(self, options):
+        existentes = {mes for mes, _ in self._particiones()}
+        mes = timezone.localdate().replace(day=1)
+        creadas = 0
+        with transaction.atomic(), connection.cursor() as cursor:
+            for _ in range(options['meses'] + 1):
+                if mes not in existentes:
+                    self._adjuntar_mes(cursor, mes, _nombre_particion(mes))
+                    creadas += 1
+                mes = _mes_siguiente(mes)
+        self.stdout.write(self.style.SUCCESS(f"Particiones creadas: {creadas}"))
+
+    def _archivar(self, options):
+        directorio = options['directorio'] or os.path.join(settings.BASE_DIR, 'archivo_bitacora')
+        limite = _mes_anterior(timezone.localdate().replace(day=1), options['retener_meses'])
+        viejas = [(mes, nombre) for mes, nombre in self._particiones() if mes < limite]
+        if not viejas:
+            self.stdout.write("No hay particiones fuera del período de retención.")
+            return
+
+        os.makedirs(directorio, exist_ok=True)
+        for mes, nombre in viejas:
+            destino = os.path.join(directorio, f"{nombre}.csv.gz")
+            if options['simular']:
+                self.stdout.write(f"Se archivaría {nombre} -> {destino}")
+                continue
+
+            temporal = destino + '.tmp'
+            # Separar, exportar y eliminar en una sola transacción: si algo falla, la partición vuelve
+            with transaction.atomic(), connection.cursor() as cursor:
+                cursor.execute(f"ALTER TABLE {TABLA} DETACH PARTITION {nombre}")
+                with gzip.open(temporal, 'wb') as archivo:
+                    cursor.copy_expert(f"COPY {nombre} ({COLUMNAS}) TO STDOUT WITH (FORMAT csv, HEADER)", archivo)
+                with open(temporal, 'rb') as archivo:
+                    os.fsync(archivo.fileno())
+                os.replace(temporal, destino)
+                cursor.execute(f"DROP TABLE {nombre}")
+            self.stdout.write(self.style.SUCCESS(f"Archivada {nombre} en {destino}"))
+
+    def _reincorporar(self, options):
+        archivo = options['archivo']
+        nombre = os.path.basename(archivo).split('.')[0]
+        coincidencia = PATRON_PARTICION.match(nombre)
+        if not coincidencia:
+            raise CommandError(f"El nombre del archivo no corresponde a una partición: {nombre}")
+        if not os.path.exists(archivo):
+            raise CommandError(f"No existe el archivo {archivo}")
+        mes = datetime.date(int(coincidencia[1]), int(coincidencia[2]), 1)
+
+        with transaction.atomic(), connection.cursor() as cursor:
+            cursor.execute(f"CREATE TABLE {nombre} {CREAR_COMO_PADRE}")
+            with gzip.open(archivo, 'rb') as origen:
+                cursor.copy_expert(f"COPY {nombre} ({COLUMNAS}) FROM STDIN WITH (FORMAT csv, HEADER)", origen)
+            self._adjuntar_mes(cursor, mes, nombre)
+        self.stdout.write(self.style.SUCCESS(f"Partición {nombre} reincorporada desde {archivo}"))
@@ -0,0 +1,27 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from visitas.models import Visitante
+
+
+class Command(BaseCommand):
+    help = (
+        "Recalcula la última entrada, la última salida y el total de visitas de cada "
+        "visitante (columnas del directorio) a partir de las visitas registradas."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--lote', type=int, default=5000, help="Visitantes por transacción")
+
+    def handle(self, *args, **options):
+        inicio = time.monotonic()
+        ids = list(Visitante.objects.order_by('pk').values_list('pk', flat=True))
+        # Por lotes: transacciones cortas que no bloquean el registro de visitas
+        for desde in range(0, len(ids), options['lote']):
+            with transaction.atomic():
+                Visitante.recalcular_resumen(ids[desde:desde + options['lote']])
+        self.stdout.write(self.style.SUCCESS(
+            f"Directorio reconstruido: {len(ids)} visitantes en {time.monotonic() - inicio:.1f} s."
+        ))
@@ -0,0 +1,29 @@
+import datetime
+
+from django.core.management.base import BaseCommand, CommandError
+
+from visitas.estadisticas import reconstruir_resumen
+
+
+def _fecha(valor):
+    try:
+        return datetime.date.fromisoformat(valor)
+    except ValueError:
+        raise CommandError(f"Fecha inválida '{valor}', use el formato AAAA-MM-DD")
+
+
+class Command(BaseCommand):
+    help = "Reconstruye (o rellena) la tabla ResumenVisitas a partir de las visitas registradas."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--desde', type=_fecha, help="Primer día a reconstruir (AAAA-MM-DD)")
+        parser.add_argument('--hasta', type=_fecha, help="Último día a reconstruir (AAAA-MM-DD)")
+
+    def handle(self, *args, **options):
+        desde, hasta = options['desde'], options['hasta']
+        if desde and hasta and desde > hasta:
+            raise CommandError("--desde no puede ser posterior a --hasta")
+
+        filas = reconstruir_resumen(desde, hasta)
+        rango = f"{desde or 'inicio'} a {hasta or 'hoy'}"
+        self.stdout.write(self.style.SUCCESS(f"Resumen reconstruido ({rango}): {filas} filas generadas."))
@@ -0,0 +1,72 @@
+import os
+import tempfile
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+
+from visitas.respaldo import (
+    FORMATOS_COPY, HILOS_NATIVO, RespaldoInvalido,
+    generar_respaldo, generar_respaldo_nativo, restaurar_respaldo,
+)
+
+
+class Command(BaseCommand):
+    help = (
+        "Respaldo nativo de PostgreSQL para recuperación ante desastres: vuelca cada tabla "
+        "con COPY en paralelo sobre una misma foto de la base y la restaura con COPY FROM."
+    )
+
+    def add_arguments(self, parser):
+        sub = parser.add_subparsers(dest='accion', required=True)
+
+        volcar = sub.add_parser('volcar', help="Genera el archivo .tar con todas las tablas")
+        volcar.add_argument('destino')
+        volcar.add_argument('--hilos', type=int, default=HILOS_NATIVO, help="Tablas que se copian a la vez")
+        volcar.add_argument('--formato', choices=FORMATOS_COPY, default='binary', help="Formato de COPY (por defecto binary)")
+        volcar.add_argument(
+            '--comparar', action='store_true',
+            help="Genera además el respaldo normal (serializador de Django) y compara tiempos y tamaños",
+        )
+
+        cargar = sub.add_parser('cargar', help="Reemplaza el contenido de la base con un respaldo nativo")
+        cargar.add_argument('origen')
+        cargar.add_argument('--simular', action='store_true', help="Carga y verifica todo, pero no guarda los cambios")
+
+    def handle(self, *args, **options):
+        if connection.vendor != 'postgresql':
+            raise CommandError("El respaldo nativo solo está disponible en PostgreSQL.")
+        getattr(self, f"_{options['accion']}")(options)
+
+    def _volcar(self, options):
+        inicio = time.monotonic()
+        tablas, filas = generar_respaldo_nativo(options['destino'], hilos=options['hilos'], formato=options['formato'])
+        self._informar("COPY", tablas, filas, time.monotonic() - inicio, options['destino'])
+
+        if options['comparar']:
+            with tempfile.TemporaryDirectory() as temporal:
+                ruta = os.path.join(temporal, 'respaldo.tar')
+                inicio = time.monotonic()
+                manifiesto = generar_respaldo(ruta)
+                filas = sum(entrada['filas'] for entrada in manifiesto['modelos'])
+                self._informar("Serializador", len(manifiesto['modelos']), filas, time.monotonic() - inicio, ruta)
+
+    def _cargar(self, options):
+        inicio = time.monotonic()
+        try:
+            filas = restaurar_respaldo(options['origen'], simular=options['simular'])
+        except RespaldoInvalido as error:
+            raise CommandError(str(error))
+        segundos = time.monotonic() - inicio
+        estado = "verificadas (sin guardar)" if options['simular'] else "restauradas"
+        self.stdout.write(self.style.SUCCESS(
+            f"{filas} filas {estado} en {segundos:.1f} s ({filas / max(segundos, 0.001):,.0f} filas/s)"
+        ))
+
+    def _informar(self, metodo, tablas, filas, segundos, ruta):
+        megas = os.path.getsize(ruta) / 1024 / 1024
+        segundos = max(segundos, 0.001)
+        self.stdout.write(
+            f"{metodo:<13} {tablas} tablas, {filas} filas en {segundos:.1f} s: "
+            f"{filas / segundos:,.0f} filas/s, {megas:.1f} MB ({megas / segundos:.1f} MB/s)"
+        )
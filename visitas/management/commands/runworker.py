@@ -0,0 +1,84 @@
+import multiprocessing
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from concurrent.futures.process import BrokenProcessPool
+
+import django
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import connections
+
+from visitas.trabajos import (
+    ejecutar_trabajo, latir, limpiar_resultados,
+    nombre_trabajador, recuperar_huerfanos, reencolar, tomar_trabajo,
+)
+
+LIMPIEZA_CADA = 3600  # segundos entre limpiezas de resultados vencidos
+
+
+class Command(BaseCommand):
+    help = (
+        "Ejecuta en segundo plano los trabajos pesados (respaldos, restauraciones, "
+        "exportaciones y fotos subidas) usando un pool de procesos. Dejarlo corriendo junto al servidor web."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--procesos', type=int, default=getattr(settings, 'TRABAJOS_PROCESOS', 2),
+            help="Trabajos que se ejecutan a la vez (por defecto TRABAJOS_PROCESOS)",
+        )
+        parser.add_argument('--intervalo', type=float, default=2.0, help="Segundos entre consultas de trabajos nuevos")
+        parser.add_argument('--una-vez', action='store_true', help="Ejecuta los trabajos pendientes y termina")
+
+    def handle(self, *args, **options):
+        trabajador = nombre_trabajador()
+        recuperados = recuperar_huerfanos()
+        if recuperados:
+            self.stdout.write(f"Trabajos interrumpidos reencolados: {recuperados}")
+        self.stdout.write(self.style.SUCCESS(f"runworker {trabajador} con {options['procesos']} procesos"))
+
+        try:
+            # Si un proceso muere (por ejemplo por falta de memoria) el pool queda
+            # inutilizable: se reencolan sus trabajos y se crea uno nuevo
+            while not self._atender(trabajador, options):
+                pass
+        except KeyboardInterrupt:
+            self.stdout.write("Detenido. Los trabajos en curso se reintentarán al volver a iniciar.")
+
+    def _atender(self, trabajador, options):
+        """Atiende trabajos hasta terminar (True) o hasta que el pool se rompa (False)."""
+        en_curso = {}
+        ultima_limpieza = 0.0
+        # 'spawn' en todas las plataformas: cada proceso arranca Django desde cero
+        # (django.setup) y abre sus propias conexiones a la base de datos
+        contexto = multiprocessing.get_context('spawn')
+        with ProcessPoolExecutor(options['procesos'], mp_context=contexto, initializer=django.setup) as pool:
+            while True:
+                while len(en_curso) < options['procesos'] and (trabajo := tomar_trabajo(trabajador)):
+                    self.stdout.write(f"Iniciando {trabajo}")
+                    en_curso[pool.submit(ejecutar_trabajo, trabajo.pk)] = trabajo.pk
+
+                if not en_curso:
+                    if options['una_vez']:
+                        return True
+                    if time.monotonic() - ultima_limpieza >= LIMPIEZA_CADA:
+                        limpiar_resultados()
+                        ultima_limpieza = time.monotonic()
+                    connections.close_all()
+                    time.sleep(options['intervalo'])
+                    continue
+
+                terminados, _ = wait(en_curso, timeout=options['intervalo'], return_when=FIRST_COMPLETED)
+                for futuro in terminados:
+                    trabajo_id = en_curso.pop(futuro)
+                    error = futuro.exception()
+                    if isinstance(error, BrokenProcessPool):
+                        reencolar([trabajo_id, *en_curso.values()], "Reintentado: el proceso de trabajo terminó de forma inesperada")
+                        self.stderr.write(f"El pool de procesos se detuvo; trabajo {trabajo_id} reencolado")
+                        return False
+                    if error:
+                        reencolar([trabajo_id], f"Reintentado: {error}")
+                        self.stderr.write(f"Trabajo {trabajo_id}: {error}")
+                    else:
+                        self.stdout.write(f"Trabajo {trabajo_id} finalizado")
+                latir(list(en_curso.values()))
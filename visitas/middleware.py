@@ -1,5 +1,6 @@
 from .models import IpActiva
 from .views import get_client_ip
+from .auditoria import fijar_peticion, liberar_peticion
 from django.utils import timezone
 from django.utils.deprecation import MiddlewareMixin
 
@@ -29,3 +30,19 @@ class ActiveIPMiddleware(MiddlewareMixin):
         IpActiva.objects.filter(last_seen__lt=cutoff_time).update(is_active=False)
 
         return None
+
+
+class AuditoriaMiddleware(MiddlewareMixin):
+    """
+    Middleware que deja disponibles el usuario y la IP de la petición para
+    los registros de Bitácora que se generan desde las señales de los modelos
+    """
+    def process_request(self, request):
+        request._token_auditoria = fijar_peticion(request, get_client_ip(request))
+        return None
+
+    def process_response(self, request, response):
+        token = getattr(request, '_token_auditoria', None)
+        if token is not None:
+            liberar_peticion(token)
+        return response
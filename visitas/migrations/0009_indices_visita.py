@@ -0,0 +1,21 @@
+# Generated by Django 6.0.1 on 2026-10-18 08:41
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('visitas', '0008_registrointento_debe_cambiar_password_and_more'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='visita',
+            index=models.Index(fields=['entrada'], name='visita_entrada_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='visita',
+            index=models.Index(fields=['salida'], name='visita_salida_idx'),
+        ),
+    ]
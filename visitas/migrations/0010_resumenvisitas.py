@@ -0,0 +1,71 @@
+# Generated by Django 6.0.1 on 2026-10-18 08:42
+# Ampliada a mano: el resumen se llena con las visitas existentes
+
+from django.db import migrations, models
+from django.db.models import Count, DurationField, ExpressionWrapper, F, Sum
+from django.db.models.functions import ExtractHour, TruncDate
+
+LOTE = 1000
+
+
+def llenar_resumen(apps, schema_editor):
+    # Mismo cálculo que estadisticas.reconstruir_resumen(), con los modelos de esta migración
+    Visita = apps.get_model('visitas', 'Visita')
+    ResumenVisitas = apps.get_model('visitas', 'ResumenVisitas')
+    cubos = {}
+
+    def cubo(fecha, hora, estatus):
+        clave = (fecha, hora, estatus)
+        if clave not in cubos:
+            cubos[clave] = ResumenVisitas(fecha=fecha, hora=hora, estatus=estatus)
+        return cubos[clave]
+
+    entradas = (
+        Visita.objects.annotate(dia=TruncDate('entrada'), h=ExtractHour('entrada'))
+        .values('dia', 'h', 'visitante__estatus')
+        .annotate(total=Count('id'))
+        .order_by()
+    )
+    for fila in entradas:
+        cubo(fila['dia'], fila['h'], fila['visitante__estatus']).entradas = fila['total']
+
+    estadia = ExpressionWrapper(F('salida') - F('entrada'), output_field=DurationField())
+    salidas = (
+        Visita.objects.filter(salida__isnull=False)
+        .annotate(dia=TruncDate('salida'), h=ExtractHour('salida'))
+        .values('dia', 'h', 'visitante__estatus')
+        .annotate(total=Count('id'), duracion=Sum(estadia))
+        .order_by()
+    )
+    for fila in salidas:
+        registro = cubo(fila['dia'], fila['h'], fila['visitante__estatus'])
+        registro.salidas = fila['total']
+        registro.segundos_estadia = int(fila['duracion'].total_seconds()) if fila['duracion'] else 0
+
+    ResumenVisitas.objects.bulk_create(cubos.values(), batch_size=LOTE)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('visitas', '0009_indices_visita'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ResumenVisitas',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('fecha', models.DateField()),
+                ('hora', models.PositiveSmallIntegerField()),
+                ('estatus', models.CharField(max_length=20)),
+                ('entradas', models.IntegerField(default=0)),
+                ('salidas', models.IntegerField(default=0)),
+                ('segundos_estadia', models.BigIntegerField(default=0)),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('fecha', 'hora', 'estatus'), name='resumen_fecha_hora_estatus_uniq')],
+            },
+        ),
+        migrations.RunPython(llenar_resumen, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 6.0.1 on 2026-10-18 08:46
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('visitas', '0011_bitacora_fecha_hora_default'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ContadorAcceso',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('accion', models.CharField(max_length=100)),
+                ('ip_origen', models.GenericIPAddressField()),
+                ('hora', models.DateTimeField()),
+                ('total', models.PositiveIntegerField(default=0)),
+                ('primer_acceso', models.DateTimeField()),
+                ('ultimo_acceso', models.DateTimeField()),
+                ('usuario', models.ForeignKey(null=True, on_delete=django.db.models.deletion.SET_NULL, to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name='contadoracceso',
+            constraint=models.UniqueConstraint(fields=('usuario', 'accion', 'ip_origen', 'hora'), name='contador_acceso_uniq'),
+        ),
+    ]
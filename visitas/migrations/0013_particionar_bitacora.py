@@ -0,0 +1,111 @@
+# Generated manually: convierte visitas_bitacora en una tabla particionada por mes (solo PostgreSQL)
+
+import datetime
+
+from django.db import migrations
+from django.utils import timezone
+
+MESES_ADELANTE = 3
+
+
+def _mes_siguiente(fecha):
+    return (fecha.replace(day=28) + datetime.timedelta(days=4)).replace(day=1)
+
+
+def _limite(fecha):
+    # Medianoche del día 1 en la zona del sistema (TIME_ZONE), no en UTC
+    return timezone.make_aware(datetime.datetime(fecha.year, fecha.month, 1)).isoformat()
+
+
+def particionar(apps, schema_editor):
+    connection = schema_editor.connection
+    if connection.vendor != 'postgresql':
+        return
+
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT relkind FROM pg_class WHERE relname = 'visitas_bitacora'")
+        if cursor.fetchone()[0] == 'p':
+            return  # Ya está particionada
+
+        cursor.execute("SELECT min(fecha_hora) FROM visitas_bitacora")
+        minimo = cursor.fetchone()[0]
+        hoy = timezone.localdate()
+        mes = (timezone.localdate(minimo) if minimo else hoy).replace(day=1)
+        ultimo_mes = hoy.replace(day=1)
+        for _ in range(MESES_ADELANTE):
+            ultimo_mes = _mes_siguiente(ultimo_mes)
+
+        # 1. Nueva tabla padre con las mismas columnas
+        cursor.execute("ALTER TABLE visitas_bitacora RENAME TO visitas_bitacora_antigua")
+        cursor.execute(
+            "CREATE TABLE visitas_bitacora (LIKE visitas_bitacora_antigua INCLUDING DEFAULTS) "
+            "PARTITION BY RANGE (fecha_hora)"
+        )
+
+        # 2. Una partición por mes (desde el registro más antiguo) y una por defecto
+        while mes <= ultimo_mes:
+            siguiente = _mes_siguiente(mes)
+            cursor.execute(
+                f"CREATE TABLE visitas_bitacora_p{mes:%Y_%m} PARTITION OF visitas_bitacora "
+                f"FOR VALUES FROM ('{_limite(mes)}') TO ('{_limite(siguiente)}')"
+            )
+            mes = siguiente
+        cursor.execute("CREATE TABLE visitas_bitacora_default PARTITION OF visitas_bitacora DEFAULT")
+
+        # 3. Copiar los datos y eliminar la tabla anterior (con su secuencia e índices)
+        cursor.execute("INSERT INTO visitas_bitacora SELECT * FROM visitas_bitacora_antigua")
+        cursor.execute("SELECT coalesce(max(id), 0) + 1 FROM visitas_bitacora_antigua")
+        siguiente_id = cursor.fetchone()[0]
+        cursor.execute("DROP TABLE visitas_bitacora_antigua")
+
+        # 4. Llave primaria (debe incluir la columna de partición), FK e índice de usuario
+        cursor.execute("ALTER TABLE visitas_bitacora ADD CONSTRAINT visitas_bitacora_pkey PRIMARY KEY (id, fecha_hora)")
+        cursor.execute(
+            "ALTER TABLE visitas_bitacora ADD CONSTRAINT visitas_bitacora_usuario_id_fk_auth_user_id "
+            "FOREIGN KEY (usuario_id) REFERENCES auth_user (id) DEFERRABLE INITIALLY DEFERRED"
+        )
+        cursor.execute("CREATE INDEX visitas_bitacora_usuario_id_idx ON visitas_bitacora (usuario_id)")
+
+        # 5. Secuencia para 'id' (las columnas IDENTITY no se heredan con LIKE)
+        cursor.execute("CREATE SEQUENCE visitas_bitacora_id_seq OWNED BY visitas_bitacora.id")
+        cursor.execute("SELECT setval('visitas_bitacora_id_seq', %s, false)", [siguiente_id])
+        cursor.execute("ALTER TABLE visitas_bitacora ALTER COLUMN id SET DEFAULT nextval('visitas_bitacora_id_seq')")
+
+
+def desparticionar(apps, schema_editor):
+    connection = schema_editor.connection
+    if connection.vendor != 'postgresql':
+        return
+
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT relkind FROM pg_class WHERE relname = 'visitas_bitacora'")
+        if cursor.fetchone()[0] != 'p':
+            return
+
+        cursor.execute("ALTER TABLE visitas_bitacora RENAME TO visitas_bitacora_particionada")
+        cursor.execute("ALTER TABLE visitas_bitacora_particionada DROP CONSTRAINT visitas_bitacora_pkey")
+        cursor.execute(
+            "ALTER TABLE visitas_bitacora_particionada DROP CONSTRAINT visitas_bitacora_usuario_id_fk_auth_user_id"
+        )
+        cursor.execute("DROP INDEX visitas_bitacora_usuario_id_idx")
+        cursor.execute("CREATE TABLE visitas_bitacora (LIKE visitas_bitacora_particionada INCLUDING DEFAULTS)")
+        cursor.execute("INSERT INTO visitas_bitacora SELECT * FROM visitas_bitacora_particionada")
+        cursor.execute("ALTER TABLE visitas_bitacora ADD PRIMARY KEY (id)")
+        cursor.execute(
+            "ALTER TABLE visitas_bitacora ADD CONSTRAINT visitas_bitacora_usuario_id_fk_auth_user_id "
+            "FOREIGN KEY (usuario_id) REFERENCES auth_user (id) DEFERRABLE INITIALLY DEFERRED"
+        )
+        cursor.execute("CREATE INDEX visitas_bitacora_usuario_id_idx ON visitas_bitacora (usuario_id)")
+        cursor.execute("ALTER SEQUENCE visitas_bitacora_id_seq OWNED BY visitas_bitacora.id")
+        cursor.execute("DROP TABLE visitas_bitacora_particionada")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('visitas', '0012_contadoracceso'),
+    ]
+
+    operations = [
+        migrations.RunPython(particionar, desparticionar),
+    ]
@@ -0,0 +1,74 @@
+# Generated manually: búsqueda de texto completo y por trigramas en la Bitácora (solo PostgreSQL)
+
+from django.db import migrations
+
+
+def crear_busqueda(apps, schema_editor):
+    connection = schema_editor.connection
+    if connection.vendor != 'postgresql':
+        return
+
+    with connection.cursor() as cursor:
+        cursor.execute("CREATE EXTENSION IF NOT EXISTS unaccent")
+        cursor.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+
+        # Configuración 'spanish' que además ignora los acentos (José = jose)
+        cursor.execute("SELECT 1 FROM pg_ts_config WHERE cfgname = 'spanish_unaccent'")
+        if cursor.fetchone() is None:
+            cursor.execute("CREATE TEXT SEARCH CONFIGURATION spanish_unaccent (COPY = spanish)")
+            cursor.execute(
+                "ALTER TEXT SEARCH CONFIGURATION spanish_unaccent "
+                "ALTER MAPPING FOR hword, hword_part, word WITH unaccent, spanish_stem"
+            )
+
+        # Columna calculada: la acción pesa más que los detalles al ordenar.
+        # Se propaga a todas las particiones (reescribe la tabla una sola vez).
+        cursor.execute(
+            "ALTER TABLE visitas_bitacora ADD COLUMN IF NOT EXISTS busqueda tsvector "
+            "GENERATED ALWAYS AS ("
+            "setweight(to_tsvector('spanish_unaccent'::regconfig, coalesce(accion, '')), 'A') || "
+            "setweight(to_tsvector('spanish_unaccent'::regconfig, coalesce(detalles, '')), 'B')"
+            ") STORED"
+        )
+        cursor.execute(
+            "CREATE INDEX IF NOT EXISTS bitacora_busqueda_idx ON visitas_bitacora USING gin (busqueda)"
+        )
+
+        # Trigramas para fragmentos (parte de una cédula, de un nombre o de una IP)
+        cursor.execute(
+            "CREATE INDEX IF NOT EXISTS bitacora_detalles_trgm_idx "
+            "ON visitas_bitacora USING gin (detalles gin_trgm_ops)"
+        )
+        cursor.execute(
+            "CREATE INDEX IF NOT EXISTS bitacora_accion_trgm_idx "
+            "ON visitas_bitacora USING gin (accion gin_trgm_ops)"
+        )
+        cursor.execute(
+            "CREATE INDEX IF NOT EXISTS bitacora_ip_trgm_idx "
+            "ON visitas_bitacora USING gin (host(ip_origen) gin_trgm_ops)"
+        )
+
+
+def eliminar_busqueda(apps, schema_editor):
+    connection = schema_editor.connection
+    if connection.vendor != 'postgresql':
+        return
+
+    with connection.cursor() as cursor:
+        cursor.execute("DROP INDEX IF EXISTS bitacora_ip_trgm_idx")
+        cursor.execute("DROP INDEX IF EXISTS bitacora_accion_trgm_idx")
+        cursor.execute("DROP INDEX IF EXISTS bitacora_detalles_trgm_idx")
+        cursor.execute("DROP INDEX IF EXISTS bitacora_busqueda_idx")
+        cursor.execute("ALTER TABLE visitas_bitacora DROP COLUMN IF EXISTS busqueda")
+        cursor.execute("DROP TEXT SEARCH CONFIGURATION IF EXISTS spanish_unaccent")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('visitas', '0014_indices_bitacora'),
+    ]
+
+    operations = [
+        migrations.RunPython(crear_busqueda, eliminar_busqueda),
+    ]
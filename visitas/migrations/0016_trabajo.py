@@ -0,0 +1,42 @@
+# Generated by Django 6.0.1 on 2026-10-18 09:03
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('visitas', '0015_busqueda_bitacora'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Trabajo',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('tipo', models.CharField(choices=[('respaldo', 'Respaldo de Base de Datos'), ('restauracion', 'Restauración de Base de Datos'), ('exportar_bitacora', 'Exportación de Bitácora'), ('exportar_bitacora_pdf', 'Exportación de Bitácora PDF')], max_length=30)),
+                ('estado', models.CharField(choices=[('pendiente', 'Pendiente'), ('en_proceso', 'En proceso'), ('terminado', 'Terminado'), ('fallido', 'Fallido')], default='pendiente', max_length=20)),
+                ('parametros', models.JSONField(blank=True, default=dict)),
+                ('ip_origen', models.GenericIPAddressField(blank=True, null=True)),
+                ('progreso', models.PositiveSmallIntegerField(default=0)),
+                ('mensaje', models.CharField(blank=True, default='', max_length=255)),
+                ('archivo', models.CharField(blank=True, default='', max_length=500)),
+                ('nombre_archivo', models.CharField(blank=True, default='', max_length=255)),
+                ('intentos', models.PositiveSmallIntegerField(default=0)),
+                ('trabajador', models.CharField(blank=True, default='', max_length=100)),
+                ('latido', models.DateTimeField(blank=True, null=True)),
+                ('creado', models.DateTimeField(default=django.utils.timezone.now)),
+                ('iniciado', models.DateTimeField(blank=True, null=True)),
+                ('terminado', models.DateTimeField(blank=True, null=True)),
+                ('usuario', models.ForeignKey(null=True, on_delete=django.db.models.deletion.SET_NULL, to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='trabajo',
+            index=models.Index(fields=['estado', 'creado'], name='trabajo_estado_creado_idx'),
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 6.0.1 on 2026-10-18 09:39
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('visitas', '0017_marcas_de_cambio'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='visitante',
+            name='foto_estado',
+            field=models.CharField(choices=[('lista', 'Lista'), ('pendiente', 'Procesando'), ('fallida', 'No se pudo procesar')], default='lista', max_length=10),
+        ),
+        migrations.AlterField(
+            model_name='trabajo',
+            name='tipo',
+            field=models.CharField(choices=[('respaldo', 'Respaldo de Base de Datos'), ('restauracion', 'Restauración de Base de Datos'), ('exportar_bitacora', 'Exportación de Bitácora'), ('exportar_bitacora_pdf', 'Exportación de Bitácora PDF'), ('procesar_foto', 'Procesamiento de Foto')], max_length=30),
+        ),
+    ]
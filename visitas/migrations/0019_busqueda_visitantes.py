@@ -0,0 +1,74 @@
+# Generated by Django 6.0.1 on 2026-10-18 09:41
+# Ampliada a mano: nombre normalizado e índices de trigramas para buscar visitantes
+
+import unicodedata
+
+from django.db import migrations, models
+
+LOTE = 2000
+
+
+def normalizar_nombre(texto):
+    # Copia de visitas.models.normalizar_nombre tal como era en esta migración:
+    # la migración no debe cambiar si luego cambia la función del modelo
+    descompuesto = unicodedata.normalize('NFKD', texto or '')
+    sin_acentos = ''.join(c for c in descompuesto if not unicodedata.combining(c))
+    return ' '.join(sin_acentos.casefold().split())
+
+
+def llenar_nombre_normalizado(apps, schema_editor):
+    Visitante = apps.get_model('visitas', 'Visitante')
+    lote = []
+    for visitante in Visitante.objects.only('id', 'nombre_completo').iterator(chunk_size=LOTE):
+        visitante.nombre_normalizado = normalizar_nombre(visitante.nombre_completo)
+        lote.append(visitante)
+        if len(lote) >= LOTE:
+            Visitante.objects.bulk_update(lote, ['nombre_normalizado'])
+            lote = []
+    if lote:
+        Visitante.objects.bulk_update(lote, ['nombre_normalizado'])
+
+
+def crear_indices(apps, schema_editor):
+    connection = schema_editor.connection
+    if connection.vendor != 'postgresql':
+        return
+
+    with connection.cursor() as cursor:
+        cursor.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+        # Sirven para ILIKE '%fragmento%' y para los operadores de similitud (%, <%)
+        cursor.execute(
+            "CREATE INDEX IF NOT EXISTS visitante_nombre_trgm_idx "
+            "ON visitas_visitante USING gin (nombre_normalizado gin_trgm_ops)"
+        )
+        cursor.execute(
+            "CREATE INDEX IF NOT EXISTS visitante_cedula_trgm_idx "
+            "ON visitas_visitante USING gin (cedula gin_trgm_ops)"
+        )
+
+
+def eliminar_indices(apps, schema_editor):
+    connection = schema_editor.connection
+    if connection.vendor != 'postgresql':
+        return
+
+    with connection.cursor() as cursor:
+        cursor.execute("DROP INDEX IF EXISTS visitante_cedula_trgm_idx")
+        cursor.execute("DROP INDEX IF EXISTS visitante_nombre_trgm_idx")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('visitas', '0018_foto_estado'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='visitante',
+            name='nombre_normalizado',
+            field=models.CharField(blank=True, default='', editable=False, max_length=200),
+        ),
+        migrations.RunPython(llenar_nombre_normalizado, migrations.RunPython.noop),
+        migrations.RunPython(crear_indices, eliminar_indices),
+    ]
@@ -0,0 +1,61 @@
+# Generated by Django 6.0.1 on 2026-10-18 09:44
+# Ampliada a mano: el resumen del directorio se llena con las visitas existentes
+
+from django.db import migrations, models
+from django.db.models import Count, Max
+
+LOTE = 2000
+
+
+def llenar_directorio(apps, schema_editor):
+    # Un GROUP BY por tramo de ids de visitante y un bulk_update con el resultado
+    Visitante = apps.get_model('visitas', 'Visitante')
+    Visita = apps.get_model('visitas', 'Visita')
+    ultimo = Visitante.objects.aggregate(ultimo=Max('pk'))['ultimo'] or 0
+    for desde in range(0, ultimo + 1, LOTE):
+        resumen = (
+            Visita.objects.filter(visitante_id__gte=desde, visitante_id__lt=desde + LOTE)
+            .values('visitante_id')
+            .annotate(entrada=Max('entrada'), salida=Max('salida'), total=Count('id'))
+            .order_by()
+        )
+        Visitante.objects.bulk_update(
+            [
+                Visitante(
+                    pk=fila['visitante_id'], ultima_entrada=fila['entrada'],
+                    ultima_salida=fila['salida'], total_visitas=fila['total'],
+                )
+                for fila in resumen
+            ],
+            ['ultima_entrada', 'ultima_salida', 'total_visitas'],
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('visitas', '0019_busqueda_visitantes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='visitante',
+            name='total_visitas',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='visitante',
+            name='ultima_entrada',
+            field=models.DateTimeField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='visitante',
+            name='ultima_salida',
+            field=models.DateTimeField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='visitante',
+            index=models.Index(fields=['ultima_entrada', 'id'], name='visitante_ultima_entrada_idx'),
+        ),
+        migrations.RunPython(llenar_directorio, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 6.0.1 on 2026-10-18 09:47
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('visitas', '0020_directorio_visitantes'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='visita',
+            index=models.Index(condition=models.Q(('salida__isnull', True)), fields=['entrada', 'id'], name='visita_abierta_entrada_idx'),
+        ),
+    ]
@@ -0,0 +1,40 @@
+# Generated by Django 6.0.1 on 2026-10-18 09:49
+# Ampliada a mano: antes de la restricción se cierran los ingresos abiertos repetidos
+
+import django.db.models.functions.datetime
+from django.db import migrations, models
+from django.utils import timezone
+
+LOTE = 2000
+
+
+def cerrar_ingresos_repetidos(apps, schema_editor):
+    # Si un visitante tiene varias visitas abiertas el mismo día, cada una se
+    # cierra a la hora de entrada de la siguiente (la última queda abierta).
+    # Los resúmenes se corrigen luego con reconstruir_resumen y reconstruir_directorio.
+    Visita = apps.get_model('visitas', 'Visita')
+    abiertas = Visita.objects.filter(salida__isnull=True).order_by('visitante_id', 'entrada', 'id')
+    cerradas = []
+    anterior, clave_anterior = None, None
+    for visita in abiertas.only('id', 'visitante_id', 'entrada').iterator(chunk_size=LOTE):
+        clave = (visita.visitante_id, timezone.localtime(visita.entrada).date())
+        if clave == clave_anterior:
+            anterior.salida = visita.entrada
+            cerradas.append(anterior)
+        anterior, clave_anterior = visita, clave
+    Visita.objects.bulk_update(cerradas, ['salida'], batch_size=LOTE)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('visitas', '0021_visitas_abiertas'),
+    ]
+
+    operations = [
+        migrations.RunPython(cerrar_ingresos_repetidos, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='visita',
+            constraint=models.UniqueConstraint(models.F('visitante'), django.db.models.functions.datetime.TruncDate('entrada'), condition=models.Q(('salida__isnull', True)), name='visita_abierta_por_dia'),
+        ),
+    ]
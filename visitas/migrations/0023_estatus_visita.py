@@ -0,0 +1,33 @@
+# Generated by Django 6.0.1 on 2026-10-18 10:00
+# Ampliada a mano: las visitas existentes toman el estatus actual de su visitante
+
+from django.db import migrations, models
+from django.db.models import Max, OuterRef, Subquery
+
+LOTE = 5000
+
+
+def copiar_estatus(apps, schema_editor):
+    Visita = apps.get_model('visitas', 'Visita')
+    Visitante = apps.get_model('visitas', 'Visitante')
+    estatus = Subquery(Visitante.objects.filter(pk=OuterRef('visitante_id')).values('estatus')[:1])
+    ultimo = Visita.objects.aggregate(ultimo=Max('pk'))['ultimo'] or 0
+    # Un UPDATE por tramo de ids para no bloquear toda la tabla en una sola sentencia
+    for desde in range(0, ultimo + 1, LOTE):
+        Visita.objects.filter(pk__gte=desde, pk__lt=desde + LOTE).update(estatus=estatus)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('visitas', '0022_ingreso_abierto_por_dia'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='visita',
+            name='estatus',
+            field=models.CharField(blank=True, choices=[('natural', 'Persona Natural'), ('empleado', 'Empleado'), ('externo', 'Empresa Externa'), ('denegado', 'Acceso Denegado')], default='', editable=False, max_length=20),
+        ),
+        migrations.RunPython(copiar_estatus, migrations.RunPython.noop),
+    ]
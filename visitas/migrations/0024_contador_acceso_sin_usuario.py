@@ -0,0 +1,41 @@
+# Generated by Django 6.0.1 on 2026-10-18 10:15
+# Ampliada a mano: antes de la restricción se funden los contadores sin usuario repetidos
+
+from django.db import migrations, models
+from django.db.models import Count, Max, Min, Sum
+
+
+def fundir_repetidos(apps, schema_editor):
+    ContadorAcceso = apps.get_model('visitas', 'ContadorAcceso')
+    repetidos = (
+        ContadorAcceso.objects.filter(usuario__isnull=True)
+        .values('accion', 'ip_origen', 'hora')
+        .annotate(filas=Count('id'), suma=Sum('total'), primero=Min('primer_acceso'), ultimo=Max('ultimo_acceso'))
+        .filter(filas__gt=1)
+        .order_by()
+    )
+    for grupo in repetidos:
+        filas = ContadorAcceso.objects.filter(
+            usuario__isnull=True, accion=grupo['accion'], ip_origen=grupo['ip_origen'], hora=grupo['hora'],
+        ).order_by('id')
+        conservar = filas.first()
+        filas.exclude(pk=conservar.pk).delete()
+        conservar.total = grupo['suma']
+        conservar.primer_acceso = grupo['primero']
+        conservar.ultimo_acceso = grupo['ultimo']
+        conservar.save(update_fields=['total', 'primer_acceso', 'ultimo_acceso'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('visitas', '0023_estatus_visita'),
+    ]
+
+    operations = [
+        migrations.RunPython(fundir_repetidos, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='contadoracceso',
+            constraint=models.UniqueConstraint(condition=models.Q(('usuario__isnull', True)), fields=('accion', 'ip_origen', 'hora'), name='contador_acceso_sin_usuario_uniq'),
+        ),
+    ]
@@ -0,0 +1,51 @@
+# Generated by Django 6.0.1 on 2026-10-18 11:02
+# Ampliada a mano: las cédulas guardadas antes de normalizar_cedula se llevan a su forma sin espacios y en mayúsculas
+
+from django.db import migrations
+
+LOTE = 2000
+
+
+def _normalizar(cedula):
+    # Copia de busqueda.normalizar_cedula: la migración no depende del código actual
+    return ''.join((cedula or '').split()).upper()
+
+
+def normalizar_cedulas(apps, schema_editor):
+    # Si dos visitantes quedan con la misma cédula la migración se detiene sin
+    # cambiar nada: cuál conservar (y sus visitas) lo decide una persona.
+    Visitante = apps.get_model('visitas', 'Visitante')
+    cambios = {}
+    for visitante in Visitante.objects.only('id', 'cedula').order_by('id').iterator(chunk_size=LOTE):
+        cedula = _normalizar(visitante.cedula)
+        if cedula != visitante.cedula:
+            visitante.cedula = cedula
+            cambios.setdefault(cedula, []).append(visitante)
+
+    choques = {cedula: [v.pk for v in filas] for cedula, filas in cambios.items() if len(filas) > 1}
+    cedulas = list(cambios)
+    for inicio in range(0, len(cedulas), LOTE):
+        existentes = Visitante.objects.filter(cedula__in=cedulas[inicio:inicio + LOTE]).values_list('cedula', 'id')
+        for cedula, pk in existentes:
+            choques.setdefault(cedula, [v.pk for v in cambios[cedula]]).append(pk)
+    if choques:
+        detalle = '; '.join(f"{cedula}: ids {', '.join(map(str, sorted(ids)))}" for cedula, ids in sorted(choques.items()))
+        raise RuntimeError(
+            f"Hay visitantes cuya cédula coincide al normalizarla ({detalle}). "
+            "Fusione o corrija esos registros y vuelva a ejecutar la migración."
+        )
+
+    Visitante.objects.bulk_update(
+        [visitante for filas in cambios.values() for visitante in filas], ['cedula'], batch_size=LOTE,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('visitas', '0024_contador_acceso_sin_usuario'),
+    ]
+
+    operations = [
+        migrations.RunPython(normalizar_cedulas, migrations.RunPython.noop),
+    ]
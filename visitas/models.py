@@ -1,10 +1,36 @@
 # ==========================================
 # IMPORTACIONES
 # ==========================================
-from django.db import models
+import unicodedata
+
+from django.db import models, transaction, IntegrityError
+from django.db.models import Case, Count, F, OuterRef, Q, Subquery, Value, When
+from django.db.models.functions import Coalesce, TruncDate
 from django.contrib.auth.models import User
 from django.db.models.signals import post_save, post_delete
 from django.dispatch import receiver
+from django.utils import timezone
+
+from .auditoria import registrar_cambio
+from .imagenes import generar_miniaturas
+
+# ==========================================
+# UTILIDADES
+# ==========================================
+
+def normalizar_nombre(texto):
+    """Minúsculas y sin acentos ni espacios repetidos: 'José  PÉREZ' -> 'jose perez'."""
+    descompuesto = unicodedata.normalize('NFKD', texto or '')
+    sin_acentos = ''.join(c for c in descompuesto if not unicodedata.combining(c))
+    return ' '.join(sin_acentos.casefold().split())
+
+
+def _mas_reciente(campo, valor):
+    """Expresión para update(): 'valor' si es posterior al de 'campo' (o este es NULL)."""
+    return Case(
+        When(Q(**{f'{campo}__isnull': True}) | Q(**{f'{campo}__lt': valor}), then=Value(valor)),
+        default=F(campo),
+    )
 
 # ==========================================
 # MODELOS DE USUARIO Y SEGURIDAD
@@ -16,12 +42,14 @@ class IpPermitida(models.Model):
     equipo_nombre = models.CharField(max_length=100)
     sistema_operativo = models.CharField(max_length=100)
     navegador = models.CharField(max_length=100)
+    actualizado = models.DateTimeField(auto_now=True, db_index=True)  # Marca para respaldos incrementales
     
 class IpActiva(models.Model):
     ip_address = models.GenericIPAddressField(unique=True)
     user_agent = models.TextField(blank=True)
     last_seen = models.DateTimeField(auto_now=True)
     is_active = models.BooleanField(default=True)
+    actualizado = models.DateTimeField(auto_now=True, db_index=True)  # Marca para respaldos incrementales
 
     def __str__(self):
         return f"{self.ip_address} - {self.last_seen}"
@@ -31,7 +59,64 @@ class Bitacora(models.Model):
     accion = models.CharField(max_length=100)
     detalles = models.TextField()
     ip_origen = models.GenericIPAddressField()
-    fecha_hora = models.DateTimeField(auto_now_add=True)
+    # default (y no auto_now_add) para conservar la hora del evento al escribir en lote
+    fecha_hora = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        # Un índice por cada filtro del visor, terminado en (fecha_hora, id)
+        # para servir la paginación por cursor sin ordenar en memoria
+        indexes = [
+            models.Index(fields=['-fecha_hora', '-id'], name='bitacora_fecha_id_idx'),
+            models.Index(fields=['usuario', '-fecha_hora', '-id'], name='bitacora_usuario_fecha_idx'),
+            models.Index(fields=['accion', '-fecha_hora', '-id'], name='bitacora_accion_fecha_idx'),
+            models.Index(fields=['ip_origen', '-fecha_hora', '-id'], name='bitacora_ip_fecha_idx'),
+        ]
+
+class ContadorAcceso(models.Model):
+    """
+    Accesos de solo lectura (abrir una página) agrupados por usuario, acción,
+    IP y hora. Reemplaza una fila de Bitacora por cada visita a la página.
+    """
+    usuario = models.ForeignKey(User, on_delete=models.SET_NULL, null=True)
+    accion = models.CharField(max_length=100)
+    ip_origen = models.GenericIPAddressField()
+    hora = models.DateTimeField()  # Inicio de la hora (minutos y segundos en cero)
+    total = models.PositiveIntegerField(default=0)
+    primer_acceso = models.DateTimeField()
+    ultimo_acceso = models.DateTimeField()
+    actualizado = models.DateTimeField(auto_now=True, db_index=True)  # Marca para respaldos incrementales
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['usuario', 'accion', 'ip_origen', 'hora'], name='contador_acceso_uniq'),
+            # Dos NULL no chocan en la anterior: los accesos sin usuario necesitan su propia restricción
+            models.UniqueConstraint(
+                fields=['accion', 'ip_origen', 'hora'], condition=Q(usuario__isnull=True),
+                name='contador_acceso_sin_usuario_uniq',
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.accion} x{self.total} ({self.hora:%d/%m/%Y %H}h)"
+
+    @classmethod
+    def sumar(cls, usuario_id, accion, ip_origen, hora, total, primer_acceso, ultimo_acceso):
+        """Suma 'total' accesos al contador (lo crea si es el primero de la hora)."""
+        filtro = {'usuario_id': usuario_id, 'accion': accion, 'ip_origen': ip_origen, 'hora': hora}
+        # update() no aplica auto_now: la marca de cambio se fija a mano. Los volcados de
+        # varios procesos (o del archivo de respaldo) llegan desordenados: el último acceso no retrocede
+        cambios = {
+            'total': F('total') + total,
+            'ultimo_acceso': _mas_reciente('ultimo_acceso', ultimo_acceso),
+            'actualizado': timezone.now(),
+        }
+        if cls.objects.filter(**filtro).update(**cambios):
+            return
+        try:
+            with transaction.atomic():
+                cls.objects.create(total=total, primer_acceso=primer_acceso, ultimo_acceso=ultimo_acceso, **filtro)
+        except IntegrityError:
+            cls.objects.filter(**filtro).update(**cambios)
 
 # ==========================================
 # MODELOS DE NEGOCIO (BIBLIOTECA)
@@ -44,15 +129,107 @@ class Visitante(models.Model):
         ('externo', 'Empresa Externa'),
         ('denegado', 'Acceso Denegado'),
     ]
+    FOTO_ESTADO_CHOICES = [
+        ('lista', 'Lista'),
+        ('pendiente', 'Procesando'),  # La procesa el runworker (trabajo 'procesar_foto')
+        ('fallida', 'No se pudo procesar'),
+    ]
     cedula = models.CharField(max_length=20, unique=True)
     nombre_completo = models.CharField(max_length=200)
+    # Nombre en minúsculas y sin acentos ("Jose" encuentra a "José"); lo llena save()
+    nombre_normalizado = models.CharField(max_length=200, blank=True, default="", editable=False)
     foto = models.ImageField(upload_to='visitantes/', null=True, blank=True)
+    foto_estado = models.CharField(max_length=10, choices=FOTO_ESTADO_CHOICES, default='lista')
     correo = models.EmailField(blank=True, null=False, default="")
     telefono = models.CharField(max_length=20, blank=True, null=False, default="")
     estatus = models.CharField(max_length=20, choices=ESTATUS_CHOICES, default='natural')
+    # Resumen de sus visitas para el directorio; lo mantienen las señales de Visita
+    # (se reconstruye con 'python manage.py reconstruir_directorio')
+    ultima_entrada = models.DateTimeField(null=True, blank=True, editable=False)
+    ultima_salida = models.DateTimeField(null=True, blank=True, editable=False)
+    total_visitas = models.PositiveIntegerField(default=0, editable=False)
+    actualizado = models.DateTimeField(auto_now=True, db_index=True)  # Marca para respaldos incrementales
+
+    CAMPOS_RESUMEN = ('ultima_entrada', 'ultima_salida', 'total_visitas')
+
+    class Meta:
+        indexes = [
+            # Orden y paginación por cursor del directorio (visitor_log_view)
+            models.Index(fields=['ultima_entrada', 'id'], name='visitante_ultima_entrada_idx'),
+        ]
 
     def __str__(self):
         return f"{self.nombre_completo} ({self.cedula})"
+
+    def save(self, *args, **kwargs):
+        self.nombre_normalizado = normalizar_nombre(self.nombre_completo)
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and 'nombre_completo' in update_fields:
+            kwargs['update_fields'] = {*update_fields, 'nombre_normalizado'}
+        super().save(*args, **kwargs)
+
+    def _do_update(self, base_qs, using, pk_val, values, update_fields, *args, **kwargs):
+        # El resumen de visitas solo lo escriben las señales con update(): el UPDATE de
+        # un save() completo de una instancia ya guardada no lo incluye, para no pisarlo
+        # con valores viejos. Si la fila ya no existe, Django sigue con el INSERT de siempre
+        if not update_fields and not self._state.adding:
+            values = [valor for valor in values if valor[0].name not in self.CAMPOS_RESUMEN]
+        return super()._do_update(base_qs, using, pk_val, values, update_fields, *args, **kwargs)
+
+    @classmethod
+    def guardar_por_cedula(cls, cedula, **datos):
+        """
+        Crea el visitante con esa cédula o actualiza sus 'datos' en una sola
+        consulta (INSERT ... ON CONFLICT (cedula) DO UPDATE), sin la carrera de
+        get_or_create entre dos puestos que registran a la misma persona.
+
+        La instancia devuelta solo tiene el id, la cédula y los 'datos'. No
+        envía post_save: quien lo usa registra su propio evento() en la bitácora.
+        """
+        visitante = cls(cedula=cedula, **datos)
+        campos = [*datos, 'actualizado']
+        if 'nombre_completo' in datos:
+            visitante.nombre_normalizado = normalizar_nombre(visitante.nombre_completo)
+            campos.append('nombre_normalizado')
+        cls.objects.bulk_create([visitante], update_conflicts=True, unique_fields=['cedula'], update_fields=campos)
+        return visitante
+
+    @classmethod
+    def sumar_entrada(cls, visitante_id, entrada):
+        cls.sumar_entradas([visitante_id], entrada)
+
+    @classmethod
+    def sumar_entradas(cls, ids, entrada):
+        """Suma una visita que empezó en 'entrada' a cada visitante de 'ids' (registro de grupos)."""
+        cls.objects.filter(pk__in=ids).update(
+            total_visitas=F('total_visitas') + 1,
+            ultima_entrada=_mas_reciente('ultima_entrada', entrada),
+            actualizado=timezone.now(),
+        )
+
+    @classmethod
+    def sumar_salida(cls, visitante_id, salida):
+        cls.objects.filter(pk=visitante_id).update(
+            ultima_salida=_mas_reciente('ultima_salida', salida),
+            actualizado=timezone.now(),
+        )
+
+    @classmethod
+    def recalcular_resumen(cls, ids=None):
+        """Recalcula el resumen de visitas desde la tabla Visita (de 'ids' o de todos)."""
+        visitas = Visita.objects.filter(visitante=OuterRef('pk')).order_by()
+        visitantes = cls.objects.all() if ids is None else cls.objects.filter(pk__in=ids)
+        return visitantes.update(
+            ultima_entrada=Subquery(visitas.order_by('-entrada').values('entrada')[:1]),
+            ultima_salida=Subquery(visitas.filter(salida__isnull=False).order_by('-salida').values('salida')[:1]),
+            total_visitas=Coalesce(Subquery(visitas.values('visitante').annotate(n=Count('id')).values('n')), 0),
+            actualizado=timezone.now(),
+        )
+
+    @property
+    def foto_visible(self):
+        """Foto a mostrar; mientras se procesa una nueva, ninguna (las plantillas usan el avatar)."""
+        return None if self.foto_estado == 'pendiente' else self.foto
     
 class Visita(models.Model):
     visitante = models.ForeignKey(Visitante, on_delete=models.CASCADE, related_name='historial')
@@ -61,10 +238,152 @@ class Visita(models.Model):
     entrada = models.DateTimeField(auto_now_add=True)
     salida = models.DateTimeField(null=True, blank=True)
     observaciones = models.TextField(blank=True, null=False, default="")
+    # Estatus del visitante al registrar la entrada (lo llena save()). ResumenVisitas
+    # cuenta por este valor: si luego cambia el del visitante, la visita sigue en su cubo
+    estatus = models.CharField(max_length=20, choices=Visitante.ESTATUS_CHOICES, blank=True, default="", editable=False)
+    actualizado = models.DateTimeField(auto_now=True, db_index=True)  # Marca para respaldos incrementales
+
+    class Meta:
+        # Índices para las estadísticas por rangos de fecha y las visitas activas
+        indexes = [
+            models.Index(fields=['entrada'], name='visita_entrada_idx'),
+            models.Index(fields=['salida'], name='visita_salida_idx'),
+            # Personal en sede, por cursor (entrada, id): solo las visitas abiertas
+            models.Index(fields=['entrada', 'id'], name='visita_abierta_entrada_idx', condition=Q(salida__isnull=True)),
+        ]
+        constraints = [
+            # Un solo ingreso abierto por visitante y día (hora local): dos puestos
+            # que registran a la misma persona a la vez no pueden duplicarlo
+            models.UniqueConstraint(
+                'visitante', TruncDate('entrada'),
+                condition=Q(salida__isnull=True), name='visita_abierta_por_dia',
+            ),
+        ]
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Guardamos la salida original para detectar cuándo se registra el egreso
+        instance._salida_original = instance.__dict__.get('salida')
+        return instance
+
+    def save(self, *args, **kwargs):
+        if not self.estatus:
+            if Visita.visitante.is_cached(self):
+                self.estatus = self.visitante.estatus
+            else:
+                # Solo se tiene visitante_id (admin, restauraciones): se lee la columna, no el visitante
+                self.estatus = Visitante.objects.filter(pk=self.visitante_id).values_list('estatus', flat=True).first() or ""
+        super().save(*args, **kwargs)
+        # Las señales post_save ya compararon contra la salida original
+        self._salida_original = self.salida
+
+    @staticmethod
+    def es_ingreso_duplicado(error):
+        """True si el IntegrityError lo causó la restricción 'visita_abierta_por_dia'."""
+        return 'visita_abierta_por_dia' in str(error)
 
     def __str__(self):
         return f"Visita de {self.visitante.nombre_completo} - {self.entrada.strftime('%d/%m/%Y')}"
 
+# ==========================================
+# MODELOS DE ESTADÍSTICAS (RESUMEN PRE-CALCULADO)
+# ==========================================
+
+class ResumenVisitas(models.Model):
+    """
+    Acumulado de visitas por día, hora y estatus del visitante al entrar (Visita.estatus).
+    Se mantiene incrementalmente con señales y se puede reconstruir con
+    'python manage.py reconstruir_resumen'.
+    """
+    fecha = models.DateField()
+    hora = models.PositiveSmallIntegerField()
+    estatus = models.CharField(max_length=20)
+    entradas = models.IntegerField(default=0)
+    salidas = models.IntegerField(default=0)
+    segundos_estadia = models.BigIntegerField(default=0)
+    actualizado = models.DateTimeField(auto_now=True, db_index=True)  # Marca para respaldos incrementales
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['fecha', 'hora', 'estatus'], name='resumen_fecha_hora_estatus_uniq'),
+        ]
+
+    def __str__(self):
+        return f"{self.fecha} {self.hora:02d}h [{self.estatus}] E:{self.entradas} S:{self.salidas}"
+
+    @classmethod
+    def sumar(cls, momento, estatus, entradas=0, salidas=0, segundos=0):
+        """Suma (o resta, con valores negativos) al cubo de la hora local de 'momento'."""
+        local = timezone.localtime(momento)
+        filtro = {'fecha': local.date(), 'hora': local.hour, 'estatus': estatus}
+        cambios = {
+            'entradas': F('entradas') + entradas,
+            'salidas': F('salidas') + salidas,
+            'segundos_estadia': F('segundos_estadia') + segundos,
+            'actualizado': timezone.now(),
+        }
+        if cls.objects.filter(**filtro).update(**cambios):
+            return
+        try:
+            with transaction.atomic():
+                cls.objects.create(entradas=entradas, salidas=salidas, segundos_estadia=segundos, **filtro)
+        except IntegrityError:
+            # Otro hilo creó la fila al mismo tiempo: sumamos sobre ella
+            cls.objects.filter(**filtro).update(**cambios)
+
+# ==========================================
+# TRABAJOS EN SEGUNDO PLANO
+# ==========================================
+
+class Trabajo(models.Model):
+    """
+    Operación pesada (respaldo, restauración, exportación, foto subida) que ejecuta
+    'python manage.py runworker' fuera de los hilos web. El resultado queda
+    en disco (TRABAJOS_DIR) y se descarga desde el panel de configuración.
+    """
+    TIPO_CHOICES = [
+        ('respaldo', 'Respaldo de Base de Datos'),
+        ('restauracion', 'Restauración de Base de Datos'),
+        ('exportar_bitacora', 'Exportación de Bitácora'),
+        ('exportar_bitacora_pdf', 'Exportación de Bitácora PDF'),
+        ('procesar_foto', 'Procesamiento de Foto'),
+    ]
+    ESTADO_CHOICES = [
+        ('pendiente', 'Pendiente'),
+        ('en_proceso', 'En proceso'),
+        ('terminado', 'Terminado'),
+        ('fallido', 'Fallido'),
+    ]
+    tipo = models.CharField(max_length=30, choices=TIPO_CHOICES)
+    estado = models.CharField(max_length=20, choices=ESTADO_CHOICES, default='pendiente')
+    parametros = models.JSONField(default=dict, blank=True)
+    usuario = models.ForeignKey(User, on_delete=models.SET_NULL, null=True)
+    ip_origen = models.GenericIPAddressField(null=True, blank=True)
+    progreso = models.PositiveSmallIntegerField(default=0)  # 0 a 100
+    mensaje = models.CharField(max_length=255, blank=True, default="")
+    archivo = models.CharField(max_length=500, blank=True, default="")  # Ruta del resultado
+    nombre_archivo = models.CharField(max_length=255, blank=True, default="")  # Nombre de descarga
+    intentos = models.PositiveSmallIntegerField(default=0)
+    trabajador = models.CharField(max_length=100, blank=True, default="")  # equipo:pid del runworker
+    latido = models.DateTimeField(null=True, blank=True)  # Última señal de vida del runworker
+    creado = models.DateTimeField(default=timezone.now)
+    iniciado = models.DateTimeField(null=True, blank=True)
+    terminado = models.DateTimeField(null=True, blank=True)
+    resultado = models.JSONField(default=dict, blank=True)  # Datos para trabajos posteriores (ej. marca del respaldo)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['estado', 'creado'], name='trabajo_estado_creado_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.get_tipo_display()} #{self.pk} ({self.get_estado_display()})"
+
+    @property
+    def activo(self):
+        return self.estado in ('pendiente', 'en_proceso')
+
 # ==========================================
 # SEÑALES (LOGGING AUTOMÁTICO)
 # ==========================================
@@ -77,28 +396,26 @@ def registrar_visitante_save(sender, instance, created, **kwargs):
         else:
             accion = "Actualización de Visitante"
             detalles = f"Se actualizó visitante: {instance.nombre_completo} ({instance.cedula})"
-        Bitacora.objects.create(
-            usuario=None,
-            accion=accion,
-            detalles=detalles,
-            ip_origen='0.0.0.0'
-        )
+        registrar_cambio(accion, detalles)
     except Exception:
         # Evitar que errores en logging rompan la operación principal
         pass
 
 
+@receiver(post_save, sender=Visitante)
+def generar_miniaturas_visitante(sender, instance, raw=False, **kwargs):
+    # Una foto nueva siempre tiene un nombre nuevo: si faltan sus miniaturas, se generan
+    if raw or not instance.foto:
+        return
+    generar_miniaturas(instance.foto.name)
+
+
 @receiver(post_delete, sender=Visitante)
 def registrar_visitante_delete(sender, instance, **kwargs):
     try:
         accion = "Eliminación de Visitante"
         detalles = f"Se eliminó visitante: {instance.nombre_completo} ({instance.cedula})"
-        Bitacora.objects.create(
-            usuario=None,
-            accion=accion,
-            detalles=detalles,
-            ip_origen='0.0.0.0'
-        )
+        registrar_cambio(accion, detalles)
     except Exception:
         pass
 
@@ -106,49 +423,80 @@ def registrar_visitante_delete(sender, instance, **kwargs):
 @receiver(post_save, sender=Visita)
 def registrar_visita_save(sender, instance, created, **kwargs):
     try:
+        # Los detalles se arman solo fuera de un evento(): ahí no hace falta cargar el visitante
         if created:
             accion = "Creación de Visita"
-            detalles = f"Se registró entrada de {instance.visitante.nombre_completo} ({instance.visitante.cedula}) - Motivo: {instance.motivo}"
+            detalles = lambda: f"Se registró entrada de {_nombre_y_cedula(instance)} - Motivo: {instance.motivo}"
+        elif instance.salida and not getattr(instance, '_salida_original', None):
+            accion = "Registro de Salida"
+            detalles = lambda: f"Se registró salida de {_nombre_y_cedula(instance)}"
         else:
             accion = "Actualización de Visita"
-            detalles = f"Se actualizó visita de {instance.visitante.nombre_completo} ({instance.visitante.cedula})"
-        Bitacora.objects.create(
-            usuario=None,
-            accion=accion,
-            detalles=detalles,
-            ip_origen='0.0.0.0'
-        )
+            detalles = lambda: f"Se actualizó visita de {_nombre_y_cedula(instance)}"
+        registrar_cambio(accion, detalles)
     except Exception:
         pass
 
 
+def _nombre_y_cedula(visita):
+    visitante = visita.visitante
+    return f"{visitante.nombre_completo} ({visitante.cedula})"
+
+
+def _sumar_salida(visita, salida, estatus, signo):
+    segundos = int((salida - visita.entrada).total_seconds()) if visita.entrada else 0
+    ResumenVisitas.sumar(salida, estatus, salidas=signo, segundos=signo * segundos)
+
+
 @receiver(post_save, sender=Visita)
-def registrar_visita_salida(sender, instance, **kwargs):
-    try:
-        if instance.salida and not kwargs.get('created', False):
-            accion = "Registro de Salida"
-            detalles = f"Se registró salida de {instance.visitante.nombre_completo} ({instance.visitante.cedula})"
-            Bitacora.objects.create(
-                usuario=None,
-                accion=accion,
-                detalles=detalles,
-                ip_origen='0.0.0.0'
-            )
-    except Exception:
-        pass
+def actualizar_resumen_visita(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    salida_original = getattr(instance, '_salida_original', None)
+    if created or instance.salida != salida_original:
+        if created:
+            ResumenVisitas.sumar(instance.entrada, instance.estatus, entradas=1)
+        if salida_original and not created:
+            _sumar_salida(instance, salida_original, instance.estatus, -1)
+        if instance.salida:
+            _sumar_salida(instance, instance.salida, instance.estatus, 1)
+
+
+@receiver(post_save, sender=Visita)
+def actualizar_directorio_visita(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    salida_original = getattr(instance, '_salida_original', None)
+    if created:
+        Visitante.sumar_entrada(instance.visitante_id, instance.entrada)
+        if instance.salida:
+            Visitante.sumar_salida(instance.visitante_id, instance.salida)
+    elif instance.salida and not salida_original:
+        # Caso normal: se registra la salida de una visita abierta
+        Visitante.sumar_salida(instance.visitante_id, instance.salida)
+    else:
+        # Otros cambios (ej. desde el admin) pueden bajar la última fecha: se recalcula
+        Visitante.recalcular_resumen([instance.visitante_id])
+
+
+@receiver(post_delete, sender=Visita)
+def descontar_directorio_visita(sender, instance, **kwargs):
+    Visitante.recalcular_resumen([instance.visitante_id])
+
+
+@receiver(post_delete, sender=Visita)
+def descontar_resumen_visita(sender, instance, **kwargs):
+    ResumenVisitas.sumar(instance.entrada, instance.estatus, entradas=-1)
+    salida_original = getattr(instance, '_salida_original', instance.salida)
+    if salida_original:
+        _sumar_salida(instance, salida_original, instance.estatus, -1)
 
 
 @receiver(post_delete, sender=Visita)
 def registrar_visita_delete(sender, instance, **kwargs):
     try:
         accion = "Eliminación de Visita"
-        detalles = f"Se eliminó visita de {instance.visitante.nombre_completo} ({instance.visitante.cedula})"
-        Bitacora.objects.create(
-            usuario=None,
-            accion=accion,
-            detalles=detalles,
-            ip_origen='0.0.0.0'
-        )
+        registrar_cambio(accion, lambda: f"Se eliminó visita de {_nombre_y_cedula(instance)}")
     except Exception:
         pass
 
@@ -162,12 +510,7 @@ def registrar_ip_permitida_save(sender, instance, created, **kwargs):
         else:
             accion = "Actualización de IP Permitida"
             detalles = f"Se actualizó IP permitida: {instance.direccion_ip} - {instance.equipo_nombre}"
-        Bitacora.objects.create(
-            usuario=None,
-            accion=accion,
-            detalles=detalles,
-            ip_origen='0.0.0.0'
-        )
+        registrar_cambio(accion, detalles)
     except Exception:
         pass
 
@@ -177,12 +520,7 @@ def registrar_ip_permitida_delete(sender, instance, **kwargs):
     try:
         accion = "Eliminación de IP Permitida"
         detalles = f"Se eliminó IP permitida: {instance.direccion_ip} - {instance.equipo_nombre}"
-        Bitacora.objects.create(
-            usuario=None,
-            accion=accion,
-            detalles=detalles,
-            ip_origen='0.0.0.0'
-        )
+        registrar_cambio(accion, detalles)
     except Exception:
         pass
 
@@ -196,12 +534,7 @@ def registrar_ip_activa_save(sender, instance, created, **kwargs):
         else:
             accion = "Actualización de IP Activa"
             detalles = f"Se actualizó IP activa: {instance.ip_address}"
-        Bitacora.objects.create(
-            usuario=None,
-            accion=accion,
-            detalles=detalles,
-            ip_origen=instance.ip_address
-        )
+        registrar_cambio(accion, detalles, ip_origen=instance.ip_address)
     except Exception:
         pass
 
@@ -210,6 +543,7 @@ class RegistroIntento(models.Model):
     usuario = models.OneToOneField(User, on_delete=models.CASCADE)
     intentos = models.IntegerField(default=0)
     debe_cambiar_password = models.BooleanField(default=True)
+    actualizado = models.DateTimeField(auto_now=True, db_index=True)  # Marca para respaldos incrementales
     
     def __str__(self):
         return f"{self.usuario.username} - Intentos: {self.intentos}"
\ No newline at end of file
@@ -0,0 +1,212 @@
+# ==========================================
+# IMPORTACIONES
+# ==========================================
+import base64
+import datetime
+import json
+
+from django.core.exceptions import ValidationError
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import connections
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+
+# ==========================================
+# PAGINACIÓN POR CURSOR (KEYSET)
+# ==========================================
+# En vez de OFFSET (que obliga a recorrer todas las filas anteriores) se
+# recuerda la última fila mostrada y se piden las siguientes con un WHERE
+# sobre las columnas del orden. Con un índice sobre esas columnas, la página
+# 5.000 cuesta lo mismo que la primera.
+
+
+class PaginaKeyset:
+    def __init__(self, objetos, cursor_siguiente=None, cursor_anterior=None):
+        self.objetos = objetos
+        self.cursor_siguiente = cursor_siguiente
+        self.cursor_anterior = cursor_anterior
+
+    def __iter__(self):
+        return iter(self.objetos)
+
+    def __len__(self):
+        return len(self.objetos)
+
+    @property
+    def has_next(self):
+        return self.cursor_siguiente is not None
+
+    @property
+    def has_previous(self):
+        return self.cursor_anterior is not None
+
+    @property
+    def has_other_pages(self):
+        return self.has_next or self.has_previous
+
+
+def codificar_cursor(valores):
+    # isoformat() conserva los microsegundos; DjangoJSONEncoder los recorta a
+    # milisegundos y el cursor dejaría de coincidir con la fila exacta
+    valores = [v.isoformat() if isinstance(v, datetime.datetime) else v for v in valores]
+    texto = json.dumps(valores, cls=DjangoJSONEncoder)
+    return base64.urlsafe_b64encode(texto.encode()).decode().rstrip('=')
+
+
+def decodificar_cursor(cursor):
+    """Devuelve la lista de valores del cursor, o None si es inválido."""
+    try:
+        relleno = '=' * (-len(cursor) % 4)
+        return json.loads(base64.urlsafe_b64decode(cursor + relleno))
+    except (ValueError, TypeError):
+        return None
+
+
+def _tramos(queryset, campos, nulos_al_final):
+    """
+    Partes del queryset en el orden descendente de la página: (queryset, campos de orden).
+
+    Con 'nulos_al_final' las filas con el primer campo en NULL forman un
+    segundo tramo ordenado por los demás campos. Cada tramo se recorre con su
+    propio índice, en lugar de un OR con IS NULL que obligaría a filtrar fila por fila.
+    """
+    if not nulos_al_final:
+        return [(queryset, campos)]
+    primero = campos[0]
+    return [
+        (queryset.filter(**{f'{primero}__isnull': False}), campos),
+        (queryset.filter(**{f'{primero}__isnull': True}), campos[1:]),
+    ]
+
+
+def _leer_cursor(cursor, campos, nulos_al_final):
+    """
+    (número de tramo, valores) del cursor, o None si el cursor no sirve.
+
+    El cursor viaja en la URL: si fue alterado (no es una lista, tiene otro
+    largo o valores de otro tipo) se trata como si no existiera, sin error 500.
+    """
+    valores = decodificar_cursor(cursor) if cursor else None
+    if not isinstance(valores, list) or len(valores) != len(campos):
+        return None
+    tramo = 0
+    if nulos_al_final and valores[0] is None:
+        tramo, valores = 1, valores[1:]
+    if not all(isinstance(valor, (str, int, float)) and not isinstance(valor, bool) for valor in valores):
+        return None
+    return tramo, valores
+
+
+def _recorrer(tramos, cursor, operador, limite, convertir):
+    """
+    Hasta 'limite' filas a partir del cursor: 'lt' avanza en el orden de la
+    página y 'gt' retrocede (en orden ascendente). Devuelve None si el
+    cursor no sirve; sin cursor se empieza por el principio.
+    """
+    inicio, desde_cursor = 0, None
+    if cursor is not None:
+        inicio, valores = cursor
+        queryset, campos = tramos[inicio]
+        try:
+            # Los valores se validan contra cada campo al construir el filtro
+            desde_cursor = queryset.filter(_condicion(campos, convertir(valores), operador))
+        except (ValueError, TypeError, ValidationError):
+            return None
+
+    orden = range(inicio, len(tramos)) if operador == 'lt' else range(inicio, -1, -1)
+    filas = []
+    for numero in orden:
+        queryset, campos = tramos[numero]
+        if numero == inicio and desde_cursor is not None:
+            queryset = desde_cursor
+        campos_orden = [f'-{campo}' for campo in campos] if operador == 'lt' else campos
+        filas += queryset.order_by(*campos_orden)[:limite - len(filas)]
+        if len(filas) >= limite:
+            break
+    return filas
+
+
+def _valores_de(objeto, campos):
+    return [getattr(objeto, campo) for campo in campos]
+
+
+def _condicion(campos, valores, operador):
+    """
+    (c1, c2, ...) < (v1, v2, ...) expresado con Q:
+    c1 < v1 OR (c1 = v1 AND c2 < v2) OR ...
+    Se añade además c1 <= v1 para que el índice pueda acotar el rango.
+    """
+    condicion = Q()
+    iguales = {}
+    for campo, valor in zip(campos, valores):
+        condicion |= Q(**iguales, **{f'{campo}__{operador}': valor})
+        iguales[campo] = valor
+    return Q(**{f'{campos[0]}__{operador}e': valores[0]}) & condicion
+
+
+def paginar_keyset(queryset, campos, tamano=50, despues=None, antes=None, convertir=None, nulos_al_final=False):
+    """
+    Pagina 'queryset' en orden descendente por 'campos' (el último debe ser único, ej. 'id').
+
+    'despues' y 'antes' son cursores devueltos en una página anterior.
+    'convertir' transforma los valores decodificados del cursor (por ejemplo
+    texto ISO a datetime); por defecto se convierten los campos de fecha.
+    Con 'nulos_al_final' el primer campo admite NULL y esas filas van al
+    final (NULLS LAST). Un cursor inválido o alterado devuelve la primera página.
+    """
+    convertir = convertir or _convertir_fechas
+    tramos = _tramos(queryset, campos, nulos_al_final)
+    previas = None
+    if (cursor := _leer_cursor(antes, campos, nulos_al_final)) is not None:
+        previas = _recorrer(tramos, cursor, 'gt', tamano + 1, convertir)
+
+    if previas is not None:
+        # Página anterior: se recorre en orden ascendente y se invierte
+        hay_anterior = len(previas) > tamano
+        filas = list(reversed(previas[:tamano]))
+        hay_siguiente = True
+    else:
+        filas = None
+        if (cursor := _leer_cursor(despues, campos, nulos_al_final)) is not None:
+            filas = _recorrer(tramos, cursor, 'lt', tamano + 1, convertir)
+        hay_anterior = filas is not None
+        if filas is None:
+            filas = _recorrer(tramos, None, 'lt', tamano + 1, convertir)
+        hay_siguiente = len(filas) > tamano
+        filas = filas[:tamano]
+
+    return PaginaKeyset(
+        filas,
+        cursor_siguiente=codificar_cursor(_valores_de(filas[-1], campos)) if filas and hay_siguiente else None,
+        cursor_anterior=codificar_cursor(_valores_de(filas[0], campos)) if filas and hay_anterior else None,
+    )
+
+
+def _convertir_fechas(valores):
+    convertidos = []
+    for valor in valores:
+        fecha = parse_datetime(valor) if isinstance(valor, str) else None
+        convertidos.append(fecha or valor)
+    return convertidos
+
+# ==========================================
+# CONTEO APROXIMADO
+# ==========================================
+
+def conteo_aproximado(queryset):
+    """
+    Total estimado de filas según las estadísticas del planificador de
+    PostgreSQL (EXPLAIN), sin ejecutar un COUNT(*) sobre toda la tabla.
+    En otros motores se usa el conteo exacto.
+    """
+    connection = connections[queryset.db]
+    if connection.vendor != 'postgresql':
+        return queryset.count()
+
+    sql, params = queryset.order_by().values('pk').query.sql_with_params()
+    with connection.cursor() as cursor:
+        cursor.execute(f"EXPLAIN (FORMAT JSON) {sql}", params)
+        plan = cursor.fetchone()[0]
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    return int(plan[0]['Plan']['Plan Rows'])
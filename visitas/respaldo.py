@@ -0,0 +1,761 @@
+# ==========================================
+# IMPORTACIONES
+# ==========================================
+import datetime
+import gzip
+import hashlib
+import io
+import json
+import os
+import tarfile
+import tempfile
+import uuid
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import ExitStack, contextmanager
+
+import django
+from django.apps import apps
+from django.conf import settings
+from django.core import serializers
+from django.core.exceptions import SuspiciousFileOperation
+from django.core.files import File
+from django.core.files.storage import default_storage
+from django.core.management.color import no_style
+from django.core.serializers.base import DeserializationError
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import DatabaseError, IntegrityError, connection, models, transaction
+from django.utils import timezone
+
+from .paginacion import conteo_aproximado
+
+FILAS_POR_LECTURA = 2000
+# Datos operativos que no deben volver con una restauración
+MODELOS_EXCLUIDOS = {'visitas.Trabajo'}
+FORMATO = 'bav-respaldo'
+VERSION = 1
+MANIFIESTO = 'manifest.json'
+# Campo con la fecha del último cambio de cada fila. Los modelos de 'visitas'
+# usan 'actualizado'; los que no tienen ninguno se copian siempre completos
+CAMPOS_DE_CAMBIO = {'visitas.Bitacora': 'fecha_hora', 'admin.LogEntry': 'action_time'}
+# Solapamiento entre respaldos incrementales: cubre transacciones que
+# escribieron antes de la marca pero confirmaron después de la foto
+MARGEN_INCREMENTAL = datetime.timedelta(minutes=10)
+
+# ==========================================
+# RESPALDO COMPLETO (TAR CON UN NDJSON.GZ POR MODELO)
+# ==========================================
+# Estructura del archivo .tar:
+#   app.modelo.ndjson.gz   una línea JSON por fila, en el formato de 'dumpdata'
+#   app.modelo.ids.json.gz (solo incrementales) rangos de ids que existían al respaldar
+#   media/<sha256>         fotos y demás archivos referenciados, una copia por contenido
+#   manifest.json          modelos en orden de dependencias, filas y sha256 de cada miembro
+# Un respaldo incremental guarda solo las filas cambiadas desde la marca del
+# respaldo anterior ('base'); restaurar la cadena completo + incrementales
+# en orden deja la base como estaba al momento del último.
+# Cada modelo se lee con un cursor del servidor y se comprime a un archivo
+# temporal antes de entrar al tar: la memoria no depende del tamaño de la base.
+
+
+def modelos_a_respaldar():
+    """Modelos concretos de todas las aplicaciones, ordenados por sus llaves foráneas."""
+    por_app = [
+        (app_config, [
+            modelo for modelo in app_config.get_models()
+            if modelo._meta.managed and not modelo._meta.proxy
+            and modelo._meta.label not in MODELOS_EXCLUIDOS
+        ])
+        for app_config in apps.get_app_configs()
+    ]
+    return serializers.sort_dependencies(por_app)
+
+
+def _nombre_miembro(modelo):
+    return f"{modelo._meta.label_lower}.ndjson.gz"
+
+
+def campo_de_cambio(modelo):
+    """Nombre del campo con la fecha de último cambio, o None si el modelo no tiene."""
+    if modelo._meta.label in CAMPOS_DE_CAMBIO:
+        return CAMPOS_DE_CAMBIO[modelo._meta.label]
+    if any(campo.name == 'actualizado' for campo in modelo._meta.concrete_fields):
+        return 'actualizado'
+    return None
+
+
+def generar_respaldo(destino, progreso=None, base=None):
+    """
+    Escribe en 'destino' (ruta) el respaldo en formato tar.
+
+    Sin 'base' el respaldo es completo. Con 'base' (el dict {'id', 'marca',
+    'media'} guardado de un respaldo anterior) solo se guardan las filas
+    cambiadas desde esa marca y los archivos cuyo hash no está en 'media'. 'progreso', si se indica, se llama como
+    progreso(filas_hechas, total_estimado).
+
+    Devuelve el manifiesto; sus claves 'id' y 'marca' sirven de 'base' al
+    siguiente respaldo incremental.
+    """
+    modelos = modelos_a_respaldar()
+    desde = None
+    if base:
+        desde = datetime.datetime.fromisoformat(base['marca']) - MARGEN_INCREMENTAL
+    manifiesto = {
+        'formato': FORMATO,
+        'version': VERSION,
+        'id': uuid.uuid4().hex,
+        'tipo': 'incremental' if base else 'completo',
+        'base': base['id'] if base else None,
+        'desde': desde.isoformat() if desde else None,
+        # La marca se toma antes de abrir la foto: lo que cambie después entra en el próximo
+        'marca': timezone.now().isoformat(),
+        'creado': timezone.now().isoformat(),
+        'django': django.get_version(),
+        'modelos': [],
+    }
+
+    with transaction.atomic():
+        if connection.vendor == 'postgresql':
+            # Una sola foto de la base para todos los modelos (llaves foráneas consistentes)
+            with connection.cursor() as cursor:
+                cursor.execute("SET TRANSACTION ISOLATION LEVEL REPEATABLE READ READ ONLY")
+
+        consultas = {modelo: _filas_a_respaldar(modelo, desde) for modelo in modelos}
+        total_estimado = sum(conteo_aproximado(q) for q in consultas.values()) or 1
+        hechas = 0
+
+        with tarfile.open(destino, 'w') as tar:
+            for modelo in modelos:
+                with tempfile.TemporaryFile() as temporal:
+                    filas, sha256 = _volcar_modelo(consultas[modelo], temporal)
+                    hechas += filas
+                    temporal.seek(0)
+                    _agregar_miembro(tar, _nombre_miembro(modelo), temporal, os.fstat(temporal.fileno()).st_size)
+
+                entrada = {
+                    'modelo': modelo._meta.label,
+                    'archivo': _nombre_miembro(modelo),
+                    'filas': filas,
+                    'sha256': sha256,
+                }
+                if desde and campo_de_cambio(modelo):
+                    # Las filas borradas no dejan marca: se guardan los ids vigentes
+                    entrada['ids'], entrada['ids_sha256'] = _agregar_ids(tar, modelo)
+                manifiesto['modelos'].append(entrada)
+                if progreso:
+                    progreso(min(hechas, total_estimado), total_estimado)
+
+            conocidos = base.get('media', []) if base else []
+            manifiesto['media'], manifiesto['media_faltantes'] = _agregar_media(tar, consultas.values(), conocidos)
+            datos = json.dumps(manifiesto, indent=2, ensure_ascii=False).encode('utf-8')
+            _agregar_miembro(tar, MANIFIESTO, io.BytesIO(datos), len(datos))
+
+    return manifiesto
+
+
+def _filas_a_respaldar(modelo, desde):
+    queryset = modelo._default_manager.order_by('pk')
+    campo = campo_de_cambio(modelo)
+    if desde and campo:
+        queryset = queryset.filter(**{f'{campo}__gte': desde})
+    return queryset
+
+
+def _agregar_ids(tar, modelo):
+    """Guarda los ids actuales del modelo como rangos [inicio, fin]. Devuelve (miembro, sha256)."""
+    rangos = []
+    for pk in modelo._default_manager.order_by('pk').values_list('pk', flat=True).iterator(chunk_size=10000):
+        if rangos and pk == rangos[-1][1] + 1:
+            rangos[-1][1] = pk
+        else:
+            rangos.append([pk, pk])
+
+    nombre = f"{modelo._meta.label_lower}.ids.json.gz"
+    datos = gzip.compress(json.dumps(rangos, separators=(',', ':')).encode('utf-8'), mtime=0)
+    _agregar_miembro(tar, nombre, io.BytesIO(datos), len(datos))
+    return nombre, hashlib.sha256(datos).hexdigest()
+
+
+def _agregar_miembro(tar, nombre, archivo, tamano):
+    info = tarfile.TarInfo(nombre)
+    info.size = tamano
+    info.mtime = int(timezone.now().timestamp())
+    tar.addfile(info, archivo)
+
+
+class _Suma:
+    """Archivo que calcula el sha256 de lo que se escribe en él."""
+    def __init__(self, archivo):
+        self.archivo = archivo
+        self.hash = hashlib.sha256()
+
+    def write(self, datos):
+        self.hash.update(datos)
+        return self.archivo.write(datos)
+
+    def flush(self):
+        self.archivo.flush()
+
+
+def _volcar_modelo(queryset, destino):
+    """Escribe las filas de 'queryset' como NDJSON comprimido. Devuelve (filas, sha256)."""
+    modelo = queryset.model
+    m2m = [campo.name for campo in modelo._meta.many_to_many if campo.remote_field.through._meta.auto_created]
+    if m2m:
+        queryset = queryset.prefetch_related(*m2m)
+
+    suma = _Suma(destino)
+    filas = 0
+    with gzip.GzipFile(fileobj=suma, mode='wb', mtime=0) as comprimido:
+        lote = []
+        for objeto in queryset.iterator(chunk_size=FILAS_POR_LECTURA):
+            lote.append(objeto)
+            if len(lote) == FILAS_POR_LECTURA:
+                filas += _escribir_lote(lote, comprimido)
+                lote = []
+        filas += _escribir_lote(lote, comprimido)
+    return filas, suma.hash.hexdigest()
+
+
+def _escribir_lote(lote, destino):
+    if not lote:
+        return 0
+    lineas = ''.join(
+        json.dumps(objeto, cls=DjangoJSONEncoder, ensure_ascii=False) + '\n'
+        for objeto in serializers.serialize('python', lote)
+    )
+    destino.write(lineas.encode('utf-8'))
+    return len(lote)
+
+# ==========================================
+# RESTAURACIÓN
+# ==========================================
+# Los modelos se restauran en el orden del manifiesto (dependencias primero)
+# leyendo cada miembro línea a línea. Las filas se insertan por lotes con
+# INSERT ... ON CONFLICT (pk) DO UPDATE, todo dentro de una transacción: si
+# algo falla la base queda como estaba. Con simular=True se hace el mismo
+# trabajo (incluida la verificación de llaves foráneas) y se revierte.
+
+LOTE_RESTAURACION = 2000
+# Tablas de solo inserción: una fila existente nunca se reescribe
+MODELOS_SOLO_INSERTAR = {'visitas.Bitacora'}
+
+
+class RespaldoInvalido(Exception):
+    pass
+
+
+def restaurar_respaldo(rutas, progreso=None, simular=False):
+    """
+    Restaura un respaldo .tar (formato actual) o .json (formato anterior).
+    'rutas' puede ser una lista con un respaldo completo y sus incrementales,
+    en cualquier orden: se aplican siguiendo la cadena.
+    Los objetos que ya existen se actualizan; los demás se crean.
+
+    Lanza RespaldoInvalido si el archivo está dañado o sus datos no se
+    pueden guardar (en ese caso no se modifica nada).
+    Devuelve la cantidad de objetos procesados.
+    """
+    if isinstance(rutas, (str, os.PathLike)):
+        rutas = [rutas]
+    with transaction.atomic(), ExitStack() as pila:
+        if len(rutas) == 1 and not tarfile.is_tarfile(rutas[0]):
+            cadena = []
+            total = _restaurar_json(rutas[0], progreso)
+        else:
+            cadena = _abrir_cadena(rutas, pila)
+            total = _restaurar_cadena(cadena, progreso)
+
+        modelos = modelos_a_respaldar()
+        try:
+            # Las llaves foráneas se verifican al final (restricciones diferidas)
+            connection.check_constraints(table_names=[m._meta.db_table for m in modelos])
+        except IntegrityError as error:
+            raise RespaldoInvalido(f"Referencias inválidas en el respaldo: {error}") from error
+
+        # Los archivos se escriben al final, cuando los datos ya se validaron
+        _restaurar_media(cadena, escribir=not simular)
+        if simular:
+            transaction.set_rollback(True)
+        else:
+            _reiniciar_secuencias(modelos)
+    return total
+
+
+def _abrir_cadena(rutas, pila):
+    """Abre los .tar (quedan abiertos hasta cerrar 'pila') y los devuelve en orden de aplicación."""
+    respaldos = []
+    for ruta in rutas:
+        if not tarfile.is_tarfile(ruta):
+            raise RespaldoInvalido("Solo los respaldos .tar se pueden combinar en una cadena")
+        tar = pila.enter_context(tarfile.open(ruta, 'r'))
+        respaldos.append((tar, _leer_manifiesto(tar)))
+    if len(respaldos) == 1 and respaldos[0][1]['formato'] == FORMATO_NATIVO:
+        return respaldos
+    return _ordenar_cadena(respaldos)
+
+
+def _restaurar_cadena(cadena, progreso):
+    if cadena[0][1]['formato'] == FORMATO_NATIVO:
+        tar, manifiesto = cadena[0]
+        return _cargar_nativo(tar, manifiesto, progreso)
+
+    total = sum(e['filas'] for _, manifiesto in cadena for e in manifiesto['modelos']) or 1
+    hechas = 0
+    for tar, manifiesto in cadena:
+        def informar(filas, _, previas=hechas):
+            if progreso:
+                progreso(previas + filas, total)
+        hechas += _restaurar_tar(tar, manifiesto, informar)
+    return hechas
+
+
+def _leer_manifiesto(tar):
+    try:
+        manifiesto = json.load(tar.extractfile(MANIFIESTO))
+    except (KeyError, ValueError) as error:
+        raise RespaldoInvalido("El archivo no contiene un manifiesto válido") from error
+    if manifiesto.get('formato') not in (FORMATO, FORMATO_NATIVO) or manifiesto.get('version', 0) > VERSION:
+        raise RespaldoInvalido("Formato de respaldo no reconocido")
+    return manifiesto
+
+
+def _ordenar_cadena(respaldos):
+    """Ordena [(tar, manifiesto)] desde el respaldo completo siguiendo 'base'; exige una cadena sin huecos."""
+    if any(manifiesto['formato'] != FORMATO for _, manifiesto in respaldos):
+        raise RespaldoInvalido("Un respaldo nativo se restaura solo, sin incrementales")
+    # Los respaldos anteriores a los incrementales no tienen 'tipo' ni 'id': son completos
+    completos = [r for r in respaldos if r[1].get('tipo', 'completo') == 'completo']
+    if len(completos) != 1:
+        raise RespaldoInvalido("La cadena debe tener exactamente un respaldo completo")
+
+    por_base = {r[1].get('base'): r for r in respaldos if r[1].get('tipo') == 'incremental'}
+    cadena = completos
+    while (siguiente := por_base.pop(cadena[-1][1].get('id'), None)) is not None:
+        cadena.append(siguiente)
+    if por_base:
+        raise RespaldoInvalido(
+            "Faltan respaldos intermedios: hay incrementales que no continúan la cadena del respaldo completo"
+        )
+    return cadena
+
+
+def _restaurar_tar(tar, manifiesto, progreso):
+    total = sum(entrada['filas'] for entrada in manifiesto['modelos']) or 1
+    hechas = 0
+    for entrada in manifiesto['modelos']:
+        lectura = _LecturaConSuma(tar.extractfile(entrada['archivo']))
+        try:
+            with gzip.open(lectura, 'rt', encoding='utf-8') as lineas:
+                for lote in _lotes(json.loads(linea) for linea in lineas):
+                    hechas += _guardar_lote(lote)
+                    if progreso:
+                        progreso(hechas, total)
+        except (OSError, EOFError, zlib.error, ValueError) as error:
+            raise RespaldoInvalido(f"{entrada['archivo']} está dañado: {error}") from error
+        if lectura.hash.hexdigest() != entrada['sha256']:
+            raise RespaldoInvalido(f"El contenido de {entrada['archivo']} no coincide con el manifiesto")
+        if 'ids' in entrada:
+            _borrar_ausentes(apps.get_model(entrada['modelo']), _leer_ids(tar, entrada))
+    return hechas
+
+
+def _leer_ids(tar, entrada):
+    datos = tar.extractfile(entrada['ids']).read()
+    if hashlib.sha256(datos).hexdigest() != entrada['ids_sha256']:
+        raise RespaldoInvalido(f"El contenido de {entrada['ids']} no coincide con el manifiesto")
+    return json.loads(gzip.decompress(datos))
+
+
+def _borrar_ausentes(modelo, rangos):
+    """Borra las filas cuyo id no está en 'rangos' (borradas en el origen después del respaldo base)."""
+    rangos = iter(rangos)
+    rango = next(rangos, None)
+    sobrantes = []
+    for pk in modelo._default_manager.order_by('pk').values_list('pk', flat=True).iterator(chunk_size=10000):
+        while rango and pk > rango[1]:
+            rango = next(rangos, None)
+        if not rango or pk < rango[0]:
+            sobrantes.append(pk)
+    # Borrado directo en SQL: sin señales (el resumen de visitas ya viene en el respaldo)
+    for inicio in range(0, len(sobrantes), LOTE_RESTAURACION):
+        modelo._base_manager.filter(pk__in=sobrantes[inicio:inicio + LOTE_RESTAURACION])._raw_delete(connection.alias)
+
+
+def _restaurar_json(ruta, progreso):
+    # El formato anterior es una sola lista JSON: se carga completa y se
+    # agrupa por modelo en orden de dependencias
+    try:
+        with open(ruta, encoding='utf-8') as origen:
+            data = json.load(origen)
+    except ValueError as error:
+        raise RespaldoInvalido("El archivo no es un respaldo válido") from error
+
+    orden = {modelo._meta.label_lower: posicion for posicion, modelo in enumerate(modelos_a_respaldar())}
+    data.sort(key=lambda registro: orden.get(str(registro.get('model', '')).lower(), len(orden)))
+
+    hechas = 0
+    for lote in _lotes(data):
+        hechas += _guardar_lote(lote)
+        if progreso:
+            progreso(hechas, len(data))
+    return hechas
+
+
+def _lotes(registros):
+    """Agrupa los registros en lotes de un mismo modelo de hasta LOTE_RESTAURACION."""
+    lote = []
+    for registro in registros:
+        if lote and (len(lote) == LOTE_RESTAURACION or registro.get('model') != lote[0].get('model')):
+            yield lote
+            lote = []
+        lote.append(registro)
+    if lote:
+        yield lote
+
+
+class _LecturaConSuma:
+    """Archivo de solo lectura que calcula el sha256 de lo que se lee de él."""
+    def __init__(self, archivo):
+        self.archivo = archivo
+        self.hash = hashlib.sha256()
+
+    def read(self, tamano=-1):
+        datos = self.archivo.read(tamano)
+        self.hash.update(datos)
+        return datos
+
+
+def _guardar_lote(lote):
+    etiqueta = lote[0].get('model')
+    try:
+        objetos = list(serializers.deserialize('python', lote, ignorenonexistent=True))
+    except (DeserializationError, LookupError) as error:
+        raise RespaldoInvalido(f"Registro inválido de {etiqueta}: {error}") from error
+
+    modelo = type(objetos[0].object)
+    campos = [
+        campo.name for campo in modelo._meta.concrete_fields
+        if not campo.primary_key and not campo.generated
+    ]
+    if modelo._meta.label in MODELOS_SOLO_INSERTAR or not campos:
+        opciones = {'ignore_conflicts': True}
+    else:
+        opciones = {'update_conflicts': True, 'unique_fields': [modelo._meta.pk.name], 'update_fields': campos}
+
+    try:
+        with _fechas_del_respaldo(modelo):
+            modelo._default_manager.bulk_create([objeto.object for objeto in objetos], **opciones)
+        _guardar_relaciones(modelo, objetos)
+    except DatabaseError as error:
+        raise RespaldoInvalido(f"No se pudieron guardar los registros de {etiqueta}: {error}") from error
+    return len(objetos)
+
+
+def _guardar_relaciones(modelo, objetos):
+    """Reemplaza las filas de las tablas intermedias (muchos a muchos) de los objetos del lote."""
+    for campo in modelo._meta.many_to_many:
+        intermedia = campo.remote_field.through
+        if not intermedia._meta.auto_created:
+            continue
+        origen, destino = f"{campo.m2m_field_name()}_id", f"{campo.m2m_reverse_field_name()}_id"
+        con_datos = [objeto for objeto in objetos if campo.name in objeto.m2m_data]
+        if not con_datos:
+            continue
+        intermedia._default_manager.filter(**{f"{origen}__in": [o.object.pk for o in con_datos]}).delete()
+        intermedia._default_manager.bulk_create([
+            intermedia(**{origen: objeto.object.pk, destino: relacionado})
+            for objeto in con_datos
+            for relacionado in objeto.m2m_data[campo.name]
+        ], ignore_conflicts=True)
+
+
+@contextmanager
+def _fechas_del_respaldo(modelo):
+    """Desactiva auto_now/auto_now_add para conservar las fechas guardadas en el respaldo."""
+    automaticos = [
+        (campo, campo.auto_now, campo.auto_now_add) for campo in modelo._meta.concrete_fields
+        if getattr(campo, 'auto_now', False) or getattr(campo, 'auto_now_add', False)
+    ]
+    for campo, _, _ in automaticos:
+        campo.auto_now = campo.auto_now_add = False
+    try:
+        yield
+    finally:
+        for campo, auto_now, auto_now_add in automaticos:
+            campo.auto_now, campo.auto_now_add = auto_now, auto_now_add
+
+
+def _reiniciar_secuencias(modelos):
+    """Ajusta las secuencias de ids al máximo restaurado (como 'loaddata')."""
+    sentencias = connection.ops.sequence_reset_sql(no_style(), modelos)
+    if sentencias:
+        with connection.cursor() as cursor:
+            for sentencia in sentencias:
+                cursor.execute(sentencia)
+
+# ==========================================
+# ARCHIVOS MULTIMEDIA (FOTOS DE VISITANTES)
+# ==========================================
+# Los archivos a los que apuntan los FileField/ImageField de las filas
+# respaldadas entran al tar como 'media/<sha256>': una sola copia por
+# contenido. El manifiesto ('media') relaciona cada nombre con su hash, y un
+# incremental omite los hashes que ya están en los respaldos anteriores.
+
+def _campos_archivo(modelo):
+    return [campo.name for campo in modelo._meta.concrete_fields if isinstance(campo, models.FileField)]
+
+
+def _suma_archivo(nombre):
+    """Devuelve (sha256, tamaño) de un archivo del almacenamiento."""
+    suma = hashlib.sha256()
+    tamano = 0
+    with default_storage.open(nombre, 'rb') as archivo:
+        for bloque in iter(lambda: archivo.read(1024 * 1024), b''):
+            suma.update(bloque)
+            tamano += len(bloque)
+    return suma.hexdigest(), tamano
+
+
+def _agregar_media(tar, consultas, conocidos=()):
+    """
+    Agrega al tar los archivos referenciados por las filas de 'consultas'
+    cuyo hash no esté en 'conocidos'. Devuelve ({nombre: sha256}, faltantes).
+    """
+    conocidos = set(conocidos)
+    referencias = {}
+    faltantes = 0
+    for queryset in consultas:
+        for campo in _campos_archivo(queryset.model):
+            nombres = queryset.exclude(**{f'{campo}__isnull': True}).exclude(**{campo: ''}).values_list(campo, flat=True)
+            for nombre in nombres.iterator(chunk_size=FILAS_POR_LECTURA):
+                if nombre in referencias:
+                    continue
+                try:
+                    sha256, tamano = _suma_archivo(nombre)
+                except (OSError, SuspiciousFileOperation):
+                    # Referencia rota en el origen: no hay nada que copiar
+                    faltantes += 1
+                    continue
+                referencias[nombre] = sha256
+                if sha256 not in conocidos:
+                    with default_storage.open(nombre, 'rb') as archivo:
+                        _agregar_miembro(tar, f"media/{sha256}", archivo, tamano)
+                    conocidos.add(sha256)
+    return referencias, faltantes
+
+
+def _restaurar_media(cadena, escribir=True):
+    """
+    Verifica y escribe en el almacenamiento los archivos de la cadena.
+    Los que ya existen con el mismo contenido no se tocan.
+    """
+    miembros = {}
+    referencias = {}
+    for tar, manifiesto in cadena:
+        for info in tar.getmembers():
+            if info.name.startswith('media/'):
+                miembros.setdefault(info.name.removeprefix('media/'), (tar, info))
+        referencias.update(manifiesto.get('media', {}))
+
+    for nombre, sha256 in referencias.items():
+        if sha256 not in miembros:
+            raise RespaldoInvalido(f"Falta el archivo {nombre} en los respaldos: incluya los respaldos anteriores de la cadena")
+        try:
+            if escribir and default_storage.exists(nombre):
+                if _suma_archivo(nombre)[0] == sha256:
+                    continue
+                default_storage.delete(nombre)
+            tar, info = miembros[sha256]
+            lectura = _LecturaConSuma(tar.extractfile(info))
+            if escribir:
+                default_storage.save(nombre, File(lectura, name=nombre))
+            else:
+                while lectura.read(1024 * 1024):
+                    pass
+        except (OSError, SuspiciousFileOperation) as error:
+            raise RespaldoInvalido(f"No se pudo restaurar el archivo {nombre}: {error}") from error
+        if lectura.hash.hexdigest() != sha256:
+            if escribir:
+                default_storage.delete(nombre)
+            raise RespaldoInvalido(f"El archivo {nombre} del respaldo está dañado")
+
+# ==========================================
+# RESPALDO NATIVO (COPY DE POSTGRESQL)
+# ==========================================
+# Para recuperación ante desastres: cada tabla se vuelca con COPY ... TO
+# STDOUT sin pasar por el serializador de Django. Las tablas se copian en
+# paralelo, cada una con su propia conexión, todas sobre la misma foto de
+# la base (pg_export_snapshot). El .tar tiene la misma estructura que el
+# respaldo normal (un miembro .gz por tabla y manifest.json) y se restaura
+# con COPY ... FROM STDIN reemplazando el contenido de las tablas.
+
+FORMATO_NATIVO = 'bav-respaldo-nativo'
+FORMATOS_COPY = ('binary', 'csv')
+HILOS_NATIVO = getattr(settings, 'RESPALDO_NATIVO_HILOS', 4)
+
+
+def tablas_a_respaldar():
+    """Modelos a respaldar más sus tablas intermedias automáticas (al final, ya cargados ambos lados)."""
+    modelos = modelos_a_respaldar()
+    intermedias = [
+        campo.remote_field.through
+        for modelo in modelos for campo in modelo._meta.local_many_to_many
+        if campo.remote_field.through._meta.auto_created
+    ]
+    return modelos + intermedias
+
+
+def _columnas(modelo):
+    # Las columnas calculadas (ej. 'busqueda' de la bitácora) no son campos
+    # del modelo o están marcadas como generadas: PostgreSQL las recalcula
+    return [campo.column for campo in modelo._meta.concrete_fields if not campo.generated]
+
+
+def _lista_columnas(columnas):
+    return ', '.join(connection.ops.quote_name(columna) for columna in columnas)
+
+
+def generar_respaldo_nativo(destino, progreso=None, hilos=HILOS_NATIVO, formato='binary'):
+    """
+    Escribe en 'destino' (ruta) un respaldo nativo de PostgreSQL en formato tar.
+
+    'formato' es el de COPY: 'binary' (más rápido, misma versión mayor de
+    PostgreSQL) o 'csv' (portable). Devuelve (total_tablas, total_registros).
+    """
+    if connection.vendor != 'postgresql':
+        raise RespaldoInvalido("El respaldo nativo (COPY) solo está disponible en PostgreSQL.")
+    if formato not in FORMATOS_COPY:
+        raise ValueError(f"Formato de COPY no soportado: {formato}")
+
+    tablas = tablas_a_respaldar()
+    manifiesto = {
+        'formato': FORMATO_NATIVO,
+        'version': VERSION,
+        'creado': timezone.now().isoformat(),
+        'django': django.get_version(),
+        'postgresql': connection.pg_version,
+        'copy': formato,
+        'tablas': [],
+    }
+
+    # La transacción que exporta la foto debe seguir abierta mientras los hilos la usan
+    with transaction.atomic():
+        with connection.cursor() as cursor:
+            cursor.execute("SET TRANSACTION ISOLATION LEVEL REPEATABLE READ READ ONLY")
+            cursor.execute("SELECT pg_export_snapshot()")
+            foto = cursor.fetchone()[0]
+        total_estimado = sum(conteo_aproximado(m._default_manager.all()) for m in tablas) or 1
+        hechas = 0
+
+        with tempfile.TemporaryDirectory() as temporal, ThreadPoolExecutor(max(1, hilos)) as pool:
+            futuros = [
+                pool.submit(_volcar_tabla, modelo, foto, formato, os.path.join(temporal, modelo._meta.db_table))
+                for modelo in tablas
+            ]
+            with tarfile.open(destino, 'w') as tar:
+                # Se agregan al tar en orden de carga, a medida que terminan
+                for modelo, futuro in zip(tablas, futuros):
+                    ruta, filas, sha256 = futuro.result()
+                    nombre = f"{modelo._meta.db_table}.copy.gz"
+                    with open(ruta, 'rb') as archivo:
+                        _agregar_miembro(tar, nombre, archivo, os.path.getsize(ruta))
+                    os.remove(ruta)
+
+                    manifiesto['tablas'].append({
+                        'tabla': modelo._meta.db_table,
+                        'columnas': _columnas(modelo),
+                        'archivo': nombre,
+                        'filas': filas,
+                        'sha256': sha256,
+                    })
+                    hechas += filas
+                    if progreso:
+                        progreso(min(hechas, total_estimado), total_estimado)
+
+                consultas = [modelo._default_manager.all() for modelo in tablas]
+                manifiesto['media'], manifiesto['media_faltantes'] = _agregar_media(tar, consultas)
+                datos = json.dumps(manifiesto, indent=2, ensure_ascii=False).encode('utf-8')
+                _agregar_miembro(tar, MANIFIESTO, io.BytesIO(datos), len(datos))
+
+    return len(tablas), sum(t['filas'] for t in manifiesto['tablas'])
+
+
+def _volcar_tabla(modelo, foto, formato, ruta):
+    """Ejecutado en un hilo: COPY de una tabla con una conexión propia. Devuelve (ruta, filas, sha256)."""
+    conexion = connection.get_new_connection(connection.get_connection_params())
+    try:
+        conexion.set_session(isolation_level='REPEATABLE READ', readonly=True)
+        with conexion.cursor() as cursor:
+            cursor.execute("SET TRANSACTION SNAPSHOT %s", [foto])
+            with open(ruta, 'wb') as archivo:
+                suma = _Suma(archivo)
+                # Nivel 1: la compresión no debe frenar a COPY
+                with gzip.GzipFile(fileobj=suma, mode='wb', compresslevel=1, mtime=0) as comprimido:
+                    cursor.copy_expert(
+                        f"COPY (SELECT {_lista_columnas(_columnas(modelo))} "
+                        f"FROM {connection.ops.quote_name(modelo._meta.db_table)}) "
+                        f"TO STDOUT WITH (FORMAT {formato})",
+                        comprimido,
+                    )
+            filas = cursor.rowcount
+            if filas < 0:
+                # Versiones de psycopg2 que no informan las filas de COPY: se cuentan en la misma foto
+                cursor.execute(f"SELECT count(*) FROM {connection.ops.quote_name(modelo._meta.db_table)}")
+                filas = cursor.fetchone()[0]
+        conexion.rollback()
+    finally:
+        conexion.close()
+    return ruta, filas, suma.hash.hexdigest()
+
+
+def _cargar_nativo(tar, manifiesto, progreso):
+    """Reemplaza el contenido de las tablas del manifiesto con COPY ... FROM STDIN."""
+    if connection.vendor != 'postgresql':
+        raise RespaldoInvalido("El respaldo nativo (COPY) solo se puede restaurar en PostgreSQL.")
+
+    conocidas = {modelo._meta.db_table for modelo in tablas_a_respaldar()}
+    desconocidas = [t['tabla'] for t in manifiesto['tablas'] if t['tabla'] not in conocidas]
+    if desconocidas:
+        raise RespaldoInvalido(f"El respaldo contiene tablas que no existen en esta versión: {', '.join(desconocidas)}")
+
+    total = sum(t['filas'] for t in manifiesto['tablas']) or 1
+    hechas = 0
+    formato = manifiesto.get('copy', 'binary')
+    with connection.cursor() as cursor:
+        cursor.execute("SET CONSTRAINTS ALL DEFERRED")
+        # DELETE y no TRUNCATE: 'visitas_trabajo' (no respaldada) referencia a los usuarios
+        for entrada in reversed(manifiesto['tablas']):
+            cursor.execute(f"DELETE FROM {connection.ops.quote_name(entrada['tabla'])}")
+
+        for entrada in manifiesto['tablas']:
+            lectura = _LecturaConSuma(tar.extractfile(entrada['archivo']))
+            try:
+                with gzip.GzipFile(fileobj=lectura, mode='rb') as comprimido:
+                    cursor.copy_expert(
+                        f"COPY {connection.ops.quote_name(entrada['tabla'])} "
+                        f"({_lista_columnas(entrada['columnas'])}) FROM STDIN WITH (FORMAT {formato})",
+                        comprimido,
+                    )
+            except (OSError, EOFError, zlib.error) as error:
+                raise RespaldoInvalido(f"{entrada['archivo']} está dañado: {error}") from error
+            except DatabaseError as error:
+                raise RespaldoInvalido(f"No se pudo cargar la tabla {entrada['tabla']}: {error}") from error
+            if lectura.hash.hexdigest() != entrada['sha256']:
+                raise RespaldoInvalido(f"El contenido de {entrada['archivo']} no coincide con el manifiesto")
+            hechas += entrada['filas']
+            if progreso:
+                progreso(hechas, total)
+
+    _desligar_excluidos()
+    return hechas
+
+
+def _desligar_excluidos():
+    """Anula las referencias de los modelos no respaldados a filas que ya no existen."""
+    for etiqueta in MODELOS_EXCLUIDOS:
+        modelo = apps.get_model(etiqueta)
+        for campo in modelo._meta.concrete_fields:
+            if campo.is_relation and campo.null:
+                modelo._default_manager.exclude(**{f"{campo.name}__isnull": True}).exclude(
+                    **{f"{campo.name}__in": campo.related_model._default_manager.values('pk')}
+                ).update(**{campo.name: None})
@@ -0,0 +1,20 @@
+from django import template
+from django.core.files.storage import default_storage
+
+from visitas.imagenes import ruta_miniatura, tamano_adecuado
+
+register = template.Library()
+
+
+@register.simple_tag
+def miniatura(foto, pixeles):
+    """
+    URL de la miniatura de 'foto' para mostrarla a 'pixeles' px.
+    Si todavía no se generó (ver 'generar_miniaturas') usa la original.
+    """
+    if not foto:
+        return ''
+    ruta = ruta_miniatura(foto.name, tamano_adecuado(int(pixeles)))
+    if default_storage.exists(ruta):
+        return default_storage.url(ruta)
+    return foto.url
@@ -1,3 +1,644 @@
-from django.test import TestCase
+# ==========================================
+# IMPORTACIONES
+# ==========================================
+import glob
+import importlib
+import io
+import json
+import os
+import tarfile
+import tempfile
+from unittest import mock
 
-# Create your tests here.
+import datetime
+
+from django.apps import apps
+from django.db import DataError, IntegrityError, transaction
+from django.db.models import F, Sum
+from django.http import QueryDict
+from django.contrib.auth.models import User
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+from PIL import Image
+
+from . import auditoria, busqueda, respaldo
+from .grupos import GrupoInvalido, leer_archivo, leer_lista, registrar_grupo
+from .models import Bitacora, ContadorAcceso, ResumenVisitas, Visita, Visitante
+from .paginacion import codificar_cursor, paginar_keyset
+
+# ==========================================
+# ESCRITOR DE LA BITÁCORA
+# ==========================================
+
+class EscritorBitacoraTests(TestCase):
+    def setUp(self):
+        directorio = tempfile.TemporaryDirectory()
+        self.addCleanup(directorio.cleanup)
+        self.respaldo = os.path.join(directorio.name, 'pendiente.jsonl')
+        self.cuarentena = os.path.join(directorio.name, 'rechazada.jsonl')
+        for nombre, valor in (('ARCHIVO_RESPALDO', self.respaldo), ('ARCHIVO_CUARENTENA', self.cuarentena)):
+            parche = mock.patch.object(auditoria, nombre, valor)
+            parche.start()
+            self.addCleanup(parche.stop)
+
+    def _evento(self, accion):
+        return Bitacora(accion=accion, detalles='prueba', ip_origen='127.0.0.1', fecha_hora=timezone.now())
+
+    def _lineas(self, ruta):
+        with open(ruta, encoding='utf-8') as f:
+            return [json.loads(linea) for linea in f]
+
+    def test_fila_rechazada_va_a_cuarentena_y_el_resto_se_inserta(self):
+        guardar = Bitacora.save
+
+        def guardar_o_rechazar(evento, *args, **kwargs):
+            if evento.accion == 'RECHAZADO':
+                raise DataError("valor demasiado largo")
+            return guardar(evento, *args, **kwargs)
+
+        lote = [self._evento('A'), self._evento('RECHAZADO'), self._evento('B')]
+        with mock.patch.object(Bitacora.objects, 'bulk_create', side_effect=DataError), \
+                mock.patch.object(Bitacora, 'save', guardar_o_rechazar), \
+                self.assertLogs('visitas.auditoria', 'WARNING'):
+            auditoria._escribir(lote)
+
+        self.assertEqual(sorted(Bitacora.objects.values_list('accion', flat=True)), ['A', 'B'])
+        self.assertEqual([fila['accion'] for fila in self._lineas(self.cuarentena)], ['RECHAZADO'])
+        self.assertFalse(os.path.exists(self.respaldo))
+
+    def test_error_inesperado_devuelve_el_archivo_al_respaldo(self):
+        auditoria._guardar_en_archivo(self.respaldo, [self._evento('A'), self._evento('B')])
+
+        with mock.patch.object(auditoria, '_ultimo_reintento', float('-inf')), \
+                mock.patch.object(auditoria, '_insertar', side_effect=RuntimeError):
+            with self.assertRaises(RuntimeError):
+                auditoria._reintentar_respaldo()
+
+        self.assertEqual([fila['accion'] for fila in self._lineas(self.respaldo)], ['A', 'B'])
+        self.assertEqual(glob.glob(self.respaldo + '.*.procesando'), [])
+
+    def test_respaldo_reinsertado_borra_el_archivo(self):
+        auditoria._guardar_en_archivo(self.respaldo, [self._evento('A')])
+
+        with mock.patch.object(auditoria, '_ultimo_reintento', float('-inf')):
+            auditoria._reintentar_respaldo()
+
+        self.assertEqual(list(Bitacora.objects.values_list('accion', flat=True)), ['A'])
+        self.assertFalse(os.path.exists(self.respaldo))
+        self.assertEqual(glob.glob(self.respaldo + '.*.procesando'), [])
+
+    @mock.patch.object(auditoria, 'ASINCRONA', False)
+    def test_evento_de_transaccion_revertida_no_se_registra(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            with self.assertRaises(RuntimeError), transaction.atomic():
+                auditoria.registrar_bitacora(accion='REVERTIDO')
+                raise RuntimeError
+            with transaction.atomic():
+                auditoria.registrar_bitacora(accion='CONFIRMADO')
+
+        self.assertEqual(list(Bitacora.objects.values_list('accion', flat=True)), ['CONFIRMADO'])
+
+    def test_vaciar_bitacora_escribe_el_lote_que_tiene_el_hilo(self):
+        auditoria._en_mano.append(self._evento('EN_MANO'))
+        auditoria._cola.put_nowait(self._evento('EN_COLA'))
+
+        auditoria.vaciar_bitacora()
+
+        self.assertEqual(sorted(Bitacora.objects.values_list('accion', flat=True)), ['EN_COLA', 'EN_MANO'])
+        self.assertEqual(auditoria._en_mano, [])
+
+
+@mock.patch.object(auditoria, 'ASINCRONA', False)
+class EventoBitacoraTests(TestCase):
+    def setUp(self):
+        visitante = Visitante.objects.create(cedula='V-1', nombre_completo='Ana Pérez', estatus='natural')
+        self.visita = Visita.objects.create(visitante=visitante, motivo='Reunión', a_quien_visita='Sistemas')
+        Bitacora.objects.all().delete()
+
+    def test_evento_escribe_una_fila_sin_cargar_el_visitante(self):
+        visita = Visita.objects.get(pk=self.visita.pk)
+        with self.captureOnCommitCallbacks(execute=True):
+            with auditoria.evento(None, 'Registro de Salida', 'Salida de V-1', '127.0.0.1'), transaction.atomic():
+                visita.salida = timezone.now()
+                visita.save()
+
+        self.assertFalse(Visita.visitante.is_cached(visita))
+        self.assertEqual(list(Bitacora.objects.values_list('accion', 'detalles')), [('Registro de Salida', 'Salida de V-1')])
+
+    def test_cambio_fuera_de_evento_incluye_al_visitante(self):
+        visita = Visita.objects.get(pk=self.visita.pk)
+        with self.captureOnCommitCallbacks(execute=True):
+            visita.salida = timezone.now()
+            visita.save()
+
+        self.assertEqual(
+            list(Bitacora.objects.values_list('accion', 'detalles')),
+            [('Registro de Salida', 'Se registró salida de Ana Pérez (V-1)')],
+        )
+
+
+class ContadorAccesoTests(TestCase):
+    def setUp(self):
+        self.hora = timezone.now().replace(minute=0, second=0, microsecond=0)
+
+    def _sumar(self, minuto):
+        acceso = self.hora + datetime.timedelta(minutes=minuto)
+        ContadorAcceso.sumar(None, 'Acceso al dashboard', '127.0.0.1', self.hora, 1, acceso, acceso)
+
+    def test_volcado_atrasado_no_retrocede_el_ultimo_acceso(self):
+        self._sumar(30)
+        self._sumar(10)
+
+        contador = ContadorAcceso.objects.get()
+        self.assertEqual(contador.total, 2)
+        self.assertEqual(contador.ultimo_acceso, self.hora + datetime.timedelta(minutes=30))
+
+    def test_contador_sin_usuario_no_se_duplica(self):
+        self._sumar(0)
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            ContadorAcceso.objects.create(
+                accion='Acceso al dashboard', ip_origen='127.0.0.1', hora=self.hora,
+                total=1, primer_acceso=self.hora, ultimo_acceso=self.hora,
+            )
+
+# ==========================================
+# PAGINACIÓN POR CURSOR
+# ==========================================
+
+class PaginacionKeysetTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        Bitacora.objects.bulk_create(
+            Bitacora(accion=f'A{i}', detalles='', ip_origen='127.0.0.1') for i in range(5)
+        )
+
+    def _pagina(self, **cursores):
+        return paginar_keyset(Bitacora.objects.all(), ['fecha_hora', 'id'], tamano=2, **cursores)
+
+    def test_cursor_valido_avanza(self):
+        primera = self._pagina()
+        segunda = self._pagina(despues=primera.cursor_siguiente)
+        self.assertTrue(segunda.has_previous)
+        self.assertTrue(set(segunda.objetos).isdisjoint(primera.objetos))
+
+    def test_cursor_alterado_devuelve_la_primera_pagina(self):
+        primera = [bitacora.pk for bitacora in self._pagina()]
+        alterados = [
+            'no-es-base64!',
+            codificar_cursor({'fecha_hora': 1}),
+            codificar_cursor(['2026-01-01T00:00:00+00:00']),
+            codificar_cursor(['2026-01-01T00:00:00+00:00', 1, 2]),
+            codificar_cursor(['2026-01-01T00:00:00+00:00', 'abc']),
+            codificar_cursor(['2026-13-45T00:00:00+00:00', 1]),
+            codificar_cursor(['no es fecha', 1]),
+            codificar_cursor([None, 1]),
+            codificar_cursor([['2026-01-01T00:00:00+00:00'], 1]),
+        ]
+        for cursor in alterados:
+            for nombre in ('despues', 'antes'):
+                with self.subTest(cursor=cursor, nombre=nombre):
+                    pagina = self._pagina(**{nombre: cursor})
+                    self.assertEqual([bitacora.pk for bitacora in pagina], primera)
+                    self.assertFalse(pagina.has_previous)
+
+    def test_busqueda_de_bitacora_pagina_por_fecha(self):
+        Bitacora.objects.bulk_create(
+            Bitacora(accion='Búsqueda', detalles=f'cédula V-{i}', ip_origen='127.0.0.1') for i in range(5)
+        )
+        queryset, filtros = auditoria.filtrar_bitacora(QueryDict('q=cédula'))
+        self.assertEqual(filtros, {'q': 'cédula'})
+
+        vistos, cursor = [], None
+        while True:
+            pagina = paginar_keyset(queryset, ['fecha_hora', 'id'], tamano=2, despues=cursor)
+            vistos += [bitacora.detalles for bitacora in pagina]
+            if not pagina.has_next:
+                break
+            cursor = pagina.cursor_siguiente
+        self.assertEqual(sorted(vistos), [f'cédula V-{i}' for i in range(5)])
+
+    def test_nulos_al_final_recorre_ambos_tramos_en_los_dos_sentidos(self):
+        ahora = timezone.now()
+        for i in range(3):
+            visitante = Visitante.objects.create(cedula=f'V-{i}', nombre_completo=f'Con visitas {i}')
+            Visita.objects.create(visitante=visitante, motivo='Reunión', a_quien_visita='Sistemas', salida=ahora)
+        for i in range(3):
+            Visitante.objects.create(cedula=f'S-{i}', nombre_completo=f'Sin visitas {i}')
+        esperado = [
+            visitante.pk for visitante in Visitante.objects.order_by(
+                F('ultima_entrada').desc(nulls_last=True), '-id',
+            )
+        ]
+
+        paginas, cursor = [], None
+        while True:
+            pagina = paginar_keyset(
+                Visitante.objects.all(), ['ultima_entrada', 'id'], tamano=2, despues=cursor, nulos_al_final=True,
+            )
+            paginas.append(pagina)
+            if not pagina.has_next:
+                break
+            cursor = pagina.cursor_siguiente
+        self.assertEqual([visitante.pk for pagina in paginas for visitante in pagina], esperado)
+
+        for anterior, pagina in zip(paginas, paginas[1:]):
+            atras = paginar_keyset(
+                Visitante.objects.all(), ['ultima_entrada', 'id'], tamano=2,
+                antes=pagina.cursor_anterior, nulos_al_final=True,
+            )
+            self.assertEqual(list(atras), list(anterior))
+
+# ==========================================
+# AUTOCOMPLETADO POR CÉDULA
+# ==========================================
+
+class BusquedaCedulaTests(TestCase):
+    def setUp(self):
+        busqueda._buscar.cache_clear()
+        self.visitante = Visitante.objects.create(cedula='V-123', nombre_completo='Ana Pérez', estatus='natural')
+
+    def test_ingreso_abierto_no_queda_en_el_lru(self):
+        self.assertIsNone(busqueda.buscar_por_cedula('V-12')[0]['visita_abierta'])
+
+        visita = Visita.objects.create(visitante=self.visitante, motivo='Reunión', a_quien_visita='Sistemas')
+        self.assertEqual(busqueda.buscar_por_cedula('V-12')[0]['visita_abierta']['id'], visita.pk)
+
+        visita.salida = timezone.now()
+        visita.save()
+        self.assertIsNone(busqueda.buscar_por_cedula('V-12')[0]['visita_abierta'])
+
+    def test_cambio_del_visitante_vacia_el_lru_al_confirmar(self):
+        busqueda.buscar_por_cedula('V-12')
+        with self.captureOnCommitCallbacks(execute=True):
+            Visitante.guardar_por_cedula('V-123', nombre_completo='Ana María Pérez')
+            busqueda.vaciar_busqueda(Visitante)
+
+        self.assertEqual(busqueda.buscar_por_cedula('V-12')[0]['nombre_completo'], 'Ana María Pérez')
+
+    @mock.patch.object(auditoria, 'ASINCRONA', False)
+    def test_edicion_guarda_la_cedula_normalizada(self):
+        self.client.force_login(User.objects.create_user('vigilante', password='x'))
+        datos = {
+            'cedula': ' v- 456', 'nombre_completo': 'Ana Pérez', 'telefono': '',
+            'motivo': 'Reunión', 'a_quien_visita': 'Sistemas', 'observaciones': '',
+        }
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(reverse('visitor_edit', args=[self.visitante.pk]), datos)
+
+        self.assertEqual(Visitante.objects.get(pk=self.visitante.pk).cedula, 'V-456')
+        self.assertEqual(busqueda.buscar_por_cedula('v-45')[0]['id'], self.visitante.pk)
+
+    def test_migracion_normaliza_las_cedulas_y_se_detiene_si_chocan(self):
+        migracion = importlib.import_module('visitas.migrations.0025_normalizar_cedulas')
+        otro = Visitante.objects.create(cedula='e- 77 ', nombre_completo='Luis Rojas')
+        repetido = Visitante.objects.create(cedula='v-123', nombre_completo='Ana Pérez')
+
+        with self.assertRaisesMessage(RuntimeError, f"V-123: ids {self.visitante.pk}, {repetido.pk}"):
+            migracion.normalizar_cedulas(apps, None)
+        self.assertEqual(Visitante.objects.get(pk=otro.pk).cedula, 'e- 77 ')
+
+        repetido.delete()
+        migracion.normalizar_cedulas(apps, None)
+        self.assertEqual(Visitante.objects.get(pk=otro.pk).cedula, 'E-77')
+
+# ==========================================
+# RESUMEN DEL DIRECTORIO EN EL VISITANTE
+# ==========================================
+
+class ResumenVisitanteTests(TestCase):
+    def setUp(self):
+        self.visitante = Visitante.objects.create(cedula='V-9', nombre_completo='Ana Pérez')
+
+    def test_instancia_vieja_no_pisa_el_resumen(self):
+        vieja = Visitante.objects.get(pk=self.visitante.pk)
+        Visita.objects.create(visitante=self.visitante, motivo='Reunión', a_quien_visita='Sistemas')
+
+        vieja.telefono = '0412-0000000'
+        vieja.save()
+
+        self.visitante.refresh_from_db()
+        self.assertEqual(self.visitante.total_visitas, 1)
+        self.assertIsNotNone(self.visitante.ultima_entrada)
+        self.assertEqual(self.visitante.telefono, '0412-0000000')
+
+    def test_visita_con_solo_el_id_toma_el_estatus_sin_cargar_el_visitante(self):
+        Visitante.objects.filter(pk=self.visitante.pk).update(estatus='empleado')
+        visita = Visita(visitante_id=self.visitante.pk, motivo='Reunión', a_quien_visita='Sistemas')
+
+        # Dentro de un evento() la bitácora tampoco necesita al visitante
+        with auditoria.evento(None, 'Registro de Visitante', 'Ingreso', '127.0.0.1'):
+            visita.save()
+
+        self.assertFalse(Visita.visitante.is_cached(visita))
+        self.assertEqual(Visita.objects.get(pk=visita.pk).estatus, 'empleado')
+
+    def test_guardar_una_fila_borrada_la_vuelve_a_insertar(self):
+        Visitante.objects.filter(pk=self.visitante.pk).delete()
+
+        self.visitante.nombre_completo = 'Ana María Pérez'
+        self.visitante.save()
+
+        self.assertEqual(Visitante.objects.get(pk=self.visitante.pk).nombre_normalizado, 'ana maria perez')
+
+# ==========================================
+# REGISTRO DE INGRESO (CHECK-IN)
+# ==========================================
+
+@mock.patch.object(auditoria, 'ASINCRONA', False)
+class RegistroIngresoTests(TestCase):
+    DATOS = {
+        'cedula': 'v- 123', 'nombre_completo': 'Ana Pérez', 'estatus': 'natural', 'correo': '',
+        'telefono': '', 'motivo': 'Reunión', 'a_quien_visita': 'Sistemas', 'observaciones': '',
+    }
+
+    def setUp(self):
+        self.usuario = User.objects.create_user('vigilante', password='x')
+        self.client.force_login(self.usuario)
+
+    def _registrar(self, **extra):
+        with self.captureOnCommitCallbacks(execute=True):
+            return self.client.post(reverse('visitor_create'), {**self.DATOS, **extra})
+
+    def _medios(self):
+        """MEDIA_ROOT temporal; devuelve una función que lista los archivos guardados en él."""
+        directorio = tempfile.TemporaryDirectory()
+        self.addCleanup(directorio.cleanup)
+        medios = override_settings(MEDIA_ROOT=directorio.name)
+        medios.enable()
+        self.addCleanup(medios.disable)
+        return lambda: glob.glob(os.path.join(directorio.name, '**', '*.*'), recursive=True)
+
+    def _foto(self):
+        contenido = io.BytesIO()
+        Image.new('RGB', (8, 8)).save(contenido, 'PNG')
+        return SimpleUploadedFile('foto.png', contenido.getvalue(), content_type='image/png')
+
+    def test_ingreso_en_consultas_fijas(self):
+        # Con el reloj fijo, otro ingreso deja creado el resumen de esta hora
+        with mock.patch('django.utils.timezone.now', return_value=timezone.now()):
+            Visita.objects.create(
+                visitante=Visitante.objects.create(cedula='V-1', nombre_completo='Otro visitante'),
+                motivo='Reunión', a_quien_visita='Sistemas',
+            )
+            # Sesión y usuario, upsert del visitante, la visita, sus dos resúmenes y
+            # una fila de bitácora (más el SAVEPOINT/RELEASE de la transacción)
+            with self.assertNumQueries(9):
+                respuesta = self._registrar()
+
+        self.assertRedirects(respuesta, reverse('visitor_records'), fetch_redirect_response=False)
+        visita = Visita.objects.select_related('visitante').get(visitante__cedula='V-123')
+        self.assertEqual(visita.estatus, 'natural')
+        self.assertEqual(Bitacora.objects.filter(accion='Registro de Visitante').count(), 1)
+
+    def test_segundo_ingreso_del_dia_muestra_el_duplicado(self):
+        self._registrar()
+
+        respuesta = self._registrar()
+
+        self.assertEqual(respuesta.status_code, 200)
+        self.assertContains(respuesta, 'La cédula V-123 ya tiene un ingreso abierto hoy.')
+        self.assertEqual(Visita.objects.count(), 1)
+        self.assertEqual(Bitacora.objects.filter(accion='Registro de Visitante').count(), 1)
+
+    def test_ingreso_despues_de_la_salida(self):
+        self._registrar()
+        Visita.objects.update(salida=timezone.now())
+
+        respuesta = self._registrar()
+
+        self.assertEqual(respuesta.status_code, 302)
+        self.assertEqual(Visita.objects.count(), 2)
+        self.assertEqual(Visita.objects.filter(salida__isnull=True).count(), 1)
+        self.assertEqual(Visitante.objects.get().total_visitas, 2)
+
+    def test_duplicado_no_deja_la_foto_subida(self):
+        archivos = self._medios()
+        self._registrar()
+
+        respuesta = self._registrar(foto=self._foto())
+
+        self.assertEqual(respuesta.status_code, 200)
+        self.assertEqual(archivos(), [])
+
+    def test_otro_error_de_integridad_tampoco_deja_la_foto(self):
+        archivos = self._medios()
+        Visitante.objects.create(cedula='V-999', nombre_completo='Luis Rojas')
+        visitante = Visitante.objects.create(cedula='V-123', nombre_completo='Ana Pérez')
+
+        # La cédula de otro visitante choca con la restricción única, no con el ingreso abierto
+        with self.assertRaises(IntegrityError):
+            self.client.post(
+                reverse('visitor_edit', args=[visitante.pk]), {**self.DATOS, 'cedula': 'V-999', 'foto': self._foto()},
+            )
+
+        self.assertEqual(archivos(), [])
+        self.assertFalse(Visita.objects.exists())
+
+# ==========================================
+# REGISTRO DE GRUPOS Y DELEGACIONES
+# ==========================================
+
+@mock.patch.object(auditoria, 'ASINCRONA', False)
+class RegistroGrupoTests(TestCase):
+    def _errores(self, filas):
+        with self.assertRaises(GrupoInvalido) as contexto:
+            registrar_grupo(filas, 'Reunión', 'Sistemas')
+        return contexto.exception.errores
+
+    def test_lista_con_cualquier_separador_y_encabezado(self):
+        for separador in (',', ';', '\t'):
+            with self.subTest(separador=separador):
+                texto = '\n'.join(separador.join(celdas) for celdas in (
+                    ('Cédula', 'Nombre completo', 'Teléfono'),
+                    ('v- 1', 'Ana Pérez', '0412-0000000'),
+                    ('', '', ''),
+                    ('V-2', 'Luis Rojas', ''),
+                ))
+                self.assertEqual(leer_lista(texto), [
+                    {'linea': 2, 'cedula': 'V-1', 'nombre_completo': 'Ana Pérez', 'telefono': '0412-0000000'},
+                    {'linea': 4, 'cedula': 'V-2', 'nombre_completo': 'Luis Rojas', 'telefono': ''},
+                ])
+
+    def test_archivo_de_excel_en_latin1(self):
+        archivo = io.BytesIO('V-1;José Peña\r\nV-2;Inés Suárez\r\n'.encode('latin-1'))
+
+        filas = leer_archivo(archivo)
+
+        self.assertEqual([fila['nombre_completo'] for fila in filas], ['José Peña', 'Inés Suárez'])
+
+    def test_errores_por_linea(self):
+        filas = leer_lista('V-1,Ana Pérez\nV-2,\nv-1,Ana Pérez\n,Luis Rojas')
+
+        self.assertEqual(self._errores(filas), [
+            (1, "La cédula V-1 aparece más de una vez en la lista."),
+            (2, "Falta el nombre completo."),
+            (3, "La cédula V-1 aparece más de una vez en la lista."),
+            (4, "Falta la cédula."),
+        ])
+
+    def test_denegados_y_con_ingreso_abierto_no_registran_a_nadie(self):
+        Visitante.objects.create(cedula='V-1', nombre_completo='Ana Pérez', estatus='denegado')
+        abierto = Visitante.objects.create(cedula='V-2', nombre_completo='Luis Rojas')
+        Visita.objects.create(visitante=abierto, motivo='Reunión', a_quien_visita='Sistemas')
+
+        errores = self._errores(leer_lista('V-1,Ana Pérez\nV-2,Luis Rojas\nV-3,Inés Suárez'))
+
+        self.assertEqual(errores, [
+            (1, "La cédula V-1 tiene el acceso denegado."),
+            (2, "La cédula V-2 ya tiene un ingreso abierto hoy."),
+        ])
+        self.assertEqual(Visita.objects.count(), 1)
+        self.assertFalse(Visitante.objects.filter(cedula='V-3').exists())
+
+    def test_grupo_suma_los_resumenes(self):
+        conocido = Visitante.objects.create(cedula='V-1', nombre_completo='Ana Pérez', estatus='empleado')
+        Visitante.objects.filter(pk=conocido.pk).update(total_visitas=3)
+        ahora = timezone.now()
+
+        with mock.patch('django.utils.timezone.now', return_value=ahora):
+            visitas = registrar_grupo(leer_lista('V-1,Ana Pérez\nV-2,Luis Rojas\nV-3,Inés Suárez'), 'Reunión', 'Sistemas')
+
+        self.assertEqual([visita.estatus for visita in visitas], ['empleado', 'natural', 'natural'])
+        self.assertEqual(
+            dict(ResumenVisitas.objects.values('estatus').annotate(total=Sum('entradas')).values_list('estatus', 'total')),
+            {'empleado': 1, 'natural': 2},
+        )
+        self.assertEqual(
+            dict(Visitante.objects.values_list('cedula', 'total_visitas')), {'V-1': 4, 'V-2': 1, 'V-3': 1},
+        )
+        self.assertEqual(Visitante.objects.get(cedula='V-2').ultima_entrada, ahora)
+
+# ==========================================
+# RESPALDO Y RESTAURACIÓN
+# ==========================================
+
+@mock.patch.object(auditoria, 'ASINCRONA', False)
+class RespaldoTests(TestCase):
+    def setUp(self):
+        directorio = tempfile.TemporaryDirectory()
+        self.addCleanup(directorio.cleanup)
+        self.directorio = directorio.name
+        medios = override_settings(MEDIA_ROOT=os.path.join(directorio.name, 'media'))
+        medios.enable()
+        self.addCleanup(medios.disable)
+
+        self.foto = default_storage.save('visitantes/ana.jpg', ContentFile(b'foto de ana'))
+        self.visitante = Visitante.objects.create(cedula='V-1', nombre_completo='Ana Pérez')
+        # Sin pasar por save(): el contenido no es una imagen y no hay miniaturas que generar
+        Visitante.objects.filter(pk=self.visitante.pk).update(foto=self.foto)
+        Visita.objects.create(visitante=self.visitante, motivo='Reunión', a_quien_visita='Sistemas')
+
+    def _respaldar(self, nombre, anterior=None):
+        """Genera un respaldo y devuelve (ruta, base para el siguiente incremental), como el trabajo 'respaldo'."""
+        ruta = os.path.join(self.directorio, nombre)
+        manifiesto = respaldo.generar_respaldo(ruta, base=anterior)
+        media = set(anterior.get('media', []) if anterior else []) | set(manifiesto['media'].values())
+        return ruta, {'id': manifiesto['id'], 'marca': manifiesto['marca'], 'media': sorted(media)}
+
+    def _renombrar(self, nombre):
+        Visitante.objects.filter(pk=self.visitante.pk).update(nombre_completo=nombre, actualizado=timezone.now())
+
+    def _nombre(self):
+        return Visitante.objects.get(pk=self.visitante.pk).nombre_completo
+
+    def test_restaura_las_filas_y_las_fotos(self):
+        ruta, _ = self._respaldar('completo.tar')
+        Visita.objects.all().delete()
+        Visitante.objects.all().delete()
+        default_storage.delete(self.foto)
+
+        respaldo.restaurar_respaldo(ruta)
+
+        visitante = Visitante.objects.get(cedula='V-1')
+        self.assertEqual(visitante.nombre_completo, 'Ana Pérez')
+        self.assertEqual(visitante.foto.name, self.foto)
+        self.assertEqual(Visita.objects.filter(visitante=visitante).count(), 1)
+        with default_storage.open(self.foto, 'rb') as archivo:
+            self.assertEqual(archivo.read(), b'foto de ana')
+
+    def test_cadena_incremental_se_aplica_en_orden_aunque_llegue_desordenada(self):
+        completo, base = self._respaldar('completo.tar')
+        self._renombrar('Ana María Pérez')
+        primero, base = self._respaldar('incremental_1.tar', base)
+        self._renombrar('Ana María Pérez de Rojas')
+        segundo, _ = self._respaldar('incremental_2.tar', base)
+        self._renombrar('Otro nombre')
+
+        respaldo.restaurar_respaldo([segundo, completo, primero])
+
+        self.assertEqual(self._nombre(), 'Ana María Pérez de Rojas')
+        # La foto la guarda solo el completo: los incrementales la referencian por su hash
+        with tarfile.open(segundo) as tar:
+            self.assertFalse(any(info.name.startswith('media/') for info in tar.getmembers()))
+
+    def test_cadena_con_un_incremental_faltante_no_se_restaura(self):
+        completo, base = self._respaldar('completo.tar')
+        _, base = self._respaldar('incremental_1.tar', base)
+        segundo, _ = self._respaldar('incremental_2.tar', base)
+        self._renombrar('Otro nombre')
+
+        with self.assertRaisesMessage(respaldo.RespaldoInvalido, 'Faltan respaldos intermedios'):
+            respaldo.restaurar_respaldo([completo, segundo])
+
+        self.assertEqual(self._nombre(), 'Otro nombre')
+
+    def test_miembro_que_no_coincide_con_el_manifiesto_no_se_restaura(self):
+        ruta, _ = self._respaldar('completo.tar')
+        # Se reescribe el tar con otra suma para los visitantes en el manifiesto
+        alterado = os.path.join(self.directorio, 'alterado.tar')
+        with tarfile.open(ruta) as original, tarfile.open(alterado, 'w') as copia:
+            for info in original.getmembers():
+                datos = original.extractfile(info).read()
+                if info.name == respaldo.MANIFIESTO:
+                    manifiesto = json.loads(datos)
+                    for entrada in manifiesto['modelos']:
+                        if entrada['modelo'] == 'visitas.Visitante':
+                            entrada['sha256'] = '0' * 64
+                    datos = json.dumps(manifiesto).encode('utf-8')
+                    info.size = len(datos)
+                copia.addfile(info, io.BytesIO(datos))
+        self._renombrar('Otro nombre')
+
+        with self.assertRaisesMessage(respaldo.RespaldoInvalido, 'no coincide con el manifiesto'):
+            respaldo.restaurar_respaldo(alterado)
+
+        self.assertEqual(self._nombre(), 'Otro nombre')
+
+    def test_lote_que_la_base_rechaza_es_un_respaldo_invalido(self):
+        lote = [{'model': 'visitas.visitante', 'pk': 99, 'fields': {'cedula': 'V-1', 'nombre_completo': 'Copia'}}]
+
+        with self.assertRaisesMessage(respaldo.RespaldoInvalido, 'No se pudieron guardar los registros'):
+            with transaction.atomic():
+                respaldo._guardar_lote(lote)
+
+        self.assertFalse(Visitante.objects.filter(pk=99).exists())
+
+    def test_simular_valida_sin_modificar_nada(self):
+        ruta, _ = self._respaldar('completo.tar')
+        self._renombrar('Otro nombre')
+        default_storage.delete(self.foto)
+
+        total = respaldo.restaurar_respaldo(ruta, simular=True)
+
+        self.assertGreater(total, 0)
+        self.assertEqual(self._nombre(), 'Otro nombre')
+        self.assertFalse(default_storage.exists(self.foto))
+
+    def test_incremental_borra_las_filas_eliminadas_despues_de_la_base(self):
+        borrado = Visitante.objects.create(cedula='V-2', nombre_completo='Luis Rojas')
+        completo, base = self._respaldar('completo.tar')
+        borrado.delete()
+        incremental, _ = self._respaldar('incremental.tar', base)
+
+        # El completo solo lo devuelve; con el incremental queda borrado otra vez
+        respaldo.restaurar_respaldo(completo)
+        self.assertTrue(Visitante.objects.filter(cedula='V-2').exists())
+        respaldo.restaurar_respaldo([completo, incremental])
+
+        self.assertFalse(Visitante.objects.filter(cedula='V-2').exists())
+        self.assertTrue(Visitante.objects.filter(cedula='V-1').exists())
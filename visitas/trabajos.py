@@ -0,0 +1,321 @@
+# ==========================================
+# IMPORTACIONES
+# ==========================================
+import datetime
+import logging
+import os
+import socket
+import time
+
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.db import connections, transaction
+from django.utils import timezone
+
+from .auditoria import evento, filtrar_bitacora, registrar_bitacora, vaciar_bitacora
+from .exportacion import FORMATOS, exportar_bitacora, exportar_bitacora_pdf
+from .imagenes import FotoInvalida, describir_foto, generar_miniaturas, guardar_foto
+from .models import Trabajo, Visitante
+from .respaldo import generar_respaldo, generar_respaldo_nativo, restaurar_respaldo
+
+logger = logging.getLogger(__name__)
+
+# ==========================================
+# CONFIGURACIÓN (se puede ajustar en settings.py)
+# ==========================================
+TRABAJOS_DIR = getattr(settings, 'TRABAJOS_DIR', os.path.join(settings.BASE_DIR, 'trabajos'))
+RETENCION_DIAS = getattr(settings, 'TRABAJOS_RETENCION_DIAS', 7)
+MAX_INTENTOS = 3
+LATIDO_VENCIDO = 120  # segundos sin latido para considerar que el runworker murió
+# Tipos que se reintentan solos si fallan (hasta MAX_INTENTOS): sus errores suelen ser pasajeros
+REINTENTABLES = {'procesar_foto'}
+
+
+class TrabajoFallido(Exception):
+    """Error definitivo: el trabajo no se reintenta aunque su tipo esté en REINTENTABLES."""
+
+# ==========================================
+# API PARA LAS VISTAS
+# ==========================================
+
+def encolar(tipo, usuario=None, ip_origen=None, **parametros):
+    """Crea un trabajo pendiente; el runworker lo tomará en cuanto tenga un proceso libre."""
+    return Trabajo.objects.create(
+        tipo=tipo,
+        usuario=usuario if getattr(usuario, 'pk', None) else None,
+        ip_origen=ip_origen,
+        parametros=parametros,
+    )
+
+
+def ruta_entrada(nombre):
+    """Ruta donde las vistas guardan archivos subidos que procesará un trabajo."""
+    directorio = os.path.join(TRABAJOS_DIR, 'entradas')
+    os.makedirs(directorio, exist_ok=True)
+    return os.path.join(directorio, nombre)
+
+# ==========================================
+# API PARA EL RUNWORKER
+# ==========================================
+
+def nombre_trabajador():
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+def tomar_trabajo(trabajador):
+    """
+    Marca como 'en_proceso' el trabajo pendiente más antiguo y lo devuelve.
+    SKIP LOCKED permite varios runworker sin que dos tomen el mismo trabajo.
+    """
+    with transaction.atomic():
+        trabajo = (
+            Trabajo.objects.select_for_update(skip_locked=True)
+            .filter(estado='pendiente')
+            .order_by('creado')
+            .first()
+        )
+        if trabajo is None:
+            return None
+        ahora = timezone.now()
+        trabajo.estado = 'en_proceso'
+        trabajo.trabajador = trabajador
+        trabajo.iniciado = ahora
+        trabajo.latido = ahora
+        trabajo.intentos += 1
+        trabajo.progreso = 0
+        trabajo.save(update_fields=['estado', 'trabajador', 'iniciado', 'latido', 'intentos', 'progreso'])
+    return trabajo
+
+
+def latir(ids):
+    """Actualiza la señal de vida de los trabajos que este runworker está ejecutando."""
+    if ids:
+        Trabajo.objects.filter(pk__in=ids, estado='en_proceso').update(latido=timezone.now())
+
+
+def reencolar(ids, motivo):
+    """Devuelve a 'pendiente' los trabajos interrumpidos (o los marca fallidos tras MAX_INTENTOS)."""
+    for trabajo in Trabajo.objects.filter(pk__in=ids, estado='en_proceso'):
+        if trabajo.intentos >= MAX_INTENTOS:
+            trabajo.estado = 'fallido'
+            trabajo.terminado = timezone.now()
+        else:
+            trabajo.estado = 'pendiente'
+        trabajo.mensaje = motivo[:255]
+        trabajo.save(update_fields=['estado', 'terminado', 'mensaje'])
+
+
+def recuperar_huerfanos():
+    """Reencola los trabajos 'en_proceso' cuyo runworker dejó de latir (reinicio, corte de luz...)."""
+    vencido = timezone.now() - datetime.timedelta(seconds=LATIDO_VENCIDO)
+    ids = list(Trabajo.objects.filter(estado='en_proceso', latido__lt=vencido).values_list('pk', flat=True))
+    reencolar(ids, "Reintentado: el proceso que lo ejecutaba se detuvo")
+    return len(ids)
+
+
+def limpiar_resultados():
+    """Elimina los archivos de resultado más viejos que TRABAJOS_RETENCION_DIAS."""
+    limite = timezone.now() - datetime.timedelta(days=RETENCION_DIAS)
+    viejos = Trabajo.objects.filter(terminado__lt=limite).exclude(archivo="")
+    for trabajo in viejos:
+        try:
+            os.remove(trabajo.archivo)
+        except FileNotFoundError:
+            pass
+    viejos.update(archivo="", mensaje="El archivo expiró")
+
+# ==========================================
+# EJECUCIÓN (dentro de un proceso del pool)
+# ==========================================
+
+def ejecutar_trabajo(trabajo_id):
+    trabajo = Trabajo.objects.select_related('usuario').get(pk=trabajo_id)
+    try:
+        EJECUTORES[trabajo.tipo](trabajo, _informador(trabajo))
+    except Exception as error:
+        logger.exception("Falló el trabajo %s", trabajo_id)
+        if _reintentar(trabajo, error):
+            # Vuelve a la cola; el runworker lo tomará en su próxima vuelta
+            trabajo.estado = 'pendiente'
+            trabajo.mensaje = f"Reintentado: {error}"[:255]
+        else:
+            trabajo.estado = 'fallido'
+            trabajo.mensaje = str(error)[:255]
+    else:
+        trabajo.estado = 'terminado'
+        trabajo.progreso = 100
+    finally:
+        trabajo.terminado = None if trabajo.estado == 'pendiente' else timezone.now()
+        trabajo.save(update_fields=['estado', 'progreso', 'mensaje', 'archivo', 'nombre_archivo', 'resultado', 'terminado'])
+        vaciar_bitacora()
+        connections.close_all()
+
+
+def _reintentar(trabajo, error):
+    return (
+        trabajo.tipo in REINTENTABLES
+        and trabajo.intentos < MAX_INTENTOS
+        and not isinstance(error, TrabajoFallido)
+    )
+
+
+def _informador(trabajo):
+    """Callback progreso(hechos, total) que guarda el porcentaje como máximo una vez por segundo."""
+    ultimo = [0.0, -1]
+
+    def informar(hechos, total):
+        porcentaje = min(99, int(hechos * 100 / total)) if total else 0
+        ahora = time.monotonic()
+        if porcentaje != ultimo[1] and ahora - ultimo[0] >= 1:
+            Trabajo.objects.filter(pk=trabajo.pk).update(progreso=porcentaje)
+            ultimo[:] = [ahora, porcentaje]
+
+    return informar
+
+
+def _archivo_resultado(trabajo, nombre):
+    """Ruta final del resultado; se escribe primero en '.parcial' y se renombra al terminar."""
+    directorio = os.path.join(TRABAJOS_DIR, 'resultados')
+    os.makedirs(directorio, exist_ok=True)
+    trabajo.nombre_archivo = nombre
+    trabajo.archivo = os.path.join(directorio, f"{trabajo.pk}_{nombre}")
+    return trabajo.archivo + '.parcial'
+
+
+def _respaldo(trabajo, informar):
+    nativo = trabajo.parametros.get('formato') == 'nativo'
+    # El incremental continúa la cadena del último respaldo (no nativo) terminado
+    base = None
+    if trabajo.parametros.get('incremental') and not nativo:
+        anterior = (
+            Trabajo.objects.filter(tipo='respaldo', estado='terminado', resultado__has_key='marca')
+            .order_by('-terminado').first()
+        )
+        base = anterior.resultado if anterior else None
+
+    prefijo = 'backup_nativo' if nativo else 'backup_incremental' if base else 'backup_completo'
+    nombre = f"{prefijo}_{timezone.localtime(trabajo.creado):%Y%m%d_%H%M%S}.tar"
+    parcial = _archivo_resultado(trabajo, nombre)
+    inicio = time.monotonic()
+    if nativo:
+        total_modelos, total_registros = generar_respaldo_nativo(parcial, informar)
+    else:
+        manifiesto = generar_respaldo(parcial, informar, base=base)
+        total_modelos = len(manifiesto['modelos'])
+        total_registros = sum(entrada['filas'] for entrada in manifiesto['modelos'])
+        # Hashes de los archivos ya guardados en la cadena: el próximo incremental no los repite
+        media = set(base.get('media', []) if base else []) | set(manifiesto['media'].values())
+        trabajo.resultado = {'id': manifiesto['id'], 'marca': manifiesto['marca'], 'media': sorted(media)}
+    os.replace(parcial, trabajo.archivo)
+
+    segundos = max(time.monotonic() - inicio, 0.001)
+    trabajo.mensaje = f"Tablas: {total_modelos}, Registros: {total_registros} ({total_registros / segundos:,.0f} filas/s)"
+    if base:
+        accion, alcance = "Respaldo Incremental de Base de Datos", "los cambios desde el respaldo anterior"
+    else:
+        accion, alcance = "Respaldo Completo de Base de Datos", "TODA la base de datos"
+    registrar_bitacora(
+        usuario=trabajo.usuario,
+        accion=accion,
+        detalles=f"Se creó respaldo de {alcance}: {nombre}. {trabajo.mensaje}",
+        ip_origen=trabajo.ip_origen,
+    )
+
+
+def _restauracion(trabajo, informar):
+    # 'archivos': respaldo completo más sus incrementales ('archivo' en trabajos anteriores)
+    rutas = trabajo.parametros.get('archivos') or [trabajo.parametros['archivo']]
+    nombre = trabajo.parametros.get('nombre', ', '.join(os.path.basename(ruta) for ruta in rutas))
+    simular = trabajo.parametros.get('simular', False)
+    if simular:
+        accion, detalles = "Validación de Respaldo", f"Se validó el archivo de respaldo: {nombre}"
+    else:
+        accion, detalles = "Restauración de Base de Datos", f"Se restauró la base de datos desde archivo: {nombre}"
+    try:
+        # Toda la restauración = un solo registro en bitácora
+        with evento(trabajo.usuario, accion, detalles, trabajo.ip_origen):
+            total = restaurar_respaldo(rutas, informar, simular=simular)
+    finally:
+        for ruta in rutas:
+            os.remove(ruta)
+    if simular:
+        trabajo.mensaje = f"Respaldo válido: {total} objetos (no se modificó la base de datos)"
+    else:
+        trabajo.mensaje = f"Objetos restaurados: {total}"
+
+
+def _exportar_bitacora(trabajo, informar):
+    formato = trabajo.parametros.get('formato', 'txt')
+    comprimir = trabajo.parametros.get('gzip', False)
+    filtros = trabajo.parametros.get('filtros', {})
+    bitacora_filtrada, _ = filtrar_bitacora(filtros)
+
+    _, extension = FORMATOS[formato]
+    nombre = f"bitacora_completa.{extension}" + ('.gz' if comprimir else '')
+    parcial = _archivo_resultado(trabajo, nombre)
+    with open(parcial, 'wb') as f:
+        for bloque in exportar_bitacora(bitacora_filtrada, formato, comprimir):
+            f.write(bloque)
+    os.replace(parcial, trabajo.archivo)
+
+    registrar_bitacora(
+        usuario=trabajo.usuario,
+        accion=f"Exportación de Bitácora {formato.upper()}",
+        detalles=f"Se exportó la bitácora en {formato.upper()}"
+                 + (f" con filtros {filtros}" if filtros else " completa"),
+        ip_origen=trabajo.ip_origen,
+    )
+
+
+def _exportar_bitacora_pdf(trabajo, informar):
+    filtros = trabajo.parametros.get('filtros', {})
+    bitacora_filtrada, _ = filtrar_bitacora(filtros)
+
+    parcial = _archivo_resultado(trabajo, 'bitacora_completa.pdf')
+    with open(parcial, 'wb') as f:
+        tomos = exportar_bitacora_pdf(bitacora_filtrada, f, progreso=informar)
+    if tomos > 1:
+        # Bitácoras muy grandes salen en varios tomos PDF dentro de un ZIP
+        _archivo_resultado(trabajo, 'bitacora_completa.zip')
+        trabajo.mensaje = f"{tomos} tomos PDF"
+    os.replace(parcial, trabajo.archivo)
+
+    registrar_bitacora(
+        usuario=trabajo.usuario,
+        accion="Exportación de Bitácora PDF",
+        detalles="Se exportó la bitácora en PDF" + (f" con filtros {filtros}" if filtros else " completa"),
+        ip_origen=trabajo.ip_origen,
+    )
+
+
+def _procesar_foto(trabajo, informar):
+    visitante_id = trabajo.parametros['visitante']
+    pendiente = trabajo.parametros['archivo']
+    try:
+        with default_storage.open(pendiente, 'rb') as archivo:
+            nombre, estadisticas = guardar_foto(archivo)
+        generar_miniaturas(nombre)
+    except Exception as error:
+        definitivo = isinstance(error, FotoInvalida)
+        if definitivo or not _reintentar(trabajo, error):
+            # Se conserva la foto anterior (si había) y se descarta la subida
+            Visitante.objects.filter(pk=visitante_id, foto_estado='pendiente').update(
+                foto_estado='fallida', actualizado=timezone.now()
+            )
+            default_storage.delete(pendiente)
+        if definitivo:
+            raise TrabajoFallido(str(error)) from error
+        raise
+
+    Visitante.objects.filter(pk=visitante_id).update(foto=nombre, foto_estado='lista', actualizado=timezone.now())
+    default_storage.delete(pendiente)
+    trabajo.mensaje = describir_foto(estadisticas)
+
+
+EJECUTORES = {
+    'respaldo': _respaldo,
+    'restauracion': _restauracion,
+    'exportar_bitacora': _exportar_bitacora,
+    'exportar_bitacora_pdf': _exportar_bitacora_pdf,
+    'procesar_foto': _procesar_foto,
+}
@@ -19,13 +19,17 @@ urlpatterns = [
     # --- Gestión de Visitantes (Biblioteca) ---
     # Incluye: Foto, Cédula, Nombre, Última Visita y CRUD
     path('visitors/create/', views.visitor_create_view, name='visitor_create'),
+    path('visitors/lookup/', views.visitor_lookup_view, name='visitor_lookup'),
+    path('visitors/group/', views.visitor_group_view, name='visitor_group'),
     path('visitors/edit/<int:pk>', views.visitor_edit_view, name='visitor_edit'),
     path('visitors/delete/<int:pk>', views.visitor_delete_view, name='visitor_delete'),
     path('checked-in/', views.visitor_records_view, name='visitor_records'),
+    path('checked-in/feed/', views.visitor_records_feed_view, name='visitor_records_feed'),
     path('cambiar-password/<int:pk>/', views.change_password, name='change_password'),
 
     # --- Control de Flujo y Logs ---
     path('visitors/', views.visitor_log_view, name='visitor_log'),
+    path('visitors/feed/', views.visitor_log_feed_view, name='visitor_log_feed'),
     path('visitors/exit/<int:pk>', views.registrar_salida, name='registrar_salida'),
     path('visits/', views.visitor_reports_view, name='visitor_reports'),
 
@@ -51,7 +55,12 @@ urlpatterns = [
     path('system/restore/', views.database_restore_view, name='database_restore'),
 
     path('export/pdf/', views.export_log_pdf_view, name='export_log_pdf'),
-    path('export/txt/', views.export_log_txt_view, name='export_log_txt'),
+    path('export/txt/', views.export_log_view, {'formato': 'txt'}, name='export_log_txt'),
+    path('export/log/', views.export_log_view, name='export_log'),
+
+    # --- Trabajos en segundo plano ---
+    path('system/jobs/<int:trabajo_id>/', views.trabajo_estado_view, name='trabajo_estado'),
+    path('system/jobs/<int:trabajo_id>/download/', views.trabajo_descargar_view, name='trabajo_descargar'),
 
 ]
 
@@ -5,14 +5,17 @@
 # 1. Librerías estándar de Python (Las que ya vienen con el lenguaje)
 import datetime
 import json
-from io import BytesIO
+import os
+import uuid
+from urllib.parse import urlencode
 
 # 2. Herramientas del núcleo de Django (HTTP, Base de datos, Atajos)
 from django.shortcuts import get_object_or_404, render, redirect
-from django.http import HttpResponse
+from django.http import FileResponse, JsonResponse
 from django.utils import timezone
-from django.db.models import Q, OuterRef, Subquery
+from django.db import IntegrityError, connection, transaction
 from django.core.paginator import Paginator
+from django.core.files.storage import default_storage
 
 # 3. Seguridad, Usuarios y Mensajes
 from django.contrib import messages, auth
@@ -21,14 +24,17 @@ from django.contrib.auth.hashers import make_password
 from django.contrib.auth.decorators import login_required, user_passes_test
 from django.contrib.admin.views.decorators import staff_member_required
 
-# 4. Librerías de terceros (ReportLab para los PDFs)
-from reportlab.lib.pagesizes import letter
-from reportlab.lib import colors
-from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer
-from reportlab.lib.styles import getSampleStyleSheet
-
-# 5. Importaciones Locales (Lo que tú creaste en tu app)
-from .models import RegistroIntento ,Bitacora, Visitante, Visita, IpPermitida, IpActiva
+# 4. Importaciones Locales (Lo que tú creaste en tu app)
+from .models import RegistroIntento ,Bitacora, Visitante, Visita, IpPermitida, IpActiva, Trabajo
+from .estadisticas import estadisticas_dashboard
+from .auditoria import registrar_bitacora, registrar_acceso, evento, filtrar_bitacora
+from .paginacion import paginar_keyset, conteo_aproximado
+from .busqueda import buscar_por_cedula, buscar_visitas, filtrar_visitantes, normalizar_cedula, vaciar_busqueda
+from .exportacion import FORMATOS
+from .grupos import GrupoInvalido, leer_archivo, leer_lista, registrar_grupo
+from .imagenes import FotoInvalida, recibir_foto
+from .templatetags.miniaturas import miniatura
+from .trabajos import encolar, ruta_entrada
 from django.urls import reverse
 from django.contrib.auth.forms import SetPasswordForm
 from django.contrib.auth.models import User
@@ -58,7 +64,7 @@ def login_view(request):
         # 1. VERIFICAR IP PERMITIDA (Tu lógica original)
         ip_obj = IpPermitida.objects.filter(direccion_ip=client_ip).first()
         if client_ip in BLOCKED_IPS or (ip_obj and not ip_obj.esta_permitida):
-            Bitacora.objects.create(
+            registrar_bitacora(
                 usuario=None, accion="Acceso denegado",
                 detalles=f"IP bloqueada: {client_ip}", ip_origen=client_ip
             )
@@ -90,6 +96,12 @@ def login_view(request):
             
             if sesion_previa:
                 # Si ya hay alguien en este PC, lo mandamos al aviso de seguridad
+                registrar_bitacora(
+                    usuario=user,
+                    accion="Sesión Duplicada Rechazada",
+                    detalles=f"El usuario {user.username} intentó abrir una segunda sesión desde un navegador diferente en la misma IP.",
+                    ip_origen=client_ip
+                )
                 return render(request, "warn.html", {'ip': ip_actual})
 
             # Resetear intentos si entró bien
@@ -101,29 +113,18 @@ def login_view(request):
             auth.login(request, user)
 
             # Marcamos en la base de datos que este dispositivo está OCUPADO
-            IpActiva.objects.update_or_create(
-                ip_address=client_ip,
-                defaults={'is_active': True, 'user_agent': request.META.get('HTTP_USER_AGENT')}
-            )
+            # (un solo registro de bitácora para todo el inicio de sesión)
+            with evento(user, "Inicio de sesión", f"El usuario {user.username} entró al sistema", client_ip):
+                IpActiva.objects.update_or_create(
+                    ip_address=client_ip,
+                    defaults={'is_active': True, 'user_agent': request.META.get('HTTP_USER_AGENT')}
+                )
 
             # REQUISITO: Cambio de contraseña obligatorio primer ingreso
             if registro and registro.debe_cambiar_password:
                 request.session['mostrar_modal_password'] = True
                 messages.info(request, 'Bienvenido. Por seguridad, debes actualizar tu contraseña.')
 
-            Bitacora.objects.create(
-                usuario=user, accion="Inicio de sesión",
-                detalles=f"El usuario {user.username} entró al sistema",
-                ip_origen=client_ip
-            )
-            
-            Bitacora.objects.create(
-                    usuario=user, 
-                    accion="Sesión Duplicada Rechazada",
-                    detalles=f"El usuario {user.username} intentó abrir una segunda sesión desde un navegador diferente en la misma IP.",
-                    ip_origen=client_ip
-                )
-
             return redirect('dashboard')
 
         else:
@@ -145,7 +146,7 @@ def login_view(request):
                 messages.error(request, 'Usuario o contraseña incorrectos')
 
             # Registrar fallo en bitácora
-            Bitacora.objects.create(
+            registrar_bitacora(
                 usuario=None, accion="Fallo de login",
                 detalles=detalles_fallo, ip_origen=client_ip
             )
@@ -156,12 +157,12 @@ def login_view(request):
 def logout_view(request):
     client_ip = get_client_ip(request)
     # IMPORTANTE: Liberamos el dispositivo para que otro pueda entrar
-    IpActiva.objects.filter(ip_address=client_ip).update(is_active=False)
+    IpActiva.objects.filter(ip_address=client_ip).update(is_active=False, actualizado=timezone.now())
     auth.logout(request)
     
     if request.user.is_authenticated:
         # Registrar cierre de sesión
-        Bitacora.objects.create(
+        registrar_bitacora(
             usuario=request.user,
             accion="Cierre de sesión",
             detalles=f"El usuario {request.user.username} cerró sesión",
@@ -177,7 +178,7 @@ def warn_view(request):
     
     if request.user.is_authenticated:
         # Registrar en bitácora usando la IP obtenida
-        Bitacora.objects.create(
+        registrar_bitacora(
             usuario=request.user,
             accion="Cierre de sesión / Advertencia",
             detalles=f"El usuario {request.user.username} salió del sistema. IP: {ip_actual}",
@@ -196,7 +197,7 @@ def warn_view(request):
 @login_required(login_url='warn')
 def dashboard_view(request):
     # Registrar acceso al dashboard
-    Bitacora.objects.create(
+    registrar_acceso(
         usuario=request.user,
         accion="Acceso al Dashboard",
         detalles=f"El usuario {request.user.username} accedió al dashboard principal",
@@ -205,34 +206,13 @@ def dashboard_view(request):
     # Obtener las últimas 5 actividades
     actividades_recientes = Bitacora.objects.order_by('-fecha_hora')[:5]
 
-    # Estadísticas para las tarjetas
-    now = timezone.localtime(timezone.now())
-    today = now.date()
-    visitantes_hoy = Visita.objects.filter(entrada__date=today).count()
-    visitantes_activos = Visita.objects.filter(salida__isnull=True).count()
-
-    # Crecimiento mensual: comparar visitas del mes actual vs mes anterior
-    now = timezone.localtime(timezone.now())
-    first_day_current = now.replace(day=1)
-    last_month_end = first_day_current - datetime.timedelta(days=1)
-    first_day_last = last_month_end.replace(day=1)
-
-    visitas_mes_actual = Visita.objects.filter(entrada__gte=first_day_current).count()
-    visitas_mes_anterior = Visita.objects.filter(entrada__gte=first_day_last, entrada__lt=first_day_current).count()
-    if visitas_mes_anterior > 2:
-        crecimiento_pct = round((visitas_mes_actual - visitas_mes_anterior) / visitas_mes_anterior * 100, 1)
-    else:
-        crecimiento_pct = 100.0 if visitas_mes_actual > 0 else 0.0
-
-    # Datos para gráfico: últimos 7 días
-    labels = []
-    data = []
-    for i in range(6, -1, -1):
-        day = today - datetime.timedelta(days=i)
-        count = Visita.objects.filter(entrada__date=day).count()
-        labels.append(day.strftime('%a'))
-        data.append(count)
-
+    # Estadísticas para las tarjetas y el gráfico (una sola consulta agregada)
+    stats = estadisticas_dashboard()
+    visitantes_hoy = stats['visitantes_hoy']
+    visitantes_activos = stats['visitantes_activos']
+    crecimiento_pct = stats['crecimiento_pct']
+    labels = stats['chart_labels']
+    data = stats['chart_data']
 
     # Calcular porcentajes para barras
     visitantes_pct = min(visitantes_hoy, 100)
@@ -261,7 +241,7 @@ def dashboard_view(request):
 def visitor_create_view(request):
     # Registrar acceso al formulario (Solo cuando entran a ver la página)
     if request.method == 'GET':
-        Bitacora.objects.create(
+        registrar_acceso(
             usuario=request.user,
             accion="Acceso al formulario de visitantes",
             detalles=f"El usuario {request.user.username} accedió al formulario de visitantes",
@@ -270,18 +250,8 @@ def visitor_create_view(request):
 
     # Lógica para guardar cuando le dan al botón "Registrar"
     if request.method == 'POST':
-        # 1. Capturar los datos
-        cedula = request.POST.get('cedula')
-
-        # --- AQUÍ PONES EL AVISO DE ERROR (Validación) ---
-        hoy = timezone.now().date()
-        if Visita.objects.filter(visitante__cedula=cedula, entrada__date=hoy).exists():
-            from django.contrib import messages
-            messages.error(request, f"Información duplicada: La cédula {cedula} ya registró un ingreso hoy.")
-            # Devolvemos a la página sin guardar nada y pasando los datos actuales
-            return render(request, 'visitor_create.html', {'datos': request.POST})
-        # -------------------------------------------------
-
+        # 1. Capturar los datos (la cédula sin espacios y en mayúsculas, como la busca el autocompletado)
+        cedula = normalizar_cedula(request.POST.get('cedula'))
         nombre = request.POST.get('nombre_completo')
         estatus = request.POST.get('estatus')
         correo = request.POST.get('correo')
@@ -291,48 +261,104 @@ def visitor_create_view(request):
         a_quien = request.POST.get('a_quien_visita')
         observaciones = request.POST.get('observaciones')
 
-        # 2. Crear o obtener el Visitante (datos personales)
-        visitante, created = Visitante.objects.get_or_create(
-            cedula=cedula,
-            defaults={
-                'nombre_completo': nombre,
-                'estatus': estatus,
-                'correo': correo,
-                'telefono': telefono,
-                'foto': foto,
-            }
-        )
-
-        # Si no se creó (ya existía), actualizar datos si es necesario
-        if not created:
-            visitante.nombre_completo = nombre
-            visitante.estatus = estatus
-            visitante.correo = correo
-            visitante.telefono = telefono
+        detalles = f"Se registró ingreso de {nombre} (C.I. {cedula})"
+        if foto:
+            # Solo se valida la cabecera; el runworker la reduce y genera las miniaturas
+            try:
+                foto = recibir_foto(foto)
+            except FotoInvalida as error:
+                messages.error(request, str(error))
+                return render(request, 'visitor_create.html', {'datos': request.POST})
+        datos = {'nombre_completo': nombre, 'estatus': estatus, 'correo': correo, 'telefono': telefono}
+        if foto:
+            # Sin foto nueva no se toca el estado de la que ya tenga
+            datos['foto_estado'] = 'pendiente'
+
+        # Todo el ingreso es una sola transacción y UN solo registro en la bitácora.
+        # El duplicado lo detecta la restricción 'visita_abierta_por_dia' al insertar,
+        # no una consulta previa que otro puesto podría adelantar.
+        try:
+            with evento(request.user, "Registro de Visitante", detalles, get_client_ip(request)):
+                with transaction.atomic():
+                    # 2. Crear o actualizar el Visitante (datos personales)
+                    visitante = Visitante.guardar_por_cedula(cedula, **datos)
+
+                    # 3. Crear la Visita (registro de la entrada)
+                    Visita.objects.create(
+                        visitante=visitante,
+                        motivo=motivo,
+                        a_quien_visita=a_quien,
+                        observaciones=observaciones,
+                        entrada=timezone.now()
+                    )
+                    if foto:
+                        encolar('procesar_foto', request.user, get_client_ip(request), visitante=visitante.pk, archivo=foto)
+        except IntegrityError as error:
+            # La transacción se revirtió con el trabajo que iba a procesar la foto
             if foto:
-                visitante.foto = foto
-            visitante.save()
-
-        # 3. Crear la Visita (registro de la entrada)
-        Visita.objects.create(
-            visitante=visitante,
-            motivo=motivo,
-            a_quien_visita=a_quien,
-            observaciones=observaciones,
-            entrada=timezone.now()
-        )
+                default_storage.delete(foto)
+            if not Visita.es_ingreso_duplicado(error):
+                raise
+            messages.error(request, f"Información duplicada: La cédula {cedula} ya tiene un ingreso abierto hoy.")
+            # Devolvemos a la página sin guardar nada y pasando los datos actuales
+            return render(request, 'visitor_create.html', {'datos': request.POST})
 
+        # guardar_por_cedula no envía señales: el autocompletado debe ver los datos nuevos
+        vaciar_busqueda(Visitante)
+        return redirect('visitor_records')
+    # Si no es POST, simplemente renderiza el formulario
+    return render(request, 'visitor_create.html')
+
+@login_required(login_url='warn')
+def visitor_lookup_view(request):
+    """Visitantes cuya cédula empieza por ?cedula= (JSON, para autocompletar el registro)"""
+    return JsonResponse({'resultados': buscar_por_cedula(request.GET.get('cedula'))})
 
-        Bitacora.objects.create(
+#visitor_group.html
+@login_required(login_url='warn')
+def visitor_group_view(request):
+    """Registro de una delegación o grupo: una lista de personas con la misma visita"""
+    if request.method == 'GET':
+        registrar_acceso(
             usuario=request.user,
-            accion="Registro de Visitante",
-            detalles=f"Se registró ingreso de {nombre} (C.I. {cedula})",
+            accion="Acceso al registro de grupos",
+            detalles=f"El usuario {request.user.username} accedió al registro de grupos",
             ip_origen=get_client_ip(request)
         )
-
-        return redirect('visitor_records')
-    # Si no es POST, simplemente renderiza el formulario
-    return render(request, 'visitor_create.html')
+        return render(request, 'visitor_group.html')
+
+    # La lista llega como archivo CSV o pegada en el cuadro de texto
+    archivo = request.FILES.get('archivo')
+    filas = leer_archivo(archivo) if archivo else leer_lista(request.POST.get('personas', ''))
+    motivo = request.POST.get('motivo', '').strip()
+    estatus = request.POST.get('estatus')
+    if estatus not in dict(Visitante.ESTATUS_CHOICES):
+        estatus = 'natural'
+
+    detalles = (
+        f"Se registró el ingreso de un grupo de {len(filas)} personas - Motivo: {motivo} - "
+        f"Cédulas: {', '.join(fila['cedula'] for fila in filas)}"
+    )
+    try:
+        # Todo el grupo es una transacción y UN solo registro en la bitácora
+        with evento(request.user, "Registro de Grupo", detalles, get_client_ip(request)):
+            registrar_grupo(
+                filas,
+                motivo=motivo,
+                a_quien_visita=request.POST.get('a_quien_visita', '').strip(),
+                observaciones=request.POST.get('observaciones', ''),
+                estatus=estatus,
+            )
+    except GrupoInvalido as error:
+        return render(request, 'visitor_group.html', {'datos': request.POST, 'errores': error.errores})
+    except IntegrityError as error:
+        if not Visita.es_ingreso_duplicado(error):
+            raise
+        messages.error(request, "Alguien del grupo acaba de registrar su ingreso desde otro puesto; revise la lista y envíela de nuevo.")
+        return render(request, 'visitor_group.html', {'datos': request.POST})
+
+    # El grupo ya aparece en la lista de personal en sede
+    return redirect('visitor_records')
 
 #visitor_records.html
 @login_required(login_url='warn')
@@ -342,44 +368,46 @@ def visitor_records_view(request):
     (Visitas que no tienen registrada una fecha/hora de salida)
     """
     # 1. Registrar el acceso en la Bitácora
-    Bitacora.objects.create(
+    registrar_acceso(
         usuario=request.user,
         accion="Consulta de Personal en Sede",
         detalles=f"El usuario {request.user.username} consultó la lista de visitas activas",
         ip_origen=get_client_ip(request)
     )
 
-    # 2. Obtener las visitas activas (donde salida es NULL)
-    # Usamos select_related para traer los datos del visitante en una sola consulta (más rápido)
-    visitas_activas = Visita.objects.filter(
-        salida__isnull=True
-    ).select_related('visitante').order_by('-entrada')
+    # 2. Solo la primera tanda de visitas activas; el resto lo pide la plantilla
+    # a visitor_records_feed al hacer scroll (ver _pagina_en_sede)
+    activas = Visita.objects.filter(salida__isnull=True)
 
     # 3. Renderizar el template que ya creamos
     context = {
-        'visitas': visitas_activas,
+        'visitas': _pagina_en_sede(request),
+        'total_activas': activas.count(),
     }
     
     return render(request, 'visitor_records.html', context)
 
+
+@login_required(login_url='warn')
+def visitor_records_feed_view(request):
+    """Siguiente tanda de visitas activas (JSON, para el scroll infinito de Personal en Sede)"""
+    pagina = _pagina_en_sede(request)
+    return JsonResponse({
+        'resultados': [_fila_en_sede(visita) for visita in pagina],
+        'siguiente': pagina.cursor_siguiente,
+    })
+
 def registrar_salida_desde_records(request, visita_id):
     """
     Función rápida para marcar la salida desde la tabla de Visitas Activas
     """
-    visita = get_object_or_404(Visita, pk=visita_id)
+    visita = get_object_or_404(Visita.objects.select_related('visitante'), pk=visita_id)
     nombre = visita.visitante.nombre_completo
     
-    # Marcar la salida con la hora actual
-    visita.salida = timezone.now()
-    visita.save()
-    
-    # Registrar en bitácora
-    Bitacora.objects.create(
-        usuario=request.user,
-        accion="Egreso de Visitante",
-        detalles=f"Se registró la salida de {nombre} desde el panel de control",
-        ip_origen=get_client_ip(request)
-    )
+    # Marcar la salida con la hora actual (un solo registro en bitácora)
+    with evento(request.user, "Egreso de Visitante", f"Se registró la salida de {nombre} desde el panel de control", get_client_ip(request)):
+        visita.salida = timezone.now()
+        visita.save()
     
     messages.success(request, f"Salida confirmada para {nombre}.")
     
@@ -394,7 +422,7 @@ def visitor_edit_view(request, pk):
 
     if request.method == 'GET':
         # Registrar acceso al formulario de edición
-        Bitacora.objects.create(
+        registrar_bitacora(
             usuario=request.user,
             accion="Acceso al Formulario de Edición de Visitante",
             detalles=f"El usuario {request.user.username} accedió al formulario de edición del visitante {visitante.nombre_completo} ({visitante.cedula})",
@@ -404,31 +432,44 @@ def visitor_edit_view(request, pk):
     if request.method == 'POST':
         # --- PARTE A: Actualizar datos personales ---
         visitante.nombre_completo = request.POST.get('nombre_completo')
-        visitante.cedula = request.POST.get('cedula')
+        visitante.cedula = normalizar_cedula(request.POST.get('cedula'))
         visitante.telefono = request.POST.get('telefono')
 
-        # Si subió una foto nueva, la guardamos
+        detalles = f"Se editó al visitante {visitante.nombre_completo} ({visitante.cedula}) y se registró nueva visita"
+        # Si subió una foto nueva, la procesa el runworker (mientras tanto se muestra el avatar)
+        foto = None
         if 'foto' in request.FILES:
-            visitante.foto = request.FILES['foto']
-
-        visitante.save() # Guardamos los cambios en la base de datos
-
-        # --- PARTE B: Registrar la nueva visita ---
-        Visita.objects.create(
-            visitante=visitante,
-            motivo=request.POST.get('motivo'),
-            a_quien_visita=request.POST.get('a_quien_visita'),
-            observaciones=request.POST.get('observaciones'),
-            entrada=timezone.now() # Fecha y hora actual
-        )
+            try:
+                foto = recibir_foto(request.FILES['foto'])
+            except FotoInvalida as error:
+                messages.error(request, str(error))
+                return redirect('visitor_edit', pk=visitante.pk)
+            visitante.foto_estado = 'pendiente'
 
-        # Registrar la edición y nueva visita
-        Bitacora.objects.create(
-            usuario=request.user,
-            accion="Edición de Visitante y Nueva Visita",
-            detalles=f"Se editó al visitante {visitante.nombre_completo} ({visitante.cedula}) y se registró nueva visita",
-            ip_origen=get_client_ip(request)
-        )
+        # Registrar la edición y nueva visita (una transacción, un solo registro en bitácora)
+        try:
+            with evento(request.user, "Edición de Visitante y Nueva Visita", detalles, get_client_ip(request)):
+                with transaction.atomic():
+                    visitante.save() # Guardamos los cambios en la base de datos
+
+                    # --- PARTE B: Registrar la nueva visita ---
+                    Visita.objects.create(
+                        visitante=visitante,
+                        motivo=request.POST.get('motivo'),
+                        a_quien_visita=request.POST.get('a_quien_visita'),
+                        observaciones=request.POST.get('observaciones'),
+                        entrada=timezone.now() # Fecha y hora actual
+                    )
+                    if foto:
+                        encolar('procesar_foto', request.user, get_client_ip(request), visitante=visitante.pk, archivo=foto)
+        except IntegrityError as error:
+            # La transacción se revirtió con el trabajo que iba a procesar la foto
+            if foto:
+                default_storage.delete(foto)
+            if not Visita.es_ingreso_duplicado(error):
+                raise
+            messages.error(request, f"{visitante.nombre_completo} ya tiene un ingreso abierto hoy; registre su salida antes de un nuevo ingreso.")
+            return redirect('visitor_edit', pk=pk)
 
         return redirect('visitor_records') # Volvemos a la biblioteca al terminar
 
@@ -442,8 +483,8 @@ def visitor_edit_view(request, pk):
 
 # Nueva función para registrar la salida rápido
 def registrar_salida(request, pk):  # Cambiado a 'pk' para que coincida con la URL
-    # Buscamos la visita usando el pk que viene de la URL
-    visita = get_object_or_404(Visita, pk=pk) 
+    # Buscamos la visita usando el pk que viene de la URL (con su visitante para la bitácora)
+    visita = get_object_or_404(Visita.objects.select_related('visitante'), pk=pk)
     
     visita.salida = timezone.now()
     visita.save()
@@ -457,18 +498,11 @@ def visitor_delete_view(request, pk):
     visitante = get_object_or_404(Visitante, pk=pk)
     nombre = visitante.nombre_completo
     
-    # 1. Registrar la eliminación en la bitácora antes de borrarlo
-    Bitacora.objects.create(
-        usuario=request.user,
-        accion="Eliminación de registro",
-        detalles=f"Se eliminó permanentemente a {nombre} del directorio.",
-        ip_origen=get_client_ip(request)
-    )
-    
-    # 2. Eliminar de la base de datos
-    visitante.delete()
+    # 1. Eliminar de la base de datos (visitante y su historial = un solo registro en bitácora)
+    with evento(request.user, "Eliminación de registro", f"Se eliminó permanentemente a {nombre} del directorio.", get_client_ip(request)):
+        visitante.delete()
     
-    # 3. Enviar aviso de éxito y volver al directorio
+    # 2. Enviar aviso de éxito y volver al directorio
     from django.contrib import messages
     messages.success(request, f"El registro de {nombre} ha sido eliminado correctamente.")
     return redirect('visitor_log') # Asegúrate que 'directory' sea el nombre de tu url
@@ -476,26 +510,12 @@ def visitor_delete_view(request, pk):
 #visitor_log.html
 @login_required(login_url='warn')
 def visitor_log_view(request):
-    # 1. Definimos la subconsulta para obtener la fecha y hora de la última entrada de la tabla Visita
-    ultima_entrada_qs = Visita.objects.filter(
-        visitante=OuterRef('pk')
-    ).order_by('-entrada').values('entrada')[:1]
-
-    # 2. Definimos la subconsulta para obtener la fecha y hora de la última salida de la tabla Visita
-    ultima_salida_qs = Visita.objects.filter(
-        visitante=OuterRef('pk'),
-        salida__isnull=False
-    ).order_by('-salida').values('salida')[:1]
-
-    # 3. Obtenemos los visitantes y les "anotamos" la fecha de su última entrada y salida
-    # para poder ordenar por ella sin que de error.
-    visitantes = Visitante.objects.annotate(
-        ultima_entrada_fecha=Subquery(ultima_entrada_qs),
-        ultima_salida_fecha=Subquery(ultima_salida_qs)
-    ).order_by('-ultima_entrada_fecha')
-
-    # 4. Registrar acceso al directorio (Tu lógica de bitácora se mantiene igual)
-    Bitacora.objects.create(
+    # 1. Primera tanda de tarjetas; las siguientes llegan por visitor_log_feed al hacer scroll
+    search = request.GET.get('search', '').strip()
+    pagina = _pagina_directorio(request, search)
+
+    # 2. Registrar acceso al directorio (Tu lógica de bitácora se mantiene igual)
+    registrar_acceso(
         usuario=request.user,
         accion="Acceso al Directorio de Visitantes",
         detalles=f"El usuario {request.user.username} accedió al directorio de visitantes",
@@ -503,15 +523,90 @@ def visitor_log_view(request):
     )
 
     context = {
-        'visitantes': visitantes
+        'visitantes': pagina,
+        'search': search,
+        'filtros_url': urlencode({'search': search} if search else {}),
     }
     return render(request, 'visitor_log.html', context)
 
+
+@login_required(login_url='warn')
+def visitor_log_feed_view(request):
+    """Siguiente tanda del directorio (JSON, para el scroll infinito)"""
+    pagina = _pagina_directorio(request, request.GET.get('search', '').strip())
+    return JsonResponse({
+        'resultados': [_tarjeta_directorio(visitante) for visitante in pagina],
+        'siguiente': pagina.cursor_siguiente,
+    })
+
+# ==========================================
+# TANDAS DEL DIRECTORIO Y DE PERSONAL EN SEDE
+# ==========================================
+# La página se renderiza con la primera tanda y el navegador pide las
+# siguientes en JSON con el cursor 'despues'. Ambas listas van por cursor
+# sobre un índice, así que cada tanda cuesta lo mismo sin importar el total.
+
+DIRECTORIO_POR_TANDA = 24
+EN_SEDE_POR_TANDA = 30
+
+
+def _pagina_directorio(request, search):
+    # El visitante más reciente primero y al final los que aún no tienen visitas. La
+    # última entrada/salida ya está en el propio visitante (la mantienen las señales de Visita)
+    visitantes = Visitante.objects.all()
+    if search:
+        visitantes = filtrar_visitantes(visitantes, search)
+    return paginar_keyset(
+        visitantes, ['ultima_entrada', 'id'], tamano=DIRECTORIO_POR_TANDA,
+        despues=request.GET.get('despues'), antes=request.GET.get('antes'), nulos_al_final=True,
+    )
+
+
+def _pagina_en_sede(request):
+    # Índice parcial visita_abierta_entrada_idx: solo contiene las visitas sin salida
+    activas = Visita.objects.filter(salida__isnull=True).select_related('visitante')
+    return paginar_keyset(activas, ['entrada', 'id'], tamano=EN_SEDE_POR_TANDA, despues=request.GET.get('despues'))
+
+
+def _tarjeta_directorio(visitante):
+    """Solo lo que muestra una tarjeta de visitor_log.html."""
+    return {
+        'id': visitante.pk,
+        'nombre_completo': visitante.nombre_completo,
+        'cedula': visitante.cedula,
+        'telefono': visitante.telefono,
+        'estatus': visitante.estatus,
+        'estatus_display': visitante.get_estatus_display(),
+        'foto': miniatura(visitante.foto_visible, 300) or None,
+        'ultima_salida': timezone.localtime(visitante.ultima_salida).strftime('%d/%m/%Y') if visitante.ultima_salida else None,
+        'sin_visitas': visitante.ultima_entrada is None,
+        'editar': reverse('visitor_edit', args=[visitante.pk]),
+        'eliminar': reverse('visitor_delete', args=[visitante.pk]),
+    }
+
+
+def _fila_en_sede(visita):
+    """Solo lo que muestra una fila de visitor_records.html."""
+    visitante = visita.visitante
+    entrada = timezone.localtime(visita.entrada)
+    return {
+        'id': visita.pk,
+        'nombre_completo': visitante.nombre_completo,
+        'cedula': visitante.cedula,
+        'estatus_display': visitante.get_estatus_display(),
+        'foto': miniatura(visitante.foto_visible, 45) or None,
+        'hora': entrada.strftime('%H:%M'),
+        'fecha': entrada.strftime('%d/%m/%Y'),
+        'motivo': visita.motivo,
+        'a_quien_visita': visita.a_quien_visita,
+        'editar': reverse('visitor_edit', args=[visitante.pk]),
+    }
+
 #visitor_reports.html
 @login_required(login_url='warn')
 def visitor_reports_view(request):
     # Registrar acceso a reportes
-    Bitacora.objects.create(
+    registrar_acceso(
         usuario=request.user,
         accion="Acceso a Reportes de Visitas",
         detalles=f"El usuario {request.user.username} accedió a los reportes de visitas",
@@ -530,12 +625,10 @@ def visitor_reports_view(request):
     if fecha_fin:
         queryset = queryset.filter(entrada__date__lte=fecha_fin)
 
-    # Filtro de búsqueda por nombre o cédula
-    search = request.GET.get('search')
+    # Filtro de búsqueda por nombre o cédula: las más parecidas primero
+    search = request.GET.get('search', '').strip()
     if search:
-        queryset = queryset.filter(
-            Q(visitante__nombre_completo__icontains=search) | Q(visitante__cedula__icontains=search)
-        )
+        queryset = buscar_visitas(queryset, search).order_by('-rango', '-entrada')
 
     # Paginación: 10 registros por página
     paginator = Paginator(queryset, 10)
@@ -578,19 +671,21 @@ def get_client_ip(request):
 @user_passes_test(es_administrador, login_url='warn')
 def settings_log_view (request):
     # Lógica para la vista de configuración administrativa
-    Bitacora.objects.create(
+    registrar_acceso(
         usuario=request.user,
         accion="Acceso a Configuración Administrativa",
         detalles=f"El usuario {request.user.username} accedió a la configuración administrativa",
         ip_origen=get_client_ip(request)
     )
-    # Obtener todos los registros de la bitácora ordenados por fecha descendente
-    bitacora_completa = Bitacora.objects.all().order_by('-fecha_hora')
-
-    # Paginación: 100 registros por página
-    paginator = Paginator(bitacora_completa, 50)
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
+    # Registros de la bitácora filtrados, del más reciente al más antiguo
+    bitacora_filtrada, filtros = filtrar_bitacora(request.GET)
+
+    # Paginación por cursor: 50 registros por página, sin OFFSET ni COUNT(*).
+    # La búsqueda de texto solo filtra; el orden es siempre el de los índices
+    pagina = paginar_keyset(
+        bitacora_filtrada, ['fecha_hora', 'id'], tamano=50,
+        despues=request.GET.get('despues'), antes=request.GET.get('antes'),
+    )
 
     # Obtener las IPs para el control de acceso
     ips = IpPermitida.objects.all().order_by('-id')
@@ -599,9 +694,20 @@ def settings_log_view (request):
     ips_activas = IpActiva.objects.filter(is_active=True).order_by('-last_seen')
 
     context = {
-        'bitacora_completa': page_obj,
+        'bitacora_completa': pagina,
+        'total_aproximado': conteo_aproximado(bitacora_filtrada),
+        'filtros': filtros,
+        'filtros_url': urlencode(filtros),
+        'usuarios': User.objects.order_by('username').only('id', 'username'),
+        # Acciones recientes para sugerir en el filtro (lee pocas filas del índice de fecha)
+        'acciones_recientes': sorted({
+            accion for accion in Bitacora.objects.order_by('-fecha_hora').values_list('accion', flat=True)[:500]
+        }),
         'ips': ips,
         'ips_activas': ips_activas,
+        # Respaldos, restauraciones y exportaciones recientes (los ejecuta 'runworker')
+        'trabajos': Trabajo.objects.select_related('usuario').exclude(tipo='procesar_foto').order_by('-creado')[:10],
+        'respaldo_nativo': connection.vendor == 'postgresql',
     }
     return render(request, 'settings_log.html', context)
 
@@ -613,24 +719,17 @@ def manage_ips_view(request):
         ip = request.POST.get('ip')
         motivo = request.POST.get('motivo') # Podemos guardar esto en equipo_nombre o notas
 
-        # Guardamos en la base de datos
-        IpPermitida.objects.update_or_create(
-            direccion_ip=ip,
-            defaults={
-                'esta_permitida': False, # Si la bloqueas manualmente, nace como False
-                'equipo_nombre': motivo if motivo else "Bloqueo Manual",
-                'sistema_operativo': "N/A",
-                'navegador': "N/A"
-            }
-        )
-
-        # Registrar en bitácora
-        Bitacora.objects.create(
-            usuario=request.user,
-            accion="Bloqueo Manual de IP",
-            detalles=f"Se bloqueó manualmente la IP: {ip} - Motivo: {motivo}",
-            ip_origen=get_client_ip(request)
-        )
+        # Guardamos en la base de datos y lo registramos en bitácora
+        with evento(request.user, "Bloqueo Manual de IP", f"Se bloqueó manualmente la IP: {ip} - Motivo: {motivo}", get_client_ip(request)):
+            IpPermitida.objects.update_or_create(
+                direccion_ip=ip,
+                defaults={
+                    'esta_permitida': False, # Si la bloqueas manualmente, nace como False
+                    'equipo_nombre': motivo if motivo else "Bloqueo Manual",
+                    'sistema_operativo': "N/A",
+                    'navegador': "N/A"
+                }
+            )
 
         messages.warning(request, f"Se ha actualizado el estado de la IP: {ip}")
         return redirect('settings_log') # Ajusta al nombre de tu URL de configuración
@@ -644,17 +743,12 @@ def manage_ips_view(request):
 def toggle_ip_status(request, ip_id):
     ip_obj = get_object_or_404(IpPermitida, id=ip_id)
     ip_obj.esta_permitida = not ip_obj.esta_permitida
-    ip_obj.save()
 
     estado = "Permitida" if ip_obj.esta_permitida else "Bloqueada"
 
-    # Registrar en bitácora
-    Bitacora.objects.create(
-        usuario=request.user,
-        accion=f"Cambio de Estado de IP - {estado}",
-        detalles=f"Se cambió el estado de la IP {ip_obj.direccion_ip} a {estado}",
-        ip_origen=get_client_ip(request)
-    )
+    # Guardar y registrar en bitácora
+    with evento(request.user, f"Cambio de Estado de IP - {estado}", f"Se cambió el estado de la IP {ip_obj.direccion_ip} a {estado}", get_client_ip(request)):
+        ip_obj.save()
 
     messages.info(request, f"La IP {ip_obj.direccion_ip} ahora está {estado}.")
     return redirect(request.META.get('HTTP_REFERER', 'settings_log'))
@@ -674,14 +768,9 @@ def edit_ip_view(request, ip_id):
             ip_obj.esta_permitida = True
         elif estado == 'bloqueada':
             ip_obj.esta_permitida = False
-        ip_obj.save()
 
-        Bitacora.objects.create(
-            usuario=request.user,
-            accion="Edición de IP",
-            detalles=f"Se editó la información de la IP: {ip_obj.direccion_ip}",
-            ip_origen=get_client_ip(request)
-        )
+        with evento(request.user, "Edición de IP", f"Se editó la información de la IP: {ip_obj.direccion_ip}", get_client_ip(request)):
+            ip_obj.save()
 
         messages.success(request, f"Información de la IP {ip_obj.direccion_ip} actualizada correctamente.")
         return redirect('settings_log')
@@ -697,14 +786,8 @@ def delete_ip_view(request, ip_id):
     ip_obj = get_object_or_404(IpPermitida, id=ip_id)
     ip_address = ip_obj.direccion_ip
 
-    ip_obj.delete()
-
-    Bitacora.objects.create(
-        usuario=request.user,
-        accion="Eliminación de IP",
-        detalles=f"Se eliminó la IP: {ip_address} del control de acceso",
-        ip_origen=get_client_ip(request)
-    )
+    with evento(request.user, "Eliminación de IP", f"Se eliminó la IP: {ip_address} del control de acceso", get_client_ip(request)):
+        ip_obj.delete()
 
     messages.success(request, f"La IP {ip_address} ha sido eliminada del control de acceso.")
     return redirect('settings_log')
@@ -712,266 +795,96 @@ def delete_ip_view(request, ip_id):
 @login_required(login_url='warn')
 @user_passes_test(es_administrador, login_url='warn')
 def export_log_pdf_view(request):
-    # Obtener todos los registros de la bitácora
-    bitacora_completa = Bitacora.objects.all().order_by('-fecha_hora')
-
-    # Crear buffer para el PDF
-    buffer = BytesIO()
-    # Usar A4 landscape para más espacio horizontal
-    from reportlab.lib.pagesizes import A4
-    doc = SimpleDocTemplate(buffer, pagesize=(A4[1], A4[0]))  # Landscape
-    elements = []
-
-    # Estilos
-    styles = getSampleStyleSheet()
-    title_style = styles['Heading1']
-    title_style.alignment = 1  # Centrado
-
-    # Título
-    title = Paragraph("Bitácora Completa - Sistema BAV", title_style)
-    elements.append(title)
-    elements.append(Spacer(1, 12))
-
-    # Datos para la tabla
-    data = [['Fecha/Hora', 'Usuario', 'Acción', 'Detalles', 'IP Origen']]
-    for log in bitacora_completa:
-        usuario = log.usuario.username if log.usuario else 'Sistema'
-        # Truncar textos largos para que quepan mejor
-        accion = log.accion[:50] + '...' if len(log.accion) > 50 else log.accion
-        detalles = log.detalles[:100] + '...' if len(log.detalles) > 100 else log.detalles
-        data.append([
-            log.fecha_hora.strftime('%d/%m/%Y %H:%M:%S'),
-            usuario,
-            accion,
-            detalles,
-            log.ip_origen
-        ])
-
-    # Crear tabla con anchos de columna específicos
-    col_widths = [80, 60, 80, 200, 80]  # Anchos en puntos
-    table = Table(data, colWidths=col_widths)
-    table.setStyle(TableStyle([
-        ('BACKGROUND', (0, 0), (-1, 0), colors.green),
-        ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
-        ('ALIGN', (0, 0), (-1, -1), 'LEFT'),  # Cambiar a LEFT para mejor legibilidad
-        ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-        ('FONTSIZE', (0, 0), (-1, 0), 10),  # Reducir tamaño de fuente
-        ('BOTTOMPADDING', (0, 0), (-1, 0), 8),
-        ('BACKGROUND', (0, 1), (-1, -1), colors.beige),
-        ('GRID', (0, 0), (-1, -1), 0.5, colors.black),
-        ('FONTSIZE', (0, 1), (-1, -1), 8),  # Tamaño de fuente más pequeño para datos
-        ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),  # Alineación vertical al medio
-        ('LEFTPADDING', (0, 0), (-1, -1), 3),  # Padding izquierdo
-        ('RIGHTPADDING', (0, 0), (-1, -1), 3),  # Padding derecho
-        ('TOPPADDING', (0, 0), (-1, -1), 2),  # Padding superior
-        ('BOTTOMPADDING', (0, 0), (-1, -1), 2),  # Padding inferior
-    ]))
-
-    elements.append(table)
-
-    # Construir PDF
-    doc.build(elements)
-
-    # Preparar respuesta
-    buffer.seek(0)
-    response = HttpResponse(buffer, content_type='application/pdf')
-    response['Content-Disposition'] = 'attachment; filename="bitacora_completa.pdf"'
-
-    # Registrar en bitácora
-    Bitacora.objects.create(
-        usuario=request.user,
-        accion="Exportación de Bitácora PDF",
-        detalles=f"El usuario {request.user.username} exportó la bitácora completa en PDF",
-        ip_origen=get_client_ip(request)
-    )
+    # La bitácora filtrada (rango de fechas, usuario, acción...) se exporta en segundo plano
+    _, filtros = filtrar_bitacora(request.GET)
+    trabajo = encolar('exportar_bitacora_pdf', request.user, get_client_ip(request), filtros=filtros)
 
-    return response
+    messages.success(request, f"La exportación PDF se está generando (trabajo #{trabajo.pk}). Podrá descargarla en la pestaña Base de Datos.")
+    return redirect('settings_log')
 
 @login_required(login_url='warn')
 @user_passes_test(es_administrador, login_url='warn')
-def export_log_txt_view(request):
-    # Obtener todos los registros de la bitácora
-    bitacora_completa = Bitacora.objects.all().order_by('-fecha_hora')
-
-    # Crear contenido del archivo TXT
-    txt_content = "BITÁCORA COMPLETA - SISTEMA BAV\n"
-    txt_content += "=" * 50 + "\n\n"
-
-    for log in bitacora_completa:
-        usuario = log.usuario.username if log.usuario else 'Sistema'
-        txt_content += f"Fecha/Hora: {log.fecha_hora.strftime('%d/%m/%Y %H:%M:%S')}\n"
-        txt_content += f"Usuario: {usuario}\n"
-        txt_content += f"Acción: {log.accion}\n"
-        txt_content += f"Detalles: {log.detalles}\n"
-        txt_content += f"IP Origen: {log.ip_origen}\n"
-        txt_content += "-" * 50 + "\n"
-
-    # Preparar respuesta
-    response = HttpResponse(txt_content, content_type='text/plain; charset=utf-8')
-    response['Content-Disposition'] = 'attachment; filename="bitacora_completa.txt"'
-
-    # Registrar en bitácora
-    Bitacora.objects.create(
-        usuario=request.user,
-        accion="Exportación de Bitácora TXT",
-        detalles=f"El usuario {request.user.username} exportó la bitácora completa en TXT",
-        ip_origen=get_client_ip(request)
+def export_log_view(request, formato=None):
+    # Exporta la bitácora (con los mismos filtros del visor) en TXT, CSV o NDJSON, en segundo plano
+    formato = formato or request.GET.get('formato', 'txt')
+    if formato not in FORMATOS:
+        messages.error(request, f"Formato de exportación no válido: {formato}")
+        return redirect('settings_log')
+
+    _, filtros = filtrar_bitacora(request.GET)
+    trabajo = encolar(
+        'exportar_bitacora', request.user, get_client_ip(request),
+        formato=formato, gzip=request.GET.get('gzip') == '1', filtros=filtros,
     )
 
-    return response
+    messages.success(request, f"La exportación {formato.upper()} se está generando (trabajo #{trabajo.pk}). Podrá descargarla en la pestaña Base de Datos.")
+    return redirect('settings_log')
 
 @login_required(login_url='warn')
 @user_passes_test(es_administrador, login_url='warn')
 def database_backup_view(request):
-    """Vista para crear respaldo completo de TODA la base de datos"""
-    import os
-    import json
-    from django.core import serializers
-    from django.conf import settings
-    from django.apps import apps
-    from datetime import datetime
-
-    # Crear directorio de respaldos si no existe
-    backup_dir = os.path.join(settings.BASE_DIR, 'backups')
-    os.makedirs(backup_dir, exist_ok=True)
-
-    # Nombre del archivo con timestamp
-    timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
-    filename = f'backup_completo_{timestamp}.json'
-    filepath = os.path.join(backup_dir, filename)
-
-    try:
-        # Obtener TODOS los modelos de TODAS las aplicaciones instaladas
-        data = []
-        total_models = 0
-        total_records = 0
-
-        # Iterar sobre todas las aplicaciones instaladas
-        for app_config in apps.get_app_configs():
-            app_label = app_config.label
-
-            # Iterar sobre todos los modelos de cada aplicación
-            for model in app_config.get_models():
-                model_name = f"{app_label}.{model.__name__}"
-                try:
-                    queryset = model.objects.all()
-                    record_count = queryset.count()
-                    total_models += 1
-                    total_records += record_count
-
-                    if record_count > 0:
-                        # Serializar todos los registros del modelo
-                        serialized_data = serializers.serialize('json', queryset)
-                        if serialized_data:
-                            # Si es una lista de objetos, extenderla
-                            if isinstance(serialized_data, list):
-                                data.extend(serialized_data)
-                            else:
-                                # Si es un string JSON, parsearlo y extenderlo
-                                try:
-                                    parsed_data = json.loads(serialized_data)
-                                    if isinstance(parsed_data, list):
-                                        data.extend(parsed_data)
-                                    else:
-                                        data.append(parsed_data)
-                                except:
-                                    # Si no se puede parsear, intentar agregarlo como string
-                                    data.append(serialized_data)
-
-                except Exception as e:
-                    # Log del error pero continuar con otros modelos
-                    print(f"Error backing up model {model_name}: {str(e)}")
-                    continue
-
-        # Guardar el respaldo completo en archivo JSON
-        with open(filepath, 'w', encoding='utf-8') as f:
-            json.dump(data, f, indent=2, ensure_ascii=False)
-
-        # Preparar respuesta para descarga
-        with open(filepath, 'r', encoding='utf-8') as f:
-            response = HttpResponse(f.read(), content_type='application/json')
-            response['Content-Disposition'] = f'attachment; filename="{filename}"'
-
-        # Registrar en bitácora con detalles completos
-        Bitacora.objects.create(
-            usuario=request.user,
-            accion="Respaldo Completo de Base de Datos",
-            detalles=f"Se creó respaldo completo de TODA la base de datos: {filename}. Modelos: {total_models}, Registros: {total_records}",
-            ip_origen=get_client_ip(request)
-        )
-
-        # Limpiar archivo temporal después de la descarga
-        import threading
-        def cleanup_file():
-            import time
-            time.sleep(5)  # Esperar 5 segundos para que se complete la descarga
-            try:
-                os.remove(filepath)
-            except:
-                pass
-
-        threading.Thread(target=cleanup_file, daemon=True).start()
-
-        return response
-
-    except Exception as e:
-        messages.error(request, f"Error al crear el respaldo completo: {str(e)}")
-        return redirect('settings_log')
+    """Encola un respaldo completo de TODA la base de datos (lo genera 'runworker')"""
+    # formato=nativo: COPY de PostgreSQL, para recuperación ante desastres
+    # incremental=1: solo los cambios desde el último respaldo (continúa su cadena)
+    formato = 'nativo' if request.GET.get('formato') == 'nativo' else 'json'
+    incremental = formato == 'json' and request.GET.get('incremental') == '1'
+    trabajo = encolar('respaldo', request.user, get_client_ip(request), formato=formato, incremental=incremental)
+
+    messages.success(request, f"El respaldo se está generando (trabajo #{trabajo.pk}). Podrá descargarlo al terminar.")
+    return redirect('settings_log')
 
 @login_required(login_url='warn')
 @user_passes_test(es_administrador, login_url='warn')
 def database_restore_view(request):
-    """Vista para restaurar la base de datos desde archivo"""
+    """Guarda el archivo subido y encola la restauración de la base de datos"""
     if request.method == 'POST' and request.FILES.get('backup_file'):
-        import json
-        from django.core import serializers
-
-        backup_file = request.FILES['backup_file']
-
-        try:
-            # Leer el contenido del archivo
-            file_content = backup_file.read().decode('utf-8')
-            data = json.loads(file_content)
-
-            # Deserializar y guardar los datos
-            for obj_data in data:
-                try:
-                    # Crear el objeto desde los datos serializados
-                    obj = serializers.deserialize('json', json.dumps([obj_data])).next()
-                    obj.save()
-                except Exception as e:
-                    # Si hay conflicto (objeto ya existe), intentar actualizar
-                    try:
-                        # Para objetos que ya existen, intentar actualizar campos
-                        existing_obj = obj.object.__class__.objects.filter(pk=obj.object.pk).first()
-                        if existing_obj:
-                            # Actualizar campos del objeto existente
-                            for field in obj.object._meta.fields:
-                                if not field.primary_key:
-                                    setattr(existing_obj, field.name, getattr(obj.object, field.name))
-                            existing_obj.save()
-                    except:
-                        # Si no se puede actualizar, continuar
-                        continue
-
-            # Registrar en bitácora
-            Bitacora.objects.create(
-                usuario=request.user,
-                accion="Restauración de Base de Datos",
-                detalles=f"Se restauró la base de datos desde archivo: {backup_file.name}",
-                ip_origen=get_client_ip(request)
-            )
-
-            messages.success(request, "Base de datos restaurada exitosamente.")
-            return redirect('settings_log')
-
-        except Exception as e:
-            messages.error(request, f"Error al restaurar la base de datos: {str(e)}")
-            return redirect('settings_log')
+        # Puede venir un respaldo completo junto con sus incrementales
+        rutas = []
+        nombres = []
+        for backup_file in request.FILES.getlist('backup_file'):
+            # Cada archivo se copia por partes a disco: el trabajo lo lee desde allí
+            extension = os.path.splitext(backup_file.name)[1].lower() or '.tar'
+            ruta = ruta_entrada(f"{uuid.uuid4().hex}{extension}")
+            with open(ruta, 'wb') as destino:
+                for parte in backup_file.chunks():
+                    destino.write(parte)
+            rutas.append(ruta)
+            nombres.append(backup_file.name)
+
+        simular = bool(request.POST.get('simular'))
+        trabajo = encolar('restauracion', request.user, get_client_ip(request),
+                          archivos=rutas, nombre=', '.join(nombres), simular=simular)
+        operacion = "La validación del respaldo" if simular else "La restauración"
+        messages.success(request, f"{operacion} se está ejecutando (trabajo #{trabajo.pk}). Siga su avance en la pestaña Base de Datos.")
 
     # Si no es POST o no hay archivo, redirigir
     return redirect('settings_log')
 
+@login_required(login_url='warn')
+@user_passes_test(es_administrador, login_url='warn')
+def trabajo_estado_view(request, trabajo_id):
+    """Estado y progreso de un trabajo en segundo plano (JSON, para el panel)"""
+    trabajo = get_object_or_404(Trabajo, pk=trabajo_id)
+    return JsonResponse({
+        'id': trabajo.pk,
+        'tipo': trabajo.get_tipo_display(),
+        'estado': trabajo.estado,
+        'estado_display': trabajo.get_estado_display(),
+        'progreso': trabajo.progreso,
+        'mensaje': trabajo.mensaje,
+        'descarga': reverse('trabajo_descargar', args=[trabajo.pk]) if trabajo.estado == 'terminado' and trabajo.archivo else None,
+    })
+
+@login_required(login_url='warn')
+@user_passes_test(es_administrador, login_url='warn')
+def trabajo_descargar_view(request, trabajo_id):
+    """Descarga el archivo generado por un trabajo terminado"""
+    trabajo = get_object_or_404(Trabajo, pk=trabajo_id, estado='terminado')
+    if not trabajo.archivo or not os.path.exists(trabajo.archivo):
+        messages.error(request, "El archivo de este trabajo ya no está disponible.")
+        return redirect('settings_log')
+    return FileResponse(open(trabajo.archivo, 'rb'), as_attachment=True, filename=trabajo.nombre_archivo)
+
 # ==========================================
 # SECCIÓN: GESTIÓN DE USUARIOS (settings_users.html)
 # ==========================================